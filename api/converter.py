@@ -3,13 +3,23 @@ AI SDK to Secure Backend Converter
 Converts AI SDK chat requests to secure backend format
 """
 
+import sys
 import json
+import asyncio
+import hashlib
 import httpx
+from pathlib import Path
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, Header, HTTPException
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 
+try:
+    from .utils import shared_state
+except ImportError:
+    sys.path.append(str(Path(__file__).parent))
+    from utils import shared_state
+
 app = FastAPI()
 
 class Message(BaseModel):
@@ -18,12 +28,52 @@ class Message(BaseModel):
 
 class AISDKRequest(BaseModel):
     messages: List[Message]
+    # useChat's chat id, random per conversation
+    id: Optional[str] = None
 
 SECURE_BACKEND_URL = "http://localhost:8000"
-active_sessions = {}  # Simple in-memory session store
+SESSION_TTL = 24 * 3600
+# Client chat id -> backend session id, shared by all workers (see utils/shared_state.py)
+active_sessions = shared_state.SharedMap("converter_sessions", ttl=SESSION_TTL)
+
+def conversation_key(chat_id: Optional[str]) -> Optional[str]:
+    """
+    Key for a conversation's backend session, from the id the client sent
+
+    Never derived from message content: two users with the same history
+    would share (and overwrite) one backend session.
+    """
+    if not chat_id:
+        return None
+    return hashlib.sha256(chat_id.encode()).hexdigest()
+
+async def create_backend_session(client: httpx.AsyncClient) -> str:
+    session_response = await client.post(
+        f"{SECURE_BACKEND_URL}/api/sessions",
+        json={"user_info": {}},
+        headers={"Content-Type": "application/json"},
+        timeout=30.0
+    )
+    
+    if session_response.status_code != 200:
+        raise HTTPException(status_code=500, detail="Failed to create session")
+    
+    session_data = session_response.json()
+    return session_data["session_id"]
+
+async def send_backend_message(client: httpx.AsyncClient, session_id: str, message: str) -> httpx.Response:
+    return await client.post(
+        f"{SECURE_BACKEND_URL}/api/chat",
+        json={
+            "session_id": session_id,
+            "message": message
+        },
+        headers={"Content-Type": "application/json"},
+        timeout=30.0
+    )
 
 @app.post("/api/chat")
-async def convert_chat_request(request: AISDKRequest):
+async def convert_chat_request(request: AISDKRequest, x_chat_id: Optional[str] = Header(None)):
     """Convert AI SDK format to secure backend format"""
     print(f"DEBUG: Received AI SDK request: {request}")
     
@@ -35,40 +85,31 @@ async def convert_chat_request(request: AISDKRequest):
     if latest_message.role != "user":
         raise HTTPException(status_code=400, detail="Latest message must be from user")
     
-    # Create or get session - for now, we'll create a new one each time
-    # In production, you'd want to maintain session state
+    # Continue the conversation's backend session, whichever worker created it;
+    # without a client chat id every request gets a fresh session
+    key = conversation_key(request.id or x_chat_id)
+    # Shared-state calls block on Redis or SQLite, so they run in a thread
+    session_id = await asyncio.to_thread(active_sessions.get, key) if key else None
     try:
         async with httpx.AsyncClient() as client:
-            # Create a new session
-            session_response = await client.post(
-                f"{SECURE_BACKEND_URL}/api/sessions",
-                json={"user_info": {}},
-                headers={"Content-Type": "application/json"},
-                timeout=30.0
-            )
-            
-            if session_response.status_code != 200:
-                raise HTTPException(status_code=500, detail="Failed to create session")
-            
-            session_data = session_response.json()
-            session_id = session_data["session_id"]
+            if not session_id:
+                session_id = await create_backend_session(client)
             
             # Send message to secure backend
-            chat_response = await client.post(
-                f"{SECURE_BACKEND_URL}/api/chat",
-                json={
-                    "session_id": session_id,
-                    "message": latest_message.content
-                },
-                headers={"Content-Type": "application/json"},
-                timeout=30.0
-            )
+            chat_response = await send_backend_message(client, session_id, latest_message.content)
+            
+            # The backend no longer knows the session (restart or expiry); start a new one
+            if chat_response.status_code == 404:
+                session_id = await create_backend_session(client)
+                chat_response = await send_backend_message(client, session_id, latest_message.content)
             
             if chat_response.status_code != 200:
                 raise HTTPException(status_code=500, detail="Failed to get response from secure backend")
             
             backend_data = chat_response.json()
             response_text = backend_data.get("response", "")
+            if key:
+                await asyncio.to_thread(active_sessions.set, key, session_id)
             
             # Convert to AI SDK streaming format
             def generate_stream():
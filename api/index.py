@@ -1,26 +1,89 @@
 import os
+import re
+import queue
+import asyncio
+import hmac
 import json
-from typing import List
+import time
+import uuid
+import logging
+import contextlib
+from typing import List, Optional, Tuple
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
-from pydantic import BaseModel
+from pydantic import BaseModel, ValidationError
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query, HTTPException, Request as FastAPIRequest
-from fastapi.responses import StreamingResponse, JSONResponse
+from fastapi import FastAPI, Query, HTTPException, Request as FastAPIRequest, WebSocket
+from fastapi.responses import StreamingResponse, JSONResponse, Response, FileResponse
 from fastapi.exceptions import RequestValidationError
-from openai import OpenAI
-from .utils.prompt import ClientMessage, convert_to_openai_messages
+from starlette.concurrency import run_in_threadpool
+from openai import OpenAI, RateLimitError, APIConnectionError, InternalServerError
+from .utils.prompt import ClientMessage, ToolInvocation, convert_to_openai_messages
 from .utils.tools import get_current_weather
+from .utils import metrics, tracing, profiling, capture, coalescing, admission, routing, chat_socket, resumable, resilience, tool_stream, citations
 
 
 load_dotenv(".env")
 
 app = FastAPI()
+logger = tracing.get_logger("aura.chat")
+
+# Polling these would push real requests out of the trace buffer
+UNTRACED_PATHS = ("/api/metrics", "/api/traces", "/api/profiles")
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+@app.middleware("http")
+async def trace_requests(request: FastAPIRequest, call_next):
+    if request.url.path.startswith(UNTRACED_PATHS):
+        return await call_next(request)
+    incoming = request.headers.get(tracing.TRACE_HEADER, "")
+    trace = tracing.start_trace(request.method, request.url.path,
+                                incoming if TRACE_ID_PATTERN.match(incoming) else None)
+    profile = None
+    reason = profiling.should_profile(request.headers.get(profiling.PROFILE_HEADER), is_admin(request))
+    if reason:
+        profile = profiling.start_profile(f"{int(time.time())}-{trace.trace_id}",
+                                          request.method, request.url.path, reason)
+    try:
+        response = await call_next(request)
+    except Exception:
+        trace.finish(500)
+        if profile is not None:
+            await run_in_threadpool(profiling.finish_profile, profile)
+        raise
+    # Streaming responses extend duration_ms again when the stream ends
+    trace.finish(response.status_code)
+    response.headers[tracing.TRACE_HEADER] = trace.trace_id
+    if profile is not None:
+        response.headers["x-profile-id"] = profile.profile_id
+        response.body_iterator = finish_profile_after(response.body_iterator, profile)
+    return response
+
+async def finish_profile_after(body_iterator, profile):
+    """Pass the body through, then write the profile once the last chunk is sent"""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        await run_in_threadpool(profiling.finish_profile, profile)
+
+def is_admin(request: FastAPIRequest) -> bool:
+    admin_token = os.environ.get("ADMIN_TOKEN")
+    return bool(admin_token) and hmac.compare_digest(request.headers.get("x-admin-token", ""), admin_token)
+
+def require_admin(request: FastAPIRequest):
+    """Debug endpoints are disabled unless ADMIN_TOKEN is set, and then need it in x-admin-token"""
+    if not os.environ.get("ADMIN_TOKEN"):
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not is_admin(request):
+        raise HTTPException(status_code=403, detail="Forbidden")
 
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: FastAPIRequest, exc: RequestValidationError):
     body = await request.body()
-    print(f"VALIDATION ERROR: {exc.errors()}")
-    print(f"REQUEST BODY: {body}")
+    fields = {"errors": tracing.truncate(exc.errors())}
+    if tracing.should_log_payload():
+        fields["body"] = tracing.truncate(body.decode(errors="replace"))
+    tracing.log_fields(logger, logging.WARNING, "request validation failed", **fields)
     return JSONResponse(
         status_code=422,
         content={"detail": exc.errors(), "body": body.decode()}
@@ -50,134 +113,452 @@ available_tools = {
     "get_current_weather": get_current_weather,
 }
 
+tools = [{
+    "type": "function",
+    "function": {
+        "name": "get_current_weather",
+        "description": "Get the current weather at a location",
+        "parameters": {
+            "type": "object",
+            "properties": {
+                "latitude": {
+                    "type": "number",
+                    "description": "The latitude of the location",
+                },
+                "longitude": {
+                    "type": "number",
+                    "description": "The longitude of the location",
+                },
+            },
+            "required": ["latitude", "longitude"],
+        },
+    },
+}]
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok"}
 
+@app.get("/api/metrics")
+async def get_metrics():
+    return Response(content=metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+@app.get("/api/traces")
+async def list_traces(request: FastAPIRequest, limit: int = Query(50, ge=1, le=500),
+                      path: str = None, min_duration_ms: float = 0.0):
+    require_admin(request)
+    return {"traces": tracing.traces.recent(limit, path, min_duration_ms),
+            "dropped_log_records": tracing.dropped_records()}
+
+@app.get("/api/traces/{trace_id}")
+async def get_trace(trace_id: str, request: FastAPIRequest):
+    require_admin(request)
+    trace = tracing.traces.get(trace_id)
+    if trace is None:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return trace
+
+@app.get("/api/routing")
+async def routing_stats(request: FastAPIRequest):
+    require_admin(request)
+    return {"enabled": routing.ROUTING_ENABLED, "tiers": routing.router.stats()}
+
+@app.get("/api/citations")
+async def citation_stats(request: FastAPIRequest):
+    require_admin(request)
+    return citations.retrieval.stats()
+
+@app.get("/api/profiles")
+async def list_profiles(request: FastAPIRequest):
+    require_admin(request)
+    return {"profiles": await run_in_threadpool(profiling.store.list)}
+
+@app.get("/api/profiles/{profile_id}")
+async def get_profile(profile_id: str, request: FastAPIRequest):
+    require_admin(request)
+    summary = await run_in_threadpool(profiling.store.summary, profile_id)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return summary
+
+@app.get("/api/profiles/{profile_id}/download")
+async def download_profile(profile_id: str, request: FastAPIRequest):
+    """pstats dump; open with `python -m pstats` or snakeviz"""
+    require_admin(request)
+    path = profiling.store.stats_path(profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return FileResponse(path, media_type="application/octet-stream", filename=f"{profile_id}.prof")
+
 @app.post("/api/sessions")
 async def create_session():
-    import uuid
     session_id = f"sess_{uuid.uuid4().hex[:12]}"
     return {"session_id": session_id}
 
-def do_stream(messages: List[ChatCompletionMessageParam]):
-    stream = client.chat.completions.create(
-        messages=messages,
-        model="gpt-4o",
-        stream=True,
-        tools=[{
-            "type": "function",
-            "function": {
-                "name": "get_current_weather",
-                "description": "Get the current weather at a location",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "latitude": {
-                            "type": "number",
-                            "description": "The latitude of the location",
-                        },
-                        "longitude": {
-                            "type": "number",
-                            "description": "The longitude of the location",
-                        },
-                    },
-                    "required": ["latitude", "longitude"],
-                },
-            },
-        }]
-    )
+EMPTY_TEXT_FRAMES = ('0:""\n', '0:null\n')
 
-    return stream
-
-def stream_text(messages: List[ChatCompletionMessageParam], protocol: str = 'data'):
-    draft_tool_calls = []
-    draft_tool_calls_index = -1
-
-    stream = client.chat.completions.create(
-        messages=messages,
-        model="gpt-4o",
-        stream=True,
-        tools=[{
-            "type": "function",
-            "function": {
-                "name": "get_current_weather",
-                "description": "Get the current weather at a location",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "latitude": {
-                            "type": "number",
-                            "description": "The latitude of the location",
-                        },
-                        "longitude": {
-                            "type": "number",
-                            "description": "The longitude of the location",
-                        },
-                    },
-                    "required": ["latitude", "longitude"],
-                },
-            },
-        }]
-    )
+def stream_text(messages: List[ChatCompletionMessageParam], protocol: str = 'data', request_start: float = None,
+                decision: routing.RouteDecision = None):
+    request_start = request_start or time.perf_counter()
+    first_frame = True
+    outcome = "error"
 
-    for chunk in stream:
-        for choice in chunk.choices:
-            if choice.finish_reason == "stop":
-                continue
-
-            elif choice.finish_reason == "tool_calls":
-                for tool_call in draft_tool_calls:
-                    yield '9:{{"toolCallId":"{id}","toolName":"{name}","args":{args}}}\n'.format(
-                        id=tool_call["id"],
-                        name=tool_call["name"],
-                        args=tool_call["arguments"])
-
-                for tool_call in draft_tool_calls:
-                    tool_result = available_tools[tool_call["name"]](
-                        **json.loads(tool_call["arguments"]))
-
-                    yield 'a:{{"toolCallId":"{id}","toolName":"{name}","args":{args},"result":{result}}}\n'.format(
-                        id=tool_call["id"],
-                        name=tool_call["name"],
-                        args=tool_call["arguments"],
-                        result=json.dumps(tool_result))
-
-            elif choice.delta.tool_calls:
-                for tool_call in choice.delta.tool_calls:
-                    id = tool_call.id
-                    name = tool_call.function.name
-                    arguments = tool_call.function.arguments
-
-                    if (id is not None):
-                        draft_tool_calls_index += 1
-                        draft_tool_calls.append(
-                            {"id": id, "name": name, "arguments": ""})
-
-                    else:
-                        draft_tool_calls[draft_tool_calls_index]["arguments"] += arguments
+    try:
+        for frame in stream_frames(messages, decision):
+            # The opening role-only delta carries no text and doesn't count as a first token
+            if first_frame and frame not in EMPTY_TEXT_FRAMES:
+                metrics.time_to_first_token.observe(time.perf_counter() - request_start, route="direct")
+                tracing.trace_event("stream.first_token")
+                first_frame = False
+            yield frame
+        outcome = "ok"
+    finally:
+        metrics.stream_duration.observe(time.perf_counter() - request_start, route="direct")
+        metrics.chat_requests.inc(route="direct", outcome=outcome)
+        tracing.trace_event("stream.end", outcome=outcome)
+        trace = tracing.current_trace()
+        if trace is not None:
+            trace.finish()
+        recording = capture.current_recording()
+        if recording is not None:
+            recording.finish("direct", outcome)
 
-            else:
-                yield '0:{text}\n'.format(text=json.dumps(choice.delta.content))
-
-        if chunk.choices == []:
-            usage = chunk.usage
-            prompt_tokens = usage.prompt_tokens
-            completion_tokens = usage.completion_tokens
-
-            yield 'e:{{"finishReason":"{reason}","usage":{{"promptTokens":{prompt},"completionTokens":{completion}}},"isContinued":false}}\n'.format(
-                reason="tool-calls" if len(
-                    draft_tool_calls) > 0 else "stop",
-                prompt=prompt_tokens,
-                completion=completion_tokens
+def open_upstream(messages: List[ChatCompletionMessageParam], decision: routing.RouteDecision):
+    """Start the completion on the routed tier, failing over to the other tier if the call itself fails"""
+    recording = capture.current_recording()
+    for attempt, tier in enumerate(decision.candidates):
+        last_attempt = attempt == len(decision.candidates) - 1
+        if recording is not None:
+            recording.upstream_started(tier.model)
+        # Raw response so the admission controller can learn the upstream's rate-limit headers
+        try:
+            raw_response = client.chat.completions.with_raw_response.create(
+                messages=messages,
+                model=tier.model,
+                stream=True,
+                stream_options={"include_usage": True},
+                tools=tools
             )
+        except RateLimitError as e:
+            admission.controller.observe_rate_limited(e.response.headers)
+            routing.router.record_result(tier, ok=False)
+            if last_attempt:
+                raise
+        except (APIConnectionError, InternalServerError):
+            routing.router.record_result(tier, ok=False)
+            if last_attempt:
+                raise
+        else:
+            admission.controller.observe_upstream(raw_response.headers)
+            if attempt:
+                tracing.trace_event("model.failover", tier=tier.name)
+            return raw_response, tier
+
+def stream_frames(messages: List[ChatCompletionMessageParam], decision: routing.RouteDecision = None):
+    """
+    Frames of one response; if the upstream fails partway through, it is retried as a continuation of what
+    was already sent (see api/utils/resilience.py)
+    """
+    recording = capture.current_recording()
+    decision = decision or routing.router.choose(messages)
+    state = resilience.StreamState()
+
+    for attempt in range(resilience.STREAM_RETRIES + 1):
+        try:
+            upstream_messages = resilience.continuation_messages(messages, state) if attempt else messages
+            upstream_start = time.perf_counter()
+            raw_response, tier = open_upstream(upstream_messages, decision)
+            completed = False
+            try:
+                frames = stream_attempt(raw_response.parse(), tier, upstream_start, state, recording)
+                for frame in resilience.trim_overlap(frames, state.sent_text) if attempt else frames:
+                    state.observe(frame)
+                    yield frame
+                completed = True
+            finally:
+                routing.router.record_result(tier, ok=completed)
+            if attempt:
+                metrics.stream_recoveries.inc(route="direct", via="openai")
+            return
+        except Exception as e:
+            if not resilience.retryable(e):
+                raise
+            logger.warning("upstream stream failed on attempt %d: %s", attempt + 1, e)
+            if state.finish_reason:
+                # Only the usage chunk was lost
+                yield state.finish_frame()
+                return
+            if not state.resumable:
+                tracing.trace_event("stream.retry_refused", reason="tool_frames", error=type(e).__name__)
+                raise
+            last_error = e
+            if attempt < resilience.STREAM_RETRIES:
+                resilience.wait_before_retry(attempt + 1, e)
+
+    backend_url = os.environ.get("BACKEND_URL")
+    if not backend_url:
+        raise last_error
+    for frame in resilience.backend_continuation(backend_url, messages, state):
+        state.observe(frame)
+        yield frame
+    metrics.stream_recoveries.inc(route="direct", via="backend")
+
+def stream_attempt(stream, tier: routing.ModelTier, upstream_start: float, state: resilience.StreamState,
+                   recording: capture.Recording = None):
+    """Frames from one upstream completion"""
+    draft_tool_calls: List[tool_stream.ToolCall] = []
+    awaiting_first_token = True
+
+    try:
+        for chunk in stream:
+            if recording is not None:
+                recording.chunk(chunk)
+            if awaiting_first_token and any(choice.delta.content or choice.delta.tool_calls
+                                            for choice in chunk.choices):
+                routing.router.record_ttft(tier, time.perf_counter() - upstream_start)
+                awaiting_first_token = False
+            for choice in chunk.choices:
+                if choice.finish_reason:
+                    state.finish_reason = choice.finish_reason
+
+                if choice.finish_reason == "stop":
+                    continue
+
+                elif choice.finish_reason == "tool_calls":
+                    for tool_call in draft_tool_calls:
+                        yield '9:{{"toolCallId":"{id}","toolName":"{name}","args":{args}}}\n'.format(
+                            id=tool_call.id,
+                            name=tool_call.name,
+                            args=tool_call.arguments.text)
+
+                    for tool_call in draft_tool_calls:
+                        # Idempotent tools were usually started while the model was still streaming
+                        tool_start = time.perf_counter()
+                        with metrics.tool_latency.time(route="direct", tool=tool_call.name):
+                            tool_result = tool_call.result(available_tools)
+                        if recording is not None:
+                            recording.tool(tool_call.name, len(tool_call.arguments.text),
+                                           time.perf_counter() - tool_start)
+
+                        yield 'a:{{"toolCallId":"{id}","toolName":"{name}","args":{args},"result":{result}}}\n'.format(
+                            id=tool_call.id,
+                            name=tool_call.name,
+                            args=tool_call.arguments.text,
+                            result=json.dumps(tool_result))
+
+                elif choice.delta.tool_calls:
+                    for delta in choice.delta.tool_calls:
+                        if delta.id is not None:
+                            draft_tool_calls.append(tool_stream.ToolCall(delta.id, delta.function.name))
+                            yield draft_tool_calls[-1].start_frame()
+
+                        arguments = delta.function.arguments if delta.function else None
+                        if arguments:
+                            tool_call = draft_tool_calls[-1]
+                            yield tool_call.delta_frame(arguments)
+                            tool_call.feed(arguments, available_tools)
+
+                else:
+                    yield '0:{text}\n'.format(text=json.dumps(choice.delta.content))
+
+            if chunk.choices == []:
+                usage = chunk.usage
+                prompt_tokens = usage.prompt_tokens
+                completion_tokens = usage.completion_tokens
+                metrics.prompt_tokens.observe(prompt_tokens, route="direct")
+                metrics.completion_tokens.observe(completion_tokens, route="direct")
+                metrics.tokens_total.inc(prompt_tokens, route="direct", kind="prompt")
+                metrics.tokens_total.inc(completion_tokens, route="direct", kind="completion")
+                routing.router.record_usage(tier, prompt_tokens, completion_tokens)
+
+                yield 'e:{{"finishReason":"{reason}","usage":{{"promptTokens":{prompt},"completionTokens":{completion}}},"isContinued":false}}\n'.format(
+                    reason="tool-calls" if len(
+                        draft_tool_calls) > 0 else "stop",
+                    prompt=prompt_tokens,
+                    completion=completion_tokens
+                )
+    finally:
+        # A broken or abandoned stream never confirms its speculative tool runs
+        for tool_call in draft_tool_calls:
+            tool_call.abandon()
 
 
 
 
 @app.post("/api/chat")
 async def handle_chat_data(request: Request, protocol: str = Query('data')):
-    print(f"DEBUG: Received request - messages: {request.messages}, message: {request.message}, session_id: {request.session_id}")
+    return await admitted_chat(request, protocol)
+
+async def admitted_chat(request: Request, protocol: str, backend_client=None, admission_key: str = ""):
+    # Mid-conversation sessions are dequeued before new ones
+    ongoing = bool(request.session_id) or len(request.messages) > 1
+    try:
+        ticket = await admission.controller.admit(
+            admission_key or request.session_id or None,
+            admission.PRIORITY_ONGOING if ongoing else admission.PRIORITY_NEW)
+    except admission.AdmissionRejected as rejected:
+        tracing.trace_event("admission.rejected", reason=rejected.reason)
+        return JSONResponse(
+            status_code=429,
+            content={"detail": "Too many requests, please retry shortly", "reason": rejected.reason},
+            headers={"Retry-After": rejected.retry_after_header}
+        )
+
+    try:
+        response = await process_chat(request, protocol, backend_client)
+    except BaseException:
+        ticket.release()
+        raise
+    if isinstance(response, StreamingResponse):
+        flight = resumable.buffers.get(response.headers.get(resumable.RESPONSE_ID_HEADER, ""))
+        if flight is not None:
+            # The producer outlives a dropped client by up to RESUME_TTL; it keeps the slot until it stops
+            flight.add_done_callback(ticket.release)
+        else:
+            response.body_iterator = admission.release_after(response.body_iterator, ticket)
+    else:
+        ticket.release()
+    return response
+
+async def backend_session(client, backend_url: str) -> str:
+    with metrics.backend_proxy_latency.time(route="backend", endpoint="sessions"), profiling.awaiting_upstream():
+        session_response = await client.post(
+            f"{backend_url}/sessions",
+            json={},
+            headers={"Content-Type": "application/json"},
+            timeout=30.0
+        )
+    if session_response.status_code != 200:
+        raise ValueError("Failed to create session")
+    return session_response.json().get("session_id")
+
+async def backend_chat(client, backend_url: str, session_id: Optional[str], message_content: str,
+                       request_start: float, recording=None):
+    """Send one message to the secure backend, creating (or recreating) its session as needed"""
+    # Check if we have a session_id in the request or need to create one
+    if not session_id:
+        session_id = await backend_session(client, backend_url)
+
+    async def send(session_id):
+        with metrics.backend_proxy_latency.time(route="backend", endpoint="chat"), profiling.awaiting_upstream():
+            return await client.post(
+                f"{backend_url}/chat",
+                json={
+                    "session_id": session_id,
+                    "message": message_content
+                },
+                headers={"Content-Type": "application/json"},
+                timeout=30.0
+            )
+
+    chat_response = await send(session_id)
+
+    # If session not found, create a new session and retry
+    if chat_response.status_code == 404:
+        try:
+            chat_response = await send(await backend_session(client, backend_url))
+        except Exception as retry_error:
+            logger.warning("backend session retry failed: %s", retry_error)
+            raise Exception("Backend session retry failed")
+
+    tracing.trace_event("backend.chat", status=chat_response.status_code)
+    if recording is not None:
+        recording.backend(chat_response.status_code,
+                          time.perf_counter() - request_start, len(chat_response.content))
+    return chat_response
+
+def backend_frames(backend_data: dict, request_start: float, recording=None):
+    """The backend's whole-message ChatResponse as data-stream frames"""
+    metrics.time_to_first_token.observe(time.perf_counter() - request_start, route="backend")
+    if backend_data.get("citations"):
+        # The backend's citations replace any sent early
+        yield citations.frame(backend_data["citations"], final=True,
+                              rag_triggered=backend_data.get("rag_triggered"))
+    yield f'0:{json.dumps(backend_data.get("response", ""))}\n'
+    # End the stream
+    yield f'e:{{"finishReason":"stop","usage":{{"promptTokens":0,"completionTokens":0}},"isContinued":false}}\n'
+    metrics.stream_duration.observe(time.perf_counter() - request_start, route="backend")
+    metrics.chat_requests.inc(route="backend", outcome="ok")
+    tracing.trace_event("stream.end", outcome="ok")
+    if recording is not None:
+        recording.finish("backend", "ok")
+
+# Queued in place of backend frames when the backend failed after the response had started
+BACKEND_FAILED = object()
+# Keeps backend exchanges alive while their response streams
+background_exchanges = set()
+
+def sources_first_response(request: Request, protocol: str, backend_url: str, backend_client,
+                           message_content: str, request_start: float, recording=None) -> StreamingResponse:
+    """
+    Backend response that starts streaming before the backend has answered
+
+    Retrieval and the backend call run concurrently on the event loop; their
+    frames reach the response stream (a thread) through a queue. If the
+    backend fails, the direct OpenAI path finishes the same response.
+    """
+    import httpx
+
+    pending: "queue.Queue" = queue.Queue()
+
+    async def exchange():
+        try:
+            async with contextlib.AsyncExitStack() as stack:
+                client = backend_client or await stack.enter_async_context(httpx.AsyncClient())
+                chat = asyncio.ensure_future(backend_chat(client, backend_url, request.session_id, message_content,
+                                                          request_start, recording))
+                sources = await citations.retrieval.lookup(message_content)
+                if sources:
+                    pending.put(citations.frame(sources))
+                chat_response = await chat
+            if chat_response.status_code != 200:
+                raise ValueError(f"Backend returned {chat_response.status_code}")
+            for frame in backend_frames(chat_response.json(), request_start, recording):
+                pending.put(frame)
+        except Exception as e:
+            logger.warning("secure backend failed, finishing with direct: %s", e)
+            tracing.trace_event("backend.fallback", error=str(e))
+            metrics.chat_requests.inc(route="backend", outcome="fallback")
+            pending.put(BACKEND_FAILED)
+        finally:
+            pending.put(None)
+
+    def frames():
+        while True:
+            frame = pending.get()
+            if frame is None:
+                return
+            if frame is BACKEND_FAILED:
+                # Already in the response thread
+                openai_messages, decision = prepare_messages(request.messages)
+                yield from stream_text(openai_messages, protocol, request_start, decision)
+            else:
+                yield frame
+
+    task = asyncio.ensure_future(exchange())
+    background_exchanges.add(task)
+    task.add_done_callback(background_exchanges.discard)
+
+    stream, response_id = resumable.buffered(frames(), request.session_id)
+    response = StreamingResponse(stream, media_type="text/plain", headers={'x-vercel-ai-data-stream': 'v1'})
+    if response_id:
+        response.headers[resumable.RESPONSE_ID_HEADER] = response_id
+    return response
+
+def prepare_messages(messages: List[ClientMessage]) -> Tuple[List[ChatCompletionMessageParam], routing.RouteDecision]:
+    """OpenAI messages and their route; image attachments make this blocking, so it runs in a thread"""
+    with profiling.segment():
+        openai_messages = convert_to_openai_messages(messages)
+        return openai_messages, routing.router.choose(openai_messages)
+
+async def process_chat(request: Request, protocol: str, backend_client=None):
+    request_start = time.perf_counter()
+    recording = capture.start_recording(request.messages, request.message, request.session_id)
+    fields = {"messages": len(request.messages), "has_message": bool(request.message),
+              "session_id": request.session_id}
+    if tracing.should_log_payload():
+        fields["payload"] = tracing.truncate(request.model_dump_json())
+    tracing.log_fields(logger, logging.DEBUG, "chat request", **fields)
     
     try:
         import httpx
@@ -187,101 +568,184 @@ async def handle_chat_data(request: Request, protocol: str = Query('data')):
         
         if backend_url:
             try:
-                async with httpx.AsyncClient() as client:
-                    # Get the message content using the property
-                    message_content = request.get_message_content
-                    
-                    if not message_content:
-                        raise ValueError("No message provided")
-                    
-                    # Check if we have a session_id in the request or need to create one
-                    session_id = request.session_id
-                    
-                    if not session_id:
-                        # Create a new session
-                        session_response = await client.post(
-                            f"{backend_url}/sessions",
-                            json={},
-                            headers={"Content-Type": "application/json"},
-                            timeout=30.0
-                        )
-                        if session_response.status_code == 200:
-                            session_data = session_response.json()
-                            session_id = session_data.get("session_id")
-                        else:
-                            raise ValueError("Failed to create session")
-                    
-                    # Send message to secure backend
-                    chat_response = await client.post(
-                        f"{backend_url}/chat",
-                        json={
-                            "session_id": session_id,
-                            "message": message_content
-                        },
-                        headers={"Content-Type": "application/json"},
-                        timeout=30.0
+                # Get the message content using the property
+                message_content = request.get_message_content
+                
+                if not message_content:
+                    raise ValueError("No message provided")
+                
+                if citations.retrieval.ready():
+                    # Sources go out as soon as retrieval finishes; the text follows when the backend answers
+                    return sources_first_response(request, protocol, backend_url, backend_client,
+                                                  message_content, request_start, recording)
+                
+                async with contextlib.AsyncExitStack() as stack:
+                    # WebSocket sessions keep one client (and its connections) across turns
+                    client = backend_client or await stack.enter_async_context(httpx.AsyncClient())
+                    chat_response = await backend_chat(client, backend_url, request.session_id, message_content,
+                                                       request_start, recording)
+                
+                if chat_response.status_code == 200:
+                    # Convert to streaming format expected by frontend
+                    frames, response_id = resumable.buffered(
+                        backend_frames(chat_response.json(), request_start, recording), request.session_id)
+                    response = StreamingResponse(
+                        frames,
+                        media_type="text/plain",
+                        headers={'x-vercel-ai-data-stream': 'v1'}
                     )
-                    
-                    # If session not found, create a new session and retry
-                    if chat_response.status_code == 404:
-                        try:
-                            # Create a new session
-                            session_response = await client.post(
-                                f"{backend_url}/sessions",
-                                json={},
-                                headers={"Content-Type": "application/json"},
-                                timeout=30.0
-                            )
-                            if session_response.status_code == 200:
-                                session_data = session_response.json()
-                                new_session_id = session_data.get("session_id")
-                                
-                                # Retry with new session
-                                chat_response = await client.post(
-                                    f"{backend_url}/chat",
-                                    json={
-                                        "session_id": new_session_id,
-                                        "message": message_content
-                                    },
-                                    headers={"Content-Type": "application/json"},
-                                    timeout=30.0
-                                )
-                        except Exception as retry_error:
-                            print(f"Error creating new session: {retry_error}")
-                            # Fall back to original implementation
-                            raise Exception("Backend session retry failed")
-                    
-                    if chat_response.status_code == 200:
-                        backend_data = chat_response.json()
-                        response_text = backend_data.get("response", "")
-                        
-                        # Convert to streaming format expected by frontend
-                        def generate_stream():
-                            import json
-                            # Stream the response text
-                            yield f'0:{json.dumps(response_text)}\n'
-                            # End the stream
-                            yield f'e:{{"finishReason":"stop","usage":{{"promptTokens":0,"completionTokens":0}},"isContinued":false}}\n'
-                        
-                        return StreamingResponse(
-                            generate_stream(),
-                            media_type="text/plain",
-                            headers={'x-vercel-ai-data-stream': 'v1'}
-                        )
+                    if response_id:
+                        response.headers[resumable.RESPONSE_ID_HEADER] = response_id
+                    return response
                         
             except Exception as e:
-                print(f"Error connecting to secure backend: {e}")
+                logger.warning("secure backend failed, falling back to direct: %s", e)
+                tracing.trace_event("backend.fallback", error=str(e))
+                metrics.chat_requests.inc(route="backend", outcome="fallback")
                 # Fall back to original implementation
                 pass
         
         # Original implementation as fallback
-        messages = request.messages
-        openai_messages = convert_to_openai_messages(messages)
+        openai_messages, decision = await run_in_threadpool(prepare_messages, request.messages)
+        tracing.trace_event("model.route", tier=decision.tier.name, model=decision.model, reason=decision.reason)
+
+        if coalescing.COALESCING_ENABLED:
+            # Identical concurrent conversations share one completion; the producer is profiled
+            flight, frames, joined = coalescing.chat_streams.join(
+                coalescing.request_key(openai_messages, decision.model),
+                lambda: profiling.profiled_iter(stream_text(openai_messages, protocol, request_start, decision)),
+                **(resumable.broadcast_options() if resumable.RESUME_ENABLED else {}))
+            if joined:
+                metrics.coalesced_requests.inc(route="direct")
+                tracing.trace_event("stream.coalesced")
+                if recording is not None:
+                    # The leader's producer finishes its own record; this one ends with its subscription
+                    recording.coalesced()
+                    frames = capture.finish_after(frames, recording, "direct")
+            response_id = resumable.buffers.add(flight, request.session_id) if resumable.RESUME_ENABLED else None
+        else:
+            frames, response_id = resumable.buffered(
+                profiling.profiled_iter(stream_text(openai_messages, protocol, request_start, decision)),
+                request.session_id)
 
-        response = StreamingResponse(stream_text(openai_messages, protocol))
+        response = StreamingResponse(frames)
         response.headers['x-vercel-ai-data-stream'] = 'v1'
+        if response_id:
+            response.headers[resumable.RESPONSE_ID_HEADER] = response_id
         return response
         
     except Exception as e:
-        print(f"Error in handle_chat_data: {e}")
+        logger.exception("handle_chat_data failed")
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@app.get("/api/chat/resume/{response_id}")
+async def resume_chat(response_id: str, offset: int = Query(0, ge=0), session_id: str = Query("")):
+    """Rest of a response whose connection dropped, from the first frame the client didn't get"""
+    try:
+        frames = resumable.resume(response_id, offset, session_id)
+    except coalescing.HistoryTrimmed as e:
+        metrics.resumed_streams.inc(outcome="trimmed")
+        raise HTTPException(status_code=410,
+                            detail=f"Frames before {e.first_available} are no longer buffered; resend the request")
+    if frames is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired response")
+    tracing.trace_event("stream.resumed", response_id=response_id, offset=offset)
+    response = StreamingResponse(frames)
+    response.headers['x-vercel-ai-data-stream'] = 'v1'
+    response.headers[resumable.RESPONSE_ID_HEADER] = response_id
+    return response
+
+@app.websocket("/api/chat/ws")
+async def chat_websocket(websocket: WebSocket, session_id: str = Query(""), resume: str = Query("")):
+    await websocket.accept()
+    # Only the server-issued resume token carries state over; a session_id alone starts fresh
+    connection = await chat_socket.connections.connect(websocket, session_id, resume)
+    state = connection.state
+    if not state:
+        backend_url = os.environ.get("BACKEND_URL")
+        backend_client = None
+        if backend_url:
+            import httpx
+
+            backend_client = httpx.AsyncClient()
+            if not session_id:
+                # Resolve the backend session once instead of on every turn
+                try:
+                    with metrics.backend_proxy_latency.time(route="backend", endpoint="sessions"):
+                        session_response = await backend_client.post(
+                            f"{backend_url}/sessions", json={}, timeout=30.0)
+                    if session_response.status_code == 200:
+                        session_id = session_response.json().get("session_id") or ""
+                except Exception as e:
+                    logger.warning("websocket backend session creation failed: %s", e)
+        connection.session_id = session_id or f"ws_{uuid.uuid4().hex[:12]}"
+        state.update(messages=[], session_id=session_id, backend_client=backend_client)
+
+    try:
+        await connection.send_event({"type": "session", "session_id": connection.session_id,
+                                     "resume": connection.resume_token})
+        await connection.serve(chat_websocket_turn)
+    finally:
+        if chat_socket.connections.disconnect(connection) and state.get("backend_client") is not None:
+            await state["backend_client"].aclose()
+
+async def chat_websocket_turn(connection: chat_socket.ChatConnection, turn: int, payload: dict):
+    """One user message in, the same data-stream frames as POST /api/chat out"""
+    state = connection.state
+    trace = tracing.start_trace("WS", "/api/chat/ws")
+    try:
+        message = ClientMessage(**(payload.get("message") or {"role": "user", "content": payload.get("content", "")}))
+    except (TypeError, ValidationError) as e:
+        trace.finish(422)
+        await connection.send_event({"type": "error", "turn": turn, "status": 422, "detail": str(e)})
+        return
+
+    messages = state["messages"] + [message]
+    try:
+        # The backend session id may be empty; the connection's id always names the session
+        response = await admitted_chat(Request(messages=messages, session_id=state["session_id"]), "data",
+                                       state["backend_client"], admission_key=connection.session_id)
+    except HTTPException as e:
+        trace.finish(e.status_code)
+        await connection.send_event({"type": "error", "turn": turn, "status": e.status_code, "detail": e.detail})
+        return
+    if not isinstance(response, StreamingResponse):
+        trace.finish(response.status_code)
+        await connection.send_event({"type": "error", "turn": turn, "status": response.status_code,
+                                     "detail": json.loads(response.body).get("detail"),
+                                     "retry_after": response.headers.get("retry-after")})
+        return
+
+    frames = []
+    try:
+        async for chunk in response.body_iterator:
+            frame = chunk if isinstance(chunk, str) else chunk.decode()
+            frames.append(frame)
+            await connection.send_frame(turn, frame)
+    finally:
+        # WebSocket turns can't be resumed, so a cancelled turn stops its upstream (and frees its
+        # admission slot) without lingering
+        flight = resumable.buffers.get(response.headers.get(resumable.RESPONSE_ID_HEADER, ""))
+        if flight is not None:
+            flight.stop_lingering()
+        await response.body_iterator.aclose()
+
+    state["messages"] = messages + [assistant_message(frames)]
+    trace.finish(200)
+    await connection.send_event({"type": "done", "turn": turn})
+
+def assistant_message(frames: List[str]) -> ClientMessage:
+    """Rebuild the assistant turn from its data-stream frames so the next turn has the full history"""
+    text = []
+    invocations = []
+    for line in "".join(frames).splitlines():
+        kind, _, value = line.partition(":")
+        if kind == "0":
+            text.append(json.loads(value))
+        elif kind == "a":
+            result = json.loads(value)
+            invocations.append(ToolInvocation(state="result", toolCallId=result["toolCallId"],
+                                              toolName=result["toolName"], args=result["args"],
+                                              result=result["result"]))
+    return ClientMessage(role="assistant", content="".join(text), toolInvocations=invocations or None)
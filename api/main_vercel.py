@@ -20,6 +20,13 @@ backend_root_path = Path(__file__).parent.parent / "backend"
 sys.path.insert(0, str(backend_api_path))
 sys.path.insert(0, str(backend_root_path))
 
+# Admission control shared with api/index.py; local intake extraction; cross-worker state
+try:
+    from .utils import admission, intake, shared_state
+except ImportError:
+    sys.path.append(str(Path(__file__).parent))
+    from utils import admission, intake, shared_state
+
 # Import backend modules
 try:
     from models import (
@@ -35,22 +42,24 @@ except ImportError as e:
     
     class MockSessionManager:
         def __init__(self):
-            self.sessions = {}
+            # Visible to every worker when SHARED_STATE_URL is set
+            self.sessions = shared_state.SharedMap("mock_sessions", ttl=24 * 3600)
         
         async def initialize(self):
             pass
             
         async def create_session(self, session_data):
             session_id = f"sess_{uuid.uuid4().hex[:12]}"
-            session = type('Session', (), {
+            session = {
                 'session_id': session_id,
                 'created_at': datetime.now().isoformat()
-            })()
+            }
             self.sessions[session_id] = session
-            return session
+            return type('Session', (), session)()
             
         async def get_session(self, session_id):
-            return self.sessions.get(session_id)
+            session = self.sessions.get(session_id)
+            return type('Session', (), session)() if session else None
             
         async def update_session(self, session_id, data):
             pass
@@ -200,6 +209,13 @@ def handler(request, context):
                     'body': response.model_dump_json()
                 }
             
+            elif path == '/api/intake':
+                return {
+                    'statusCode': 200,
+                    'headers': headers,
+                    'body': json.dumps(intake.stats())
+                }
+            
             elif path.startswith('/api/sessions/'):
                 path_parts = path.strip('/').split('/')
                 if len(path_parts) == 3:  # /api/sessions/{session_id}
@@ -287,12 +303,37 @@ def handler(request, context):
                         'body': json.dumps({"error": "Session not found"})
                     }
                 
-                response_data = asyncio.run(chatbot_service.process_message(
-                    session_id=chat_req.session_id,
-                    message=chat_req.message,
-                    session_data=session
-                ))
-                asyncio.run(session_manager.update_session(chat_req.session_id, response_data))
+                # Plain intake answers (name, role, school...) are handled without an LLM call
+                local = intake.local_response(session, chat_req.message)
+                if local is not None:
+                    response_data, extraction = local
+                    logger.info(f"Intake turn served locally for {chat_req.session_id}: "
+                                f"{sorted(extraction.fields)} (local share {intake.stats()['local_share']})")
+                    asyncio.run(session_manager.update_session(chat_req.session_id, response_data))
+                else:
+                    # Mid-conversation sessions are dequeued before new ones
+                    ongoing = bool(getattr(session, 'conversation_history', None))
+                    try:
+                        ticket = admission.controller.admit_blocking(
+                            chat_req.session_id,
+                            admission.PRIORITY_ONGOING if ongoing else admission.PRIORITY_NEW
+                        )
+                    except admission.AdmissionRejected as rejected:
+                        return {
+                            'statusCode': 429,
+                            'headers': {**headers, 'Retry-After': rejected.retry_after_header},
+                            'body': json.dumps({"error": "Too Many Requests", "reason": rejected.reason})
+                        }
+                    
+                    try:
+                        response_data = asyncio.run(chatbot_service.process_message(
+                            session_id=chat_req.session_id,
+                            message=chat_req.message,
+                            session_data=session
+                        ))
+                        asyncio.run(session_manager.update_session(chat_req.session_id, response_data))
+                    finally:
+                        ticket.release()
                 response = ChatResponse(
                     session_id=chat_req.session_id,
                     response=response_data["response"],
@@ -0,0 +1,379 @@
+"""
+Admission control for chat requests
+
+Requests are admitted through four gates:
+
+- a per-session token bucket (``ADMISSION_SESSION_RATE`` / ``ADMISSION_SESSION_BURST``);
+  requests without a session only go through the gates below, so users
+  behind one NAT address are not throttled as a single session
+- a global concurrency limit on requests in flight
+- a bounded wait queue; waiters give up after ``ADMISSION_QUEUE_TIMEOUT``
+- priority: sessions already mid-conversation are dequeued before new ones
+
+When the queue is full, a request fails fast with ``AdmissionRejected``
+carrying a ``Retry-After`` estimate. The limit adapts to the upstream: the
+OpenAI ``x-ratelimit-*`` headers cap it and pause admissions when the
+window is spent, an upstream 429 halves it, and each comfortable response
+raises it by one again (AIMD).
+
+Both async handlers (api/index.py) and the sync Vercel handler
+(api/main_vercel.py) share one controller per process.
+
+Environment:
+    ADMISSION_MAX_CONCURRENCY   default 32
+    ADMISSION_QUEUE_SIZE        default 64
+    ADMISSION_QUEUE_TIMEOUT     seconds, default 10
+    ADMISSION_SESSION_RATE      tokens per second per session, default 0.5
+    ADMISSION_SESSION_BURST     default 5
+"""
+
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, List, Mapping, Optional, Tuple
+
+from . import metrics
+
+PRIORITY_ONGOING = 0
+PRIORITY_NEW = 1
+
+# Waiters re-check on this interval so a pause that expires wakes them without a release
+POLL_INTERVAL = 0.25
+# Below this many remaining upstream tokens, new work waits for the window to reset
+MIN_REMAINING_TOKENS = 2000
+
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_DURATION_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def parse_reset(value: Optional[str]) -> Optional[float]:
+    """Seconds from an OpenAI reset header such as ``"1s"``, ``"6m0s"`` or ``"20ms"``"""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value)
+    if not parts:
+        try:
+            return float(value)
+        except ValueError:
+            return None
+    return sum(float(number) * _DURATION_SECONDS[unit] for number, unit in parts)
+
+
+def _int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    try:
+        return int(headers.get(name))
+    except (TypeError, ValueError):
+        return None
+
+
+class AdmissionRejected(Exception):
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(1, math.ceil(self.retry_after)))
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float, now: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = now
+
+    def take(self, now: float) -> float:
+        """Take one token; returns 0 on success, else seconds until one is available"""
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+        return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+
+    def refund(self):
+        self.tokens = min(self.burst, self.tokens + 1)
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "enqueued", "wake", "granted", "abandoned")
+
+    def __init__(self, priority: int, seq: int, enqueued: float, wake: Callable[[], None]):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = enqueued
+        self.wake = wake
+        self.granted = False
+        self.abandoned = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class Ticket:
+    """One admitted request; release exactly once when its response is done"""
+
+    def __init__(self, controller: "AdmissionController"):
+        self._controller = controller
+        self._acquired = time.monotonic()
+        self._released = False
+        self._lock = threading.Lock()
+
+    def release(self):
+        # Called from the event loop or a broadcast producer thread, whichever finishes first
+        with self._lock:
+            if self._released:
+                return
+            self._released = True
+        self._controller._release(time.monotonic() - self._acquired)
+
+
+class AdmissionController:
+    def __init__(self,
+                 max_concurrency: int = int(os.environ.get("ADMISSION_MAX_CONCURRENCY", "32")),
+                 queue_size: int = int(os.environ.get("ADMISSION_QUEUE_SIZE", "64")),
+                 queue_timeout: float = float(os.environ.get("ADMISSION_QUEUE_TIMEOUT", "10")),
+                 session_rate: float = float(os.environ.get("ADMISSION_SESSION_RATE", "0.5")),
+                 session_burst: float = float(os.environ.get("ADMISSION_SESSION_BURST", "5")),
+                 min_concurrency: int = 1, max_sessions: int = 10000):
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.limit = max_concurrency
+        self.queue_size = queue_size
+        self.queue_timeout = queue_timeout
+        self.session_rate = session_rate
+        self.session_burst = session_burst
+        self.max_sessions = max_sessions
+        self.active = 0
+        self.queued = 0
+        self.paused_until = 0.0
+        # EWMA of how long a request holds its slot, for Retry-After estimates
+        self.hold_seconds = 2.0
+        self._heap: List[_Waiter] = []
+        self._buckets: "OrderedDict[str, TokenBucket]" = OrderedDict()
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Admission
+    # ------------------------------------------------------------------
+
+    async def admit(self, key: Optional[str], priority: int = PRIORITY_NEW) -> Ticket:
+        """Wait for a slot without blocking the event loop; raises AdmissionRejected"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def wake():
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(None))
+
+        ticket, waiter = self._enter(key, priority, wake)
+        if ticket is not None:
+            return ticket
+        deadline = time.monotonic() + self.queue_timeout
+        try:
+            while not future.done() and time.monotonic() < deadline:
+                try:
+                    await asyncio.wait_for(asyncio.shield(future),
+                                           min(POLL_INTERVAL, max(deadline - time.monotonic(), 0)))
+                except asyncio.TimeoutError:
+                    self._wake_ready()
+        except asyncio.CancelledError:
+            self._abandon(waiter)
+            raise
+        return self._settle(waiter)
+
+    def admit_blocking(self, key: Optional[str], priority: int = PRIORITY_NEW) -> Ticket:
+        """Thread-blocking admit for sync handlers; raises AdmissionRejected"""
+        event = threading.Event()
+        ticket, waiter = self._enter(key, priority, event.set)
+        if ticket is not None:
+            return ticket
+        deadline = time.monotonic() + self.queue_timeout
+        while not event.is_set() and time.monotonic() < deadline:
+            if not event.wait(min(POLL_INTERVAL, max(deadline - time.monotonic(), 0))):
+                self._wake_ready()
+        return self._settle(waiter)
+
+    def _enter(self, key: Optional[str], priority: int,
+               wake: Callable[[], None]) -> Tuple[Optional[Ticket], Optional[_Waiter]]:
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._bucket(key, now) if key else None
+            wait = bucket.take(now) if bucket is not None else 0.0
+            if wait > 0:
+                return self._reject("session_rate", wait)
+
+            if self.active < self.limit and not self.queued and now >= self.paused_until:
+                self.active += 1
+                self._publish()
+                metrics.admission_decisions.inc(outcome="admitted")
+                return Ticket(self), None
+
+            pause = self.paused_until - now
+            if pause > self.queue_timeout or self.queued >= self.queue_size:
+                if bucket is not None:
+                    bucket.refund()
+            if pause > self.queue_timeout:
+                return self._reject("upstream_rate_limited", pause)
+            if self.queued >= self.queue_size:
+                return self._reject("queue_full", self._estimate_retry_after(pause))
+
+            waiter = _Waiter(priority, next(self._seq), now, wake)
+            heapq.heappush(self._heap, waiter)
+            self.queued += 1
+            self._publish()
+            metrics.admission_decisions.inc(outcome="queued")
+            return None, waiter
+
+    def _settle(self, waiter: _Waiter) -> Ticket:
+        with self._lock:
+            if waiter.granted:
+                metrics.admission_wait.observe(time.monotonic() - waiter.enqueued)
+                return Ticket(self)
+            waiter.abandoned = True
+            self.queued -= 1
+            self._publish()
+            retry_after = self._estimate_retry_after(self.paused_until - time.monotonic())
+        metrics.admission_decisions.inc(outcome="rejected_queue_timeout")
+        raise AdmissionRejected("queue_timeout", retry_after)
+
+    def _abandon(self, waiter: _Waiter):
+        """The waiting request went away; give back its slot if it was just granted one"""
+        with self._lock:
+            granted = waiter.granted
+            if not granted and not waiter.abandoned:
+                waiter.abandoned = True
+                self.queued -= 1
+                self._publish()
+        if granted:
+            self._release(0.0)
+
+    def _reject(self, reason: str, retry_after: float):
+        metrics.admission_decisions.inc(outcome=f"rejected_{reason}")
+        raise AdmissionRejected(reason, retry_after)
+
+    def _bucket(self, key: str, now: float) -> TokenBucket:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.session_rate, self.session_burst, now)
+            while len(self._buckets) > self.max_sessions:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        return bucket
+
+    def _estimate_retry_after(self, pause: float) -> float:
+        # Time for the queue ahead to drain through the current limit
+        drain = self.hold_seconds * (self.queued + 1) / max(self.limit, 1)
+        return max(pause, 0.0) + drain
+
+    # ------------------------------------------------------------------
+    # Release and dispatch
+    # ------------------------------------------------------------------
+
+    def _release(self, held: float):
+        with self._lock:
+            self.active -= 1
+            if held > 0:
+                self.hold_seconds = 0.9 * self.hold_seconds + 0.1 * held
+            wakes = self._dispatch()
+        for wake in wakes:
+            wake()
+
+    def _wake_ready(self):
+        with self._lock:
+            wakes = self._dispatch()
+        for wake in wakes:
+            wake()
+
+    def _dispatch(self) -> List[Callable[[], None]]:
+        """Grant slots to the best waiters; call with the lock held, wake outside it"""
+        wakes = []
+        now = time.monotonic()
+        while self._heap and self.active < self.limit and now >= self.paused_until:
+            waiter = heapq.heappop(self._heap)
+            if waiter.abandoned:
+                continue
+            waiter.granted = True
+            self.active += 1
+            self.queued -= 1
+            wakes.append(waiter.wake)
+        self._publish()
+        return wakes
+
+    def _publish(self):
+        metrics.admission_state.set(self.active, state="active")
+        metrics.admission_state.set(self.queued, state="queued")
+        metrics.admission_state.set(self.limit, state="limit")
+
+    # ------------------------------------------------------------------
+    # Upstream feedback
+    # ------------------------------------------------------------------
+
+    def observe_upstream(self, headers: Mapping[str, str]):
+        """Adapt to the x-ratelimit-* headers of a successful upstream response"""
+        remaining_requests = _int_header(headers, "x-ratelimit-remaining-requests")
+        remaining_tokens = _int_header(headers, "x-ratelimit-remaining-tokens")
+        if remaining_requests is None and remaining_tokens is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            if remaining_requests is not None and remaining_requests <= 0:
+                reset = parse_reset(headers.get("x-ratelimit-reset-requests")) or 1.0
+                self.paused_until = max(self.paused_until, now + reset)
+            elif remaining_tokens is not None and remaining_tokens < MIN_REMAINING_TOKENS:
+                reset = parse_reset(headers.get("x-ratelimit-reset-tokens")) or 1.0
+                self.paused_until = max(self.paused_until, now + reset)
+            elif remaining_requests is not None and remaining_requests < self.limit:
+                # More in flight than the window still allows would just earn 429s
+                self.limit = max(self.min_concurrency, remaining_requests)
+            elif self.limit < self.max_concurrency:
+                self.limit += 1
+            wakes = self._dispatch()
+        for wake in wakes:
+            wake()
+
+    def observe_rate_limited(self, headers: Optional[Mapping[str, str]] = None):
+        """The upstream answered 429: halve the limit and pause until it says to retry"""
+        headers = headers or {}
+        retry_after = (parse_reset(headers.get("retry-after"))
+                       or parse_reset(headers.get("x-ratelimit-reset-requests")) or 1.0)
+        with self._lock:
+            self.limit = max(self.min_concurrency, self.limit // 2)
+            self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+            self._publish()
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "active": self.active,
+                "queued": self.queued,
+                "limit": self.limit,
+                "max_concurrency": self.max_concurrency,
+                "paused_for": round(max(self.paused_until - time.monotonic(), 0.0), 3),
+                "hold_seconds": round(self.hold_seconds, 3),
+                "sessions": len(self._buckets),
+            }
+
+
+controller = AdmissionController()
+
+
+def release_after(body_iterator: Any, ticket: Ticket):
+    """Wrap a response body so the ticket is released once the last chunk is sent"""
+    async def wrapped():
+        try:
+            async for chunk in body_iterator:
+                yield chunk
+        finally:
+            ticket.release()
+
+    return wrapped()
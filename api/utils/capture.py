@@ -0,0 +1,222 @@
+"""
+Opt-in traffic capture for /api/chat
+
+When ``CAPTURE_PATH`` is set, a sampled share of chat requests is recorded
+as anonymized request shapes (roles, message lengths, attachment types,
+tool-invocation counts; never text) plus the timing of every upstream
+frame, tool call and BACKEND_URL response. Records are appended to a gzip
+JSONL file by a background thread, one gzip member per batch, so the file
+stays readable while it grows. ``benchmarks/replay.py`` re-drives a
+capture against a local build.
+
+Environment:
+    CAPTURE_PATH          e.g. /tmp/chat_capture.jsonl.gz; capture is off when unset
+    CAPTURE_SAMPLE_RATE   share of requests recorded (default 1)
+"""
+
+import atexit
+import contextvars
+import gzip
+import hashlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+import uuid
+from typing import Any, Iterator, List, Optional
+
+CAPTURE_PATH = os.environ.get("CAPTURE_PATH")
+CAPTURE_SAMPLE_RATE = float(os.environ.get("CAPTURE_SAMPLE_RATE", "1"))
+# Upper bound on frames kept per record; long streams keep their first frames
+MAX_FRAMES = 4000
+
+# Per-process salt: session hashes correlate turns within a capture, not across deployments
+_SESSION_SALT = uuid.uuid4().bytes
+
+_current_recording: contextvars.ContextVar[Optional["Recording"]] = contextvars.ContextVar(
+    "current_recording", default=None)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 2)
+
+
+def message_shape(message: Any) -> dict:
+    """Role and sizes of a ClientMessage, without its content"""
+    attachments = message.experimental_attachments or []
+    return {
+        "role": message.role,
+        "chars": len(message.content or ""),
+        "attachments": [attachment.contentType for attachment in attachments],
+        "tool_invocations": len(message.toolInvocations or []),
+    }
+
+
+class Recording:
+    """Anonymized shape and upstream timings of one chat request"""
+
+    def __init__(self, messages: List[Any], message: str, session_id: str):
+        self._start = time.perf_counter()
+        self._upstream_start: Optional[float] = None
+        self.record = {
+            "id": uuid.uuid4().hex[:16],
+            "ts": time.time(),
+            "route": None,
+            "request": {
+                "messages": [message_shape(m) for m in messages],
+                "message_chars": len(message or ""),
+                "session": (hashlib.sha256(_SESSION_SALT + session_id.encode()).hexdigest()[:12]
+                            if session_id else None),
+            },
+            "upstream": {"model": None, "ttfb_ms": None, "frames": []},
+            "tools": [],
+            "backend": None,
+            "usage": None,
+            "outcome": None,
+            "total_ms": None,
+        }
+
+    def upstream_started(self, model: str):
+        self._upstream_start = time.perf_counter()
+        self.record["upstream"]["model"] = model
+
+    def chunk(self, chunk: Any):
+        """Record one OpenAI stream chunk: its offset from the request and what it carried"""
+        offset = _ms(time.perf_counter() - (self._upstream_start or self._start))
+        upstream = self.record["upstream"]
+        if upstream["ttfb_ms"] is None:
+            upstream["ttfb_ms"] = offset
+        if chunk.usage is not None:
+            self.record["usage"] = {"prompt_tokens": chunk.usage.prompt_tokens,
+                                    "completion_tokens": chunk.usage.completion_tokens}
+        if len(upstream["frames"]) >= MAX_FRAMES:
+            return
+        for choice in chunk.choices:
+            if choice.finish_reason:
+                upstream["frames"].append([offset, "finish", choice.finish_reason])
+            elif choice.delta.tool_calls:
+                chars = sum(len(call.function.arguments or "") for call in choice.delta.tool_calls)
+                upstream["frames"].append([offset, "tool_call", chars])
+            else:
+                upstream["frames"].append([offset, "text", len(choice.delta.content or "")])
+
+    def tool(self, name: str, args_chars: int, seconds: float):
+        self.record["tools"].append({"name": name, "args_chars": args_chars, "ms": _ms(seconds)})
+
+    def backend(self, status: int, seconds: float, response_chars: int):
+        self.record["backend"] = {"status": status, "ms": _ms(seconds), "response_chars": response_chars}
+
+    def coalesced(self):
+        """This request joined another's in-flight completion, so it has no upstream timings of its own"""
+        self.record["coalesced"] = True
+
+    def finish(self, route: str, outcome: str):
+        if self.record["outcome"] is not None:
+            return
+        self.record["route"] = route
+        self.record["outcome"] = outcome
+        self.record["total_ms"] = _ms(time.perf_counter() - self._start)
+        _writer().submit(self.record)
+
+
+class CaptureWriter:
+    """Appends records to a gzip JSONL file from a background thread; drops when backed up"""
+
+    def __init__(self, path: str, max_pending: int = 1000, batch_size: int = 200):
+        self.path = path
+        self.batch_size = batch_size
+        self.dropped = 0
+        self.written = 0
+        self._queue: "queue.Queue[Optional[dict]]" = queue.Queue(maxsize=max_pending)
+        self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def submit(self, record: dict):
+        try:
+            self._queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def close(self, timeout: float = 5.0):
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+    def _run(self):
+        while True:
+            record = self._queue.get()
+            batch = [] if record is None else [record]
+            while record is not None and len(batch) < self.batch_size:
+                try:
+                    record = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if record is not None:
+                    batch.append(record)
+            if batch:
+                self._write(batch)
+            if record is None:
+                return
+
+    def _write(self, batch: List[dict]):
+        directory = os.path.dirname(self.path)
+        try:
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            # Each batch is a complete gzip member; readers see every closed batch
+            with gzip.open(self.path, "at", encoding="utf-8") as f:
+                for record in batch:
+                    f.write(json.dumps(record, separators=(",", ":")) + "\n")
+            self.written += len(batch)
+        except OSError:
+            self.dropped += len(batch)
+
+
+_writer_instance: Optional[CaptureWriter] = None
+_writer_lock = threading.Lock()
+
+
+def _writer() -> CaptureWriter:
+    global _writer_instance
+    with _writer_lock:
+        if _writer_instance is None:
+            _writer_instance = CaptureWriter(CAPTURE_PATH)
+        return _writer_instance
+
+
+def start_recording(messages: List[Any], message: str, session_id: str) -> Optional[Recording]:
+    """Start recording the current request if capture is on and it is sampled"""
+    recording = None
+    if CAPTURE_PATH and random.random() < CAPTURE_SAMPLE_RATE:
+        recording = Recording(messages, message, session_id)
+    # Always set: WebSocket turns share one task, and an unsampled turn must not see the last record
+    _current_recording.set(recording)
+    return recording
+
+
+def current_recording() -> Optional[Recording]:
+    return _current_recording.get()
+
+
+def finish_after(frames: Iterator[str], recording: Recording, route: str) -> Iterator[str]:
+    """Pass ``frames`` through and finish ``recording`` when they end (or the client leaves first)"""
+    outcome = "abandoned"
+    try:
+        yield from frames
+        outcome = "ok"
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        recording.finish(route, outcome)
+
+
+def read_capture(path: str) -> List[dict]:
+    """All records in a capture file, in the order they were written"""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
@@ -0,0 +1,259 @@
+"""
+WebSocket transport for chat
+
+One connection per session carries user messages in and data-stream
+frames out, so the session, conversation history and backend HTTP client
+are resolved once and reused for every turn instead of per POST.
+
+Client -> server (JSON text messages):
+    {"type": "message", "message": {"role": "user", "content": "..."}}
+    {"type": "cancel"}              abandon the turn in progress
+    {"type": "ping"} / {"type": "pong"}
+
+Server -> client:
+    {"type": "session", "session_id": "...", "resume": "<token>"}
+    {"type": "frames", "turn": 1, "data": "0:\\"Hi\\"\\n0:\\" there\\"\\n"}
+    {"type": "done", "turn": 1}
+    {"type": "error", "turn": 1, "status": 429, "detail": "...", "retry_after": "2"}
+    {"type": "ping"} / {"type": "pong"}
+
+``data`` holds one or more complete data-stream lines, exactly as
+/api/chat would stream them. Frames queue up in a bounded outbox: while
+the client keeps up each frame goes out on its own; when it falls behind,
+queued frames are batched into one message, and a client that stays
+stalled for ``WS_SEND_TIMEOUT`` is disconnected (1013) rather than
+buffering a whole completion in memory. The server pings every
+``WS_HEARTBEAT_INTERVAL`` and closes connections that have sent nothing
+for ``WS_IDLE_TIMEOUT``.
+
+Every connection is issued an unguessable ``resume`` token. A new
+connection that presents it (``?resume=<token>``) replaces the old one and
+takes over its state and session; anything else, including a reused
+``session_id``, starts with fresh state.
+
+Environment:
+    WS_HEARTBEAT_INTERVAL   seconds, default 20
+    WS_IDLE_TIMEOUT         seconds, default 60
+    WS_SEND_QUEUE           queued outbound messages, default 256
+    WS_SEND_TIMEOUT         seconds a full outbox may block a turn, default 15
+    WS_MAX_BATCH_BYTES      default 65536
+"""
+
+import asyncio
+import json
+import os
+import secrets
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from starlette.websockets import WebSocket, WebSocketDisconnect, WebSocketState
+
+from . import metrics, tracing
+
+HEARTBEAT_INTERVAL = float(os.environ.get("WS_HEARTBEAT_INTERVAL", "20"))
+IDLE_TIMEOUT = float(os.environ.get("WS_IDLE_TIMEOUT", "60"))
+SEND_QUEUE_SIZE = int(os.environ.get("WS_SEND_QUEUE", "256"))
+SEND_TIMEOUT = float(os.environ.get("WS_SEND_TIMEOUT", "15"))
+MAX_BATCH_BYTES = int(os.environ.get("WS_MAX_BATCH_BYTES", "65536"))
+
+# Close codes
+GOING_AWAY = 1001
+POLICY_VIOLATION = 1008
+TRY_AGAIN_LATER = 1013
+
+logger = tracing.get_logger("aura.chat.ws")
+
+
+class SlowConsumer(Exception):
+    """The client stopped reading and the outbox stayed full for SEND_TIMEOUT"""
+
+
+class ChatConnection:
+    """
+    One client connection and the session state it carries across turns
+
+    ``state`` is owned by the chat handler (history, backend client, ...);
+    it moves to a replacing connection that presents ``resume_token``.
+    """
+
+    def __init__(self, websocket: WebSocket, session_id: str, state: Optional[Dict[str, Any]] = None,
+                 resume_token: Optional[str] = None):
+        self.websocket = websocket
+        self.session_id = session_id
+        self.state: Dict[str, Any] = state if state is not None else {}
+        self.resume_token = resume_token or secrets.token_urlsafe(24)
+        self.turn = 0
+        self.last_received = time.monotonic()
+        self._outbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue(SEND_QUEUE_SIZE)
+        self._inbox: "asyncio.Queue[Dict[str, Any]]" = asyncio.Queue()
+        self._current_turn: Optional["asyncio.Task[None]"] = None
+        self._cancelled_turn = 0
+        self._closed = asyncio.Event()
+
+    async def send_frame(self, turn: int, frame: str):
+        """Queue one data-stream frame; waits (backpressure) while the outbox is full"""
+        try:
+            await asyncio.wait_for(self._outbox.put({"type": "frames", "turn": turn, "data": frame}),
+                                   SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SlowConsumer() from None
+
+    async def send_event(self, event: Dict[str, Any]):
+        try:
+            await asyncio.wait_for(self._outbox.put(event), SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            raise SlowConsumer() from None
+
+    def _send_control(self, event: Dict[str, Any]):
+        # Heartbeats are skipped rather than queued behind a backlog: a busy outbox proves liveness
+        try:
+            self._outbox.put_nowait(event)
+        except asyncio.QueueFull:
+            pass
+
+    async def close(self, code: int = 1000, reason: str = ""):
+        if self._closed.is_set():
+            return
+        self._closed.set()
+        if self.websocket.application_state == WebSocketState.CONNECTED:
+            try:
+                await self.websocket.close(code, reason)
+            except (WebSocketDisconnect, RuntimeError):
+                # The client already went away
+                pass
+
+    async def serve(self, handle_turn: Callable[["ChatConnection", int, Dict[str, Any]], Awaitable[None]]):
+        """Run the connection until the client leaves, goes idle or falls too far behind"""
+        tasks = [
+            asyncio.create_task(self._receive()),
+            asyncio.create_task(self._send()),
+            asyncio.create_task(self._heartbeat()),
+            asyncio.create_task(self._run_turns(handle_turn)),
+            asyncio.create_task(self._closed.wait()),
+        ]
+        try:
+            await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self.close()
+
+    async def _receive(self):
+        while True:
+            try:
+                message = await self.websocket.receive_json()
+            except WebSocketDisconnect:
+                return
+            except (ValueError, KeyError):
+                self._send_control({"type": "error", "status": 400, "detail": "Expected a JSON text message"})
+                continue
+            self.last_received = time.monotonic()
+            kind = message.get("type") if isinstance(message, dict) else None
+            if kind == "message":
+                await self._inbox.put(message)
+            elif kind == "cancel":
+                if self._current_turn is not None:
+                    self._cancelled_turn = self.turn
+                    self._current_turn.cancel()
+            elif kind == "ping":
+                self._send_control({"type": "pong"})
+            elif kind != "pong":
+                self._send_control({"type": "error", "status": 400, "detail": f"Unknown message type {kind!r}"})
+
+    async def _run_turns(self, handle_turn):
+        """Turns run one at a time, in arrival order; each in its own task so it can be cancelled"""
+        while True:
+            message = await self._inbox.get()
+            self.turn += 1
+            turn = self.turn
+            self._current_turn = asyncio.create_task(handle_turn(self, turn, message))
+            try:
+                await self._current_turn
+            except asyncio.CancelledError:
+                # Only a client cancel is absorbed; teardown cancels this task too
+                if self._cancelled_turn != turn:
+                    raise
+                metrics.websocket_events.inc(event="turn_cancelled")
+                self._send_control({"type": "done", "turn": turn, "cancelled": True})
+            except SlowConsumer:
+                metrics.websocket_events.inc(event="slow_consumer")
+                logger.warning("closing slow websocket consumer for session %s", self.session_id)
+                await self.close(TRY_AGAIN_LATER, "Client is not reading fast enough")
+                return
+            finally:
+                self._current_turn = None
+
+    async def _send(self):
+        held: Optional[Dict[str, Any]] = None
+        while True:
+            event, held = held or await self._outbox.get(), None
+            if event["type"] == "frames":
+                # Whatever queued up behind this frame goes out in the same message
+                data = [event["data"]]
+                size = len(event["data"])
+                while size < MAX_BATCH_BYTES and not self._outbox.empty():
+                    following = self._outbox.get_nowait()
+                    if following["type"] != "frames" or following["turn"] != event["turn"]:
+                        held = following
+                        break
+                    data.append(following["data"])
+                    size += len(following["data"])
+                if len(data) > 1:
+                    metrics.websocket_events.inc(event="batched")
+                event = {"type": "frames", "turn": event["turn"], "data": "".join(data)}
+            try:
+                await self.websocket.send_text(json.dumps(event))
+            except (WebSocketDisconnect, RuntimeError):
+                return
+
+    async def _heartbeat(self):
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_received > IDLE_TIMEOUT:
+                metrics.websocket_events.inc(event="idle_timeout")
+                await self.close(GOING_AWAY, "Heartbeat timeout")
+                return
+            self._send_control({"type": "ping"})
+
+
+class ConnectionRegistry:
+    """Resume token -> live connection; a connection presenting the token replaces the old one"""
+
+    def __init__(self):
+        self._connections: Dict[str, ChatConnection] = {}
+
+    async def connect(self, websocket: WebSocket, session_id: str, resume_token: str = "") -> ChatConnection:
+        """
+        Register a connection; it inherits state only from the live connection
+        the server issued ``resume_token`` to, otherwise it starts fresh
+        """
+        previous = self._connections.get(resume_token) if resume_token else None
+        if previous is None:
+            if resume_token:
+                metrics.websocket_events.inc(event="resume_rejected")
+            connection = ChatConnection(websocket, session_id)
+        else:
+            connection = ChatConnection(websocket, previous.session_id, previous.state, previous.resume_token)
+        self._connections[connection.resume_token] = connection
+        if previous is not None:
+            metrics.websocket_events.inc(event="replaced")
+            await previous.close(POLICY_VIOLATION, "Replaced by a newer connection for this session")
+        metrics.websocket_events.inc(event="connected")
+        metrics.websocket_connections.set(len(self._connections))
+        return connection
+
+    def disconnect(self, connection: ChatConnection) -> bool:
+        """Forget the connection; True unless a replacement connection still uses its state"""
+        current = self._connections.get(connection.resume_token) is connection
+        if current:
+            del self._connections[connection.resume_token]
+        metrics.websocket_events.inc(event="disconnected")
+        metrics.websocket_connections.set(len(self._connections))
+        return current
+
+    def __len__(self) -> int:
+        return len(self._connections)
+
+
+connections = ConnectionRegistry()
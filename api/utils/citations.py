@@ -0,0 +1,205 @@
+"""
+Early citations on the backend path
+
+The chatbot service returns ``citations`` and ``rag_triggered`` only in
+its final ChatResponse, so the UI's sources used to appear after the whole
+answer. Retrieval now runs here first, alongside the backend call, and the
+hits are streamed as a data frame ahead of the text:
+
+    2:[{"type": "citations", "final": false, "rag_triggered": true, "citations": [...]}]
+
+Citations use the fields ``convertBackendCitations`` reads (rank,
+document, relevance_score, content, metadata). When the backend answers,
+its own citations follow in a second frame with ``"final": true``, which
+replaces the early ones.
+
+Snippets are formatted once per document passage and kept in an LRU
+cache, so a frequently cited passage costs a dict lookup. The cache stays
+per-process: formatting a snippet is cheaper than a shared-state round
+trip. Query embeddings, which cost an OpenAI call, are also cached in
+shared state when ``SHARED_STATE_URL`` points at a shared backend. The vector store
+is loaded in a background thread on first use; until it is ready, or when
+aura_rag isn't installed, lookups return nothing and responses stream as
+before.
+
+Environment:
+    EARLY_CITATIONS         set to 0 to send citations only with the answer
+    CITATIONS_TOP_K         documents per lookup, default 3
+    CITATIONS_TIMEOUT       seconds retrieval may take before it is skipped, default 1.5
+    CITATION_SNIPPET_CHARS  default 300
+    CITATION_CACHE_SIZE     snippets kept, default 1024
+    EMBEDDING_SHARED_TTL    seconds query embeddings stay in shared state, default 86400
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+from . import metrics, shared_state, tracing
+
+EARLY_CITATIONS = os.environ.get("EARLY_CITATIONS", "1") != "0"
+TOP_K = int(os.environ.get("CITATIONS_TOP_K", "3"))
+TIMEOUT = float(os.environ.get("CITATIONS_TIMEOUT", "1.5"))
+SNIPPET_CHARS = int(os.environ.get("CITATION_SNIPPET_CHARS", "300"))
+CACHE_SIZE = int(os.environ.get("CITATION_CACHE_SIZE", "1024"))
+EMBEDDING_SHARED_TTL = float(os.environ.get("EMBEDDING_SHARED_TTL", "86400"))
+
+# Metadata keys the citation components display; everything else stays server-side
+METADATA_KEYS = ("source_url", "file_path", "page_title", "document_name", "section", "page", "program")
+
+logger = tracing.get_logger("aura.chat.citations")
+
+
+def _document(metadata: Dict[str, Any]) -> str:
+    return str(metadata.get("document_name") or metadata.get("page_title") or metadata.get("file_path")
+               or metadata.get("source_url") or "")
+
+
+def _snippet(text: str) -> str:
+    text = re.sub(r"\s+", " ", text or "").strip()
+    if len(text) <= SNIPPET_CHARS:
+        return text
+    cut = text.rfind(" ", 0, SNIPPET_CHARS)
+    return text[:cut if cut > 0 else SNIPPET_CHARS].rstrip(" ,;:") + "…"
+
+
+class SnippetCache:
+    """Thread-safe LRU of formatted citations keyed by document and passage"""
+
+    def __init__(self, max_entries: int = CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(hit: Dict[str, Any]) -> str:
+        metadata = hit.get("metadata") or {}
+        passage = hashlib.sha1((hit.get("text") or "").encode()).hexdigest()[:16]
+        return f"{_document(metadata)}#{passage}"
+
+    def citation(self, hit: Dict[str, Any]) -> Dict[str, Any]:
+        """The hit's document, snippet and display metadata, formatted at most once"""
+        key = self.key(hit)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is not None:
+            metrics.citation_snippets.inc(cache="hit")
+            return entry
+
+        metrics.citation_snippets.inc(cache="miss")
+        metadata = hit.get("metadata") or {}
+        entry = {
+            "document": _document(metadata) or None,
+            "content": _snippet(hit.get("text", "")),
+            "metadata": {name: metadata[name] for name in METADATA_KEYS
+                         if isinstance(metadata.get(name), (str, int, float))},
+        }
+        with self._lock:
+            self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return entry
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+snippets = SnippetCache()
+
+
+class Retrieval:
+    """The vector store behind an AsyncRetriever, loaded once in the background"""
+
+    def __init__(self):
+        self.retriever = None
+        self.state = "unloaded"
+        self._lock = threading.Lock()
+
+    def ready(self) -> bool:
+        """True once lookups can return hits; the first call starts loading the store"""
+        if self.state == "unloaded" and EARLY_CITATIONS:
+            with self._lock:
+                if self.state == "unloaded":
+                    self.state = "loading"
+                    threading.Thread(target=self._load, name="citations-load", daemon=True).start()
+        return self.state == "ready"
+
+    def _load(self):
+        started = time.perf_counter()
+        try:
+            from async_retrieval import AsyncRetriever, openai_embed_fn
+            from vector_storage_integration import init_chatbot_vector_store
+
+            embeddings = shared_state.SharedMap("embeddings", ttl=EMBEDDING_SHARED_TTL)
+            self.retriever = AsyncRetriever(init_chatbot_vector_store(), openai_embed_fn(),
+                                            shared_cache=embeddings if embeddings.shared else None)
+            self.state = "ready"
+            logger.info("citation retrieval ready in %.2fs", time.perf_counter() - started)
+        except (Exception, SystemExit) as e:
+            # vector_storage_integration exits the process when aura_rag is missing
+            self.state = "unavailable"
+            logger.warning("early citations disabled, vector store unavailable: %s: %s", type(e).__name__, e)
+
+    async def lookup(self, query: str, top_k: int = TOP_K) -> List[Dict[str, Any]]:
+        """Citations for ``query``, best document first; empty when retrieval is unavailable or slow"""
+        if not query or not self.ready():
+            return []
+        started = time.perf_counter()
+        try:
+            hits = await asyncio.wait_for(self.retriever.search(query, top_k=top_k * 2), TIMEOUT)
+        except asyncio.TimeoutError:
+            metrics.citation_lookups.inc(outcome="timeout")
+            return []
+        except Exception as e:
+            logger.warning("citation lookup failed: %s", e)
+            metrics.citation_lookups.inc(outcome="error")
+            return []
+        metrics.citation_latency.observe(time.perf_counter() - started)
+
+        # One citation per document: its best passage
+        found: List[Dict[str, Any]] = []
+        documents = set()
+        for hit in sorted(hits, key=lambda hit: hit.get("score") or 0.0, reverse=True):
+            citation = snippets.citation(hit)
+            document = citation["document"] or snippets.key(hit)
+            if document in documents:
+                continue
+            documents.add(document)
+            found.append(dict(citation, rank=len(found) + 1, relevance_score=round(hit.get("score") or 0.0, 4)))
+            if len(found) == top_k:
+                break
+        metrics.citation_lookups.inc(outcome="found" if found else "empty")
+        tracing.trace_event("citations.early", count=len(found),
+                            ms=round((time.perf_counter() - started) * 1000, 1))
+        return found
+
+    def stats(self) -> dict:
+        return {
+            "enabled": EARLY_CITATIONS,
+            "state": self.state,
+            "snippets_cached": len(snippets),
+            "retriever": self.retriever.stats() if self.retriever is not None else None,
+        }
+
+
+retrieval = Retrieval()
+
+
+def frame(citations: List[Any], final: bool = False, rag_triggered: Optional[bool] = None) -> str:
+    """Data-stream frame carrying citations for the UI"""
+    data = {
+        "type": "citations",
+        "final": final,
+        "rag_triggered": bool(citations) if rag_triggered is None else rag_triggered,
+        "citations": citations,
+    }
+    return '2:{data}\n'.format(data=json.dumps([data]))
@@ -0,0 +1,229 @@
+"""
+Single-flight coalescing of identical concurrent chat streams
+
+Concurrent requests with the same canonical message list and model share
+one upstream completion. ``Broadcast`` runs the response generator once
+on its own thread and fans each frame out to per-subscriber queues; a
+subscriber that joins late first receives every frame emitted so far,
+then the live tail. Once the stream ends the flight is forgotten, so only
+requests that overlap in time are coalesced.
+
+The producer runs in a copy of the first request's context, so its trace,
+profile and capture record describe the upstream call; followers only see
+their own wait.
+
+``Broadcast`` also backs resumable responses (api/utils/resumable.py):
+there the history is a bounded ring and the producer lingers after the
+last subscriber leaves, so a reconnecting client can pick up the stream.
+
+Environment:
+    CHAT_COALESCING    set to 0 to give every request its own completion
+"""
+
+import contextvars
+import hashlib
+import json
+import os
+import queue
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+COALESCING_ENABLED = os.environ.get("CHAT_COALESCING", "1") != "0"
+
+_END = object()
+
+
+class HistoryTrimmed(Exception):
+    """The requested frames have already been dropped from a bounded history"""
+
+    def __init__(self, first_available: int):
+        super().__init__(f"frames before {first_available} are no longer buffered")
+        self.first_available = first_available
+
+
+def request_key(messages: List[Any], model: str) -> str:
+    """Hash of the canonical (key-sorted) message list and model"""
+    canonical = json.dumps({"model": model, "messages": messages},
+                           sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+class Broadcast:
+    """
+    One producer, many subscribers
+
+    Frames are appended to ``history`` and put on every subscriber's queue
+    under one lock, so a subscriber never misses or repeats a frame however
+    it interleaves with the producer. Queues are unbounded: one completion
+    is small, and a slow client must not stall the others.
+
+    With ``max_history`` the history keeps only the newest frames; frame
+    indexes stay absolute and ``trimmed`` counts the dropped ones. The
+    producer stops once every subscriber has been gone for ``linger``
+    seconds (immediately by default).
+
+    ``start`` runs the producer on a new daemon thread per response, not on
+    the request threadpool: the producer outlives the request that started
+    it (followers and lingering resumable streams keep it going), and
+    parking it in the bounded pool would starve sync endpoints. So a live
+    thread costs one per in-flight completion, not one per subscriber.
+    """
+
+    def __init__(self, source: Iterator[str], on_done: Optional[Callable[[], None]] = None,
+                 max_history: Optional[int] = None, linger: float = 0.0):
+        self.history: "deque[str]" = deque(maxlen=max_history)
+        self.trimmed = 0
+        self.done = False
+        self.finished_at: Optional[float] = None
+        self.error: Optional[BaseException] = None
+        self.linger = linger
+        self._source = source
+        self._on_done = on_done
+        self._subscribers: List["queue.Queue[Any]"] = []
+        self._subscribed = False
+        self._abandoned_at: Optional[float] = None
+        self._callbacks: List[Callable[[], None]] = []
+        self._lock = threading.Lock()
+
+    def start(self) -> "Broadcast":
+        context = contextvars.copy_context()
+        threading.Thread(target=context.run, args=(self._produce,),
+                         name="chat-broadcast", daemon=True).start()
+        return self
+
+    def subscribe(self, start: int = 0) -> Iterator[str]:
+        """
+        Frames from index ``start`` of the stream: history first, then the live tail
+
+        Raises:
+            HistoryTrimmed: frames from ``start`` on are no longer all buffered
+        """
+        subscriber: "queue.Queue[Any]" = queue.Queue()
+        with self._lock:
+            if start < self.trimmed:
+                raise HistoryTrimmed(self.trimmed)
+            for index, frame in enumerate(self.history, self.trimmed):
+                if index >= start:
+                    subscriber.put_nowait(frame)
+            if self.done:
+                subscriber.put_nowait(_END)
+            else:
+                self._subscribers.append(subscriber)
+                self._abandoned_at = None
+            self._subscribed = True
+        return self._drain(subscriber)
+
+    def stop_lingering(self):
+        """Stop producing as soon as nobody is subscribed, e.g. when no client can resume"""
+        with self._lock:
+            self.linger = 0.0
+
+    def add_done_callback(self, callback: Callable[[], None]):
+        """Call ``callback`` once the producer has finished (now, if it already has)"""
+        with self._lock:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback()
+
+    @property
+    def frames(self) -> int:
+        """Frames produced so far"""
+        with self._lock:
+            return self.trimmed + len(self.history)
+
+    @property
+    def subscribers(self) -> int:
+        with self._lock:
+            return len(self._subscribers)
+
+    def _drain(self, subscriber: "queue.Queue[Any]") -> Iterator[str]:
+        try:
+            while True:
+                frame = subscriber.get()
+                if frame is _END:
+                    break
+                yield frame
+            if self.error is not None:
+                raise self.error
+        finally:
+            with self._lock:
+                if subscriber in self._subscribers:
+                    self._subscribers.remove(subscriber)
+                    if not self._subscribers:
+                        self._abandoned_at = time.monotonic()
+
+    def _produce(self):
+        try:
+            for frame in self._source:
+                with self._lock:
+                    if self._subscribed and not self._subscribers and (
+                            self._abandoned_at is None or time.monotonic() - self._abandoned_at >= self.linger):
+                        # Every client went away (and none came back); stop paying for the completion
+                        break
+                    if len(self.history) == self.history.maxlen:
+                        self.trimmed += 1
+                    self.history.append(frame)
+                    for subscriber in self._subscribers:
+                        subscriber.put_nowait(frame)
+        except Exception as e:
+            self.error = e
+        finally:
+            close = getattr(self._source, "close", None)
+            if close is not None:
+                close()
+            with self._lock:
+                self.done = True
+                self.finished_at = time.monotonic()
+                for subscriber in self._subscribers:
+                    subscriber.put_nowait(_END)
+                callbacks, self._callbacks = self._callbacks, []
+            if self._on_done is not None:
+                self._on_done()
+            for callback in callbacks:
+                callback()
+
+
+class SingleFlight:
+    """Key -> in-flight Broadcast; the first request for a key starts it, the rest join"""
+
+    def __init__(self):
+        self._flights: Dict[str, Broadcast] = {}
+        self._lock = threading.Lock()
+
+    def join(self, key: str, factory: Callable[[], Iterator[str]],
+             **options) -> Tuple[Broadcast, Iterator[str], bool]:
+        """
+        Subscribe to the flight for ``key``, starting one from ``factory()``
+        if none is running; ``options`` configure a newly started Broadcast
+        (``max_history``, ``linger``)
+
+        Returns:
+            (flight, frames for this request, whether it joined an existing flight)
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            # A flight whose history was trimmed can't replay its start to a newcomer
+            joined = flight is not None and not flight.trimmed
+            if not joined:
+                flight = Broadcast(factory(), on_done=lambda: self._forget(key, flight), **options)
+                self._flights[key] = flight
+            # Subscribe before starting so the producer never sees zero subscribers
+            frames = flight.subscribe()
+        if not joined:
+            flight.start()
+        return flight, frames, joined
+
+    def _forget(self, key: str, flight: Broadcast):
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._flights)
+
+
+chat_streams = SingleFlight()
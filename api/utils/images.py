@@ -0,0 +1,198 @@
+"""
+Image attachment preprocessing
+
+Attachments from the chat UI arrive as base64 data URLs, often full-size
+phone photos, and are resent with every turn they stay in the history.
+Before they go to OpenAI they are decoded, EXIF-rotated, downsized and
+re-encoded (JPEG, or PNG when the image has transparency), and a vision
+``detail`` level is picked for each one:
+
+- images no larger than ``IMAGE_LOW_DETAIL_MAX`` on either side are sent
+  with ``detail: low``, a flat 85 tokens that loses nothing at that size
+- larger images use ``detail: high`` and are scaled to what OpenAI would
+  scale them to anyway (within 2048 x 2048, shortest side 768), so the
+  upload shrinks without changing what the model sees
+
+Results are cached by a hash of the data URL, so the image is processed
+once and later turns reuse it. With a shared ``SHARED_STATE_URL`` backend
+the cache is shared too, so a turn landing on another worker doesn't
+process the image again. Remote (http) URLs are passed through for
+OpenAI to fetch, as is everything when Pillow is not installed.
+
+Environment:
+    IMAGE_PREPROCESSING     set to 0 to forward attachments unchanged
+    IMAGE_MAX_DIMENSION     longest side in pixels, default 2048
+    IMAGE_JPEG_QUALITY      default 85
+    IMAGE_LOW_DETAIL_MAX    default 512
+    IMAGE_CACHE_MB          processed images kept in memory, default 64
+    IMAGE_SHARED_TTL        seconds processed images stay in shared state, default 3600
+"""
+
+import base64
+import binascii
+import hashlib
+import io
+import os
+import threading
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Optional
+
+from . import metrics, shared_state, tracing
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = ImageOps = None
+
+PREPROCESSING_ENABLED = os.environ.get("IMAGE_PREPROCESSING", "1") != "0"
+MAX_DIMENSION = int(os.environ.get("IMAGE_MAX_DIMENSION", "2048"))
+JPEG_QUALITY = int(os.environ.get("IMAGE_JPEG_QUALITY", "85"))
+LOW_DETAIL_MAX = int(os.environ.get("IMAGE_LOW_DETAIL_MAX", "512"))
+CACHE_BYTES = int(float(os.environ.get("IMAGE_CACHE_MB", "64")) * 1024 * 1024)
+SHARED_TTL = float(os.environ.get("IMAGE_SHARED_TTL", "3600"))
+
+# OpenAI scales high-detail images so the shortest side is at most this
+HIGH_DETAIL_SHORT_SIDE = 768
+
+logger = tracing.get_logger("aura.chat.images")
+
+
+@dataclass(frozen=True)
+class ProcessedImage:
+    url: str
+    detail: str
+    width: int
+    height: int
+    original_bytes: int
+    size: int
+
+    def part(self) -> Dict[str, Any]:
+        return {"type": "image_url", "image_url": {"url": self.url, "detail": self.detail}}
+
+
+def target_size(width: int, height: int) -> tuple:
+    """Size the image is reduced to: within MAX_DIMENSION, shortest side at most 768"""
+    scale = min(1.0, MAX_DIMENSION / max(width, height), HIGH_DETAIL_SHORT_SIDE / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+
+class ImageCache:
+    """Thread-safe LRU of processed images, bounded by their encoded size"""
+
+    def __init__(self, max_bytes: int = CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self._entries: "OrderedDict[str, ProcessedImage]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[ProcessedImage]:
+        with self._lock:
+            image = self._entries.get(key)
+            if image is not None:
+                self._entries.move_to_end(key)
+            return image
+
+    def put(self, key: str, image: ProcessedImage):
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = image
+            self.bytes += len(image.url)
+            while self.bytes > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                self.bytes -= len(evicted.url)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+cache = ImageCache()
+# Second level behind ``cache``, visible to every worker when the backend is shared
+shared = shared_state.SharedMap("images", ttl=SHARED_TTL)
+
+
+def _decode_data_url(url: str) -> Optional[bytes]:
+    header, _, data = url.partition(",")
+    if not header.startswith("data:image/") or ";base64" not in header:
+        return None
+    try:
+        return base64.b64decode(data, validate=True)
+    except (binascii.Error, ValueError):
+        return None
+
+
+def process(url: str) -> Optional[ProcessedImage]:
+    """Downsized, re-encoded version of a data-URL image, or None to send it unchanged"""
+    raw = _decode_data_url(url)
+    if raw is None:
+        return None
+
+    with Image.open(io.BytesIO(raw)) as image:
+        original_size = image.size
+        width, height = target_size(*image.size)
+        if (width, height) != image.size:
+            # For JPEGs this decodes at a reduced scale instead of at full size
+            image.thumbnail((width, height), Image.LANCZOS)
+        image = ImageOps.exif_transpose(image)
+        transparent = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+        encoded = io.BytesIO()
+        if transparent:
+            image.save(encoded, format="PNG", optimize=True)
+            media_type = "image/png"
+        else:
+            image.convert("RGB").save(encoded, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+            media_type = "image/jpeg"
+        width, height = image.size
+
+    data = encoded.getvalue()
+    if len(data) >= len(raw) and (width, height) == original_size:
+        # Already small and well compressed; only the detail level changes
+        processed_url = url
+        data = raw
+    else:
+        processed_url = f"data:{media_type};base64,{base64.b64encode(data).decode('ascii')}"
+    detail = "low" if max(width, height) <= LOW_DETAIL_MAX else "high"
+    return ProcessedImage(processed_url, detail, width, height, len(raw), len(data))
+
+
+def image_part(url: str) -> Dict[str, Any]:
+    """OpenAI ``image_url`` content part for an attachment, preprocessed when possible"""
+    passthrough = {"type": "image_url", "image_url": {"url": url}}
+    if not PREPROCESSING_ENABLED or Image is None or not url.startswith("data:"):
+        metrics.image_attachments.inc(outcome="passthrough")
+        return passthrough
+
+    key = hashlib.sha256(url.encode()).hexdigest()
+    processed = cache.get(key)
+    if processed is not None:
+        metrics.image_attachments.inc(outcome="cached")
+        return processed.part()
+    if shared.shared:
+        stored = shared.get(key)
+        if stored is not None:
+            processed = ProcessedImage(**stored)
+            cache.put(key, processed)
+            metrics.image_attachments.inc(outcome="shared")
+            return processed.part()
+
+    try:
+        processed = process(url)
+    except Exception as e:
+        # Unreadable, truncated or a decompression bomb; OpenAI gets to decide
+        logger.warning("image preprocessing failed: %s", e)
+        metrics.image_attachments.inc(outcome="failed")
+        return passthrough
+    if processed is None:
+        metrics.image_attachments.inc(outcome="passthrough")
+        return passthrough
+
+    cache.put(key, processed)
+    if shared.shared:
+        shared.set(key, asdict(processed))
+    metrics.image_attachments.inc(outcome="processed")
+    metrics.image_bytes_saved.inc(max(processed.original_bytes - processed.size, 0))
+    tracing.trace_event("image.processed", original_bytes=processed.original_bytes, bytes=processed.size,
+                        width=processed.width, height=processed.height, detail=processed.detail)
+    return processed.part()
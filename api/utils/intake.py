@@ -0,0 +1,294 @@
+"""
+Local extraction of intake fields
+
+During ``welcome_data_collection`` most user turns just answer "who are
+you": a name, an email, a role, a school or department. Those answers are
+pulled out here with compiled patterns and a small gazetteer of Yale
+schools and departments, so a turn that supplies every field still missing
+can be answered without an LLM round trip. Anything less certain (a
+question, a negation, an unrecognised school) falls through to the
+chatbot service as before.
+
+Field names follow the backend's ``database_fields`` / ``should_collect``
+keys; ``as_extracted_data`` maps them to the ``extracted_data`` keys that
+app/api/sessions/sync-data expects.
+
+Environment:
+    INTAKE_FAST_PATH        set to 0 to always call the chatbot service
+    INTAKE_MIN_CONFIDENCE   per-field confidence needed to skip the LLM, default 0.8
+"""
+
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from . import metrics
+
+FAST_PATH_ENABLED = os.environ.get("INTAKE_FAST_PATH", "1") != "0"
+MIN_CONFIDENCE = float(os.environ.get("INTAKE_MIN_CONFIDENCE", "0.8"))
+
+# What the chatbot service asks for first when the session doesn't say
+DEFAULT_REQUIRED = ("user_name", "user_role")
+
+# Conversation phases, in order (see components/admin-dashboard.tsx); a
+# session leaves the first once every required field is collected
+PHASES = ("welcome_data_collection", "assessment_guidance", "guidance_completion")
+
+# Alias -> affiliation code used by the frontend's mapSchoolAffiliation
+SCHOOLS: Dict[str, str] = {
+    "yale college": "yc",
+    "school of engineering and applied science": "seas",
+    "school of engineering": "seas",
+    "engineering school": "seas",
+    "seas": "seas",
+    "school of medicine": "med",
+    "medical school": "med",
+    "ysm": "med",
+    "school of management": "som",
+    "business school": "som",
+    "som": "som",
+    "law school": "law",
+    "yale law": "law",
+    "graduate school of arts and sciences": "gsas",
+    "graduate school": "gsas",
+    "gsas": "gsas",
+    "school of public health": "ysph",
+    "ysph": "ysph",
+    "school of nursing": "nursing",
+    "nursing school": "nursing",
+    "school of art": "art",
+    "school of music": "music",
+    "school of drama": "drama",
+    "david geffen school of drama": "drama",
+    "school of architecture": "architecture",
+    "divinity school": "divinity",
+    "school of the environment": "environment",
+    "school of environment": "environment",
+    "jackson school": "jackson",
+    "jackson school of global affairs": "jackson",
+}
+
+DEPARTMENTS = (
+    "applied mathematics", "applied physics", "anthropology", "astronomy", "biomedical engineering",
+    "cell biology", "chemical engineering", "chemistry", "computer science", "dermatology",
+    "ecology and evolutionary biology", "economics", "electrical engineering", "english",
+    "environmental engineering", "genetics", "history", "immunobiology", "internal medicine",
+    "linguistics", "materials science", "mathematics", "mechanical engineering",
+    "molecular biophysics and biochemistry", "molecular, cellular and developmental biology",
+    "neurology", "neuroscience", "pathology", "pediatrics", "pharmacology", "philosophy", "physics",
+    "political science", "psychiatry", "psychology", "radiology", "sociology", "statistics and data science",
+    "surgery", "urology",
+)
+
+# Role keyword -> role value stored in user_role (see mapUserRole)
+ROLES: Dict[str, str] = {
+    "undergrad": "student", "undergraduate": "student", "grad student": "student",
+    "graduate student": "student", "phd student": "student", "phd candidate": "student",
+    "mba student": "student", "medical student": "student", "student": "student",
+    "postdoc": "postdoc", "postdoctoral fellow": "postdoc", "postdoctoral researcher": "postdoc",
+    "professor": "faculty", "assistant professor": "faculty", "associate professor": "faculty",
+    "faculty": "faculty", "faculty member": "faculty", "lecturer": "faculty",
+    "staff": "staff", "staff member": "staff", "research scientist": "staff",
+    "alum": "alumni", "alumnus": "alumni", "alumna": "alumni", "alumni": "alumni",
+    "founder": "founder", "co-founder": "founder", "cofounder": "founder", "entrepreneur": "entrepreneur",
+}
+
+
+def _alternation(phrases: Iterable[str]) -> str:
+    # Longest first so "school of engineering and applied science" beats "school of engineering"
+    return "|".join(re.escape(phrase) for phrase in sorted(phrases, key=len, reverse=True))
+
+
+EMAIL = re.compile(r"\b[\w.+-]+@[\w-]+(?:\.[\w-]+)+\b")
+NAME_WORD = r"[A-Z][a-z'\-]+"
+NAME = rf"({NAME_WORD}(?:\s+{NAME_WORD}){{0,3}})"
+# "Dr. Jones": the title is dropped from the name but confirms it is one
+TITLE = r"(?:(Dr|Prof|Professor|Mr|Mrs|Ms|Mx)\.?\s+)?"
+# Only the lead-in is case-insensitive; the name itself must be capitalised
+EXPLICIT_NAME = re.compile(rf"\b(?i:my name is|my name's|name:)\s+{TITLE}{NAME}")
+INTRODUCED_NAME = re.compile(rf"\b(?i:I'm|I am|this is|it's)\s+{TITLE}{NAME}")
+BARE_NAME = re.compile(rf"^\s*{NAME}\s*[.!]?\s*$")
+ROLE = re.compile(rf"(?:(\bI'm|\bI am|\bI work as|\bas|,)\s+(?:an?\s+)?(?:[\w-]+\s+){{0,2}}?)?\b({_alternation(ROLES)})\b",
+                  re.IGNORECASE)
+SCHOOL = re.compile(rf"\b(?:yale\s+)?({_alternation(SCHOOLS)})\b", re.IGNORECASE)
+DEPARTMENT = re.compile(rf"\b({_alternation(DEPARTMENTS)})\b", re.IGNORECASE)
+UNKNOWN_DEPARTMENT = re.compile(r"\bdepartment of ((?:[A-Z][a-z]+\s*){1,4})")
+NEGATION = re.compile(r"\b(not|no longer|never|n't|former|formerly|used to)\b[\w\s']{0,20}$", re.IGNORECASE)
+QUESTION = re.compile(r"\?|^\s*(how|what|why|when|where|who|which|can|could|should|do|does|is|are)\b",
+                      re.IGNORECASE)
+
+# Capitalised words that follow "I'm" without being a name
+NOT_NAMES = {"a", "an", "the", "in", "at", "from", "with", "here", "interested", "looking", "working",
+             "trying", "just", "currently", "also", "not", "yale", "new", "glad", "happy", "hoping",
+             "this", "that", "it", "there", "so", "very", "really", "super", "still", "back", "done",
+             "excited", "thrilled", "delighted", "pleased", "great", "good", "fine", "well", "ok", "okay",
+             "sure", "sorry", "ready", "curious", "grateful", "thankful", "eager", "keen", "based",
+             "originally", "always", "doing", "going", "calling", "reaching", "writing", "thinking",
+             "wondering", "planning", "building", "starting", "hi", "hello", "hey", "thanks", "yes", "no",
+             "dr", "prof", "mr", "mrs", "ms", "mx", "i", "i'm", "and", "or", "but", "honestly", "actually",
+             "basically", "lost", "confused", "stuck", "unsure", "uncertain", "nervous", "worried",
+             "busy", "tired", "late", "available", "free", "stressed", "overwhelmed", "confident",
+             "certain", "patents", "funding", "startup", "student", "on", "for", "to", "of", "about"}
+
+# "I'm Sarah" could still be "I'm Stuck"; a single word after "I'm" or "this
+# is" stays below MIN_CONFIDENCE unless a title or a surname confirms it
+UNCONFIRMED_NAME_CONFIDENCE = 0.6
+# "My name is ..."; the only kind of name that replaces one the session already has
+EXPLICIT_NAME_CONFIDENCE = 0.95
+
+
+@dataclass
+class Extraction:
+    fields: Dict[str, str] = field(default_factory=dict)
+    confidence: Dict[str, float] = field(default_factory=dict)
+    question: bool = False
+
+    def add(self, name: str, value: str, confidence: float):
+        if confidence > self.confidence.get(name, 0.0):
+            self.fields[name] = value
+            self.confidence[name] = confidence
+
+    def confident(self, names: Iterable[str], threshold: float = MIN_CONFIDENCE) -> bool:
+        return all(self.confidence.get(name, 0.0) >= threshold for name in names)
+
+    def confident_fields(self, threshold: float = MIN_CONFIDENCE) -> Dict[str, str]:
+        return {name: value for name, value in self.fields.items() if self.confidence[name] >= threshold}
+
+    def as_extracted_data(self, threshold: float = MIN_CONFIDENCE) -> Dict[str, str]:
+        keys = {"user_name": "name", "user_email": "email", "user_role": "role"}
+        return {keys.get(name, name): value for name, value in self.confident_fields(threshold).items()}
+
+
+def _negated(text: str, start: int) -> bool:
+    return bool(NEGATION.search(text[max(start - 30, 0):start]))
+
+
+def _clean_name(candidate: str, strict: bool = False) -> Optional[str]:
+    """
+    The name in ``candidate`` without trailing filler, or None
+
+    ``strict`` rejects any candidate containing a non-name word, for
+    patterns where a capitalised phrase ("I'm Very Confused") is as likely
+    as a name.
+    """
+    words = candidate.split()
+    if strict and any(word.lower() in NOT_NAMES for word in words):
+        return None
+    while words and words[-1].lower() in NOT_NAMES | set(ROLES):
+        words.pop()
+    if not words or words[0].lower() in NOT_NAMES:
+        return None
+    return " ".join(words)
+
+
+def extract(text: str) -> Extraction:
+    """Intake fields found in one user message, each with a confidence in [0, 1]"""
+    result = Extraction(question=bool(QUESTION.search(text)))
+
+    email = EMAIL.search(text)
+    if email:
+        result.add("user_email", email.group(0).lower(), 0.99)
+
+    for pattern, confidence in ((EXPLICIT_NAME, EXPLICIT_NAME_CONFIDENCE), (INTRODUCED_NAME, 0.85),
+                                (BARE_NAME, 0.6)):
+        for match in pattern.finditer(text):
+            name = _clean_name(match.group(match.lastindex), strict=pattern is not EXPLICIT_NAME)
+            if not name or SCHOOL.fullmatch(name) or DEPARTMENT.fullmatch(name):
+                continue
+            titled = pattern is not BARE_NAME and match.group(1) is not None
+            confirmed = pattern is not INTRODUCED_NAME or titled or " " in name
+            result.add("user_name", name, confidence if confirmed else UNCONFIRMED_NAME_CONFIDENCE)
+            break
+
+    for match in ROLE.finditer(text):
+        if _negated(text, match.start(2)):
+            continue
+        # "I'm a postdoc" is explicit; a bare keyword might be about someone else
+        result.add("user_role", ROLES[match.group(2).lower()], 0.9 if match.group(1) else 0.7)
+
+    for match in SCHOOL.finditer(text):
+        if not _negated(text, match.start()):
+            result.add("school_affiliation", SCHOOLS[match.group(1).lower()], 0.9)
+
+    for match in DEPARTMENT.finditer(text):
+        if not _negated(text, match.start()):
+            result.add("department", match.group(1).lower(), 0.85)
+    unknown = UNKNOWN_DEPARTMENT.search(text)
+    if unknown:
+        result.add("department", unknown.group(1).strip().lower(), 0.6)
+
+    return result
+
+
+def missing_fields(session) -> List[str]:
+    """Required intake fields the session still lacks"""
+    missing = getattr(session, "missing_required", None)
+    if missing is not None:
+        return list(missing)
+    known = getattr(session, "database_fields", None) or {}
+    return [name for name in DEFAULT_REQUIRED if not known.get(name)]
+
+
+def _reply(fields: Dict[str, str]) -> str:
+    first_name = fields.get("user_name", "").split(" ")[0]
+    greeting = f"Thanks, {first_name}!" if first_name else "Thanks!"
+    return (f"{greeting} I've noted your details. What brings you to Yale Ventures today? "
+            "For example, are you exploring an idea, looking for funding, or protecting an invention?")
+
+
+def local_response(session, message: str) -> Optional[Tuple[dict, Extraction]]:
+    """
+    Response data for an intake answer that needs no LLM, or None
+
+    The turn is served locally only when the session is collecting intake
+    data, the message is not a question, and every missing required field
+    was extracted with at least ``MIN_CONFIDENCE``. Only fields that
+    confident are stored, and a stored name is only replaced by an
+    explicit "my name is ...". With every required field collected the
+    session moves on to the next phase.
+    """
+    if not FAST_PATH_ENABLED:
+        return None
+    phase = getattr(session, "current_phase", PHASES[0])
+    if phase != PHASES[0]:
+        return None
+
+    extraction = extract(message or "")
+    missing = missing_fields(session)
+    if extraction.question or not missing or not extraction.confident(missing):
+        metrics.intake_turns.inc(served="llm")
+        return None
+
+    known = dict(getattr(session, "database_fields", None) or {})
+    accepted = extraction.confident_fields()
+    if known.get("user_name") and extraction.confidence.get("user_name", 0.0) < EXPLICIT_NAME_CONFIDENCE:
+        accepted.pop("user_name", None)
+    known.update(accepted)
+    metrics.intake_turns.inc(served="local")
+    return {
+        "response": _reply(known),
+        "phase": PHASES[1],
+        # The first of the phases is done
+        "completion_rate": max(getattr(session, "completion_rate", 0.0) or 0.0, round(1 / len(PHASES), 2)),
+        "should_collect": [],
+        "next_actions": [],
+        "rag_triggered": False,
+        "citations": [],
+        "database_fields": known,
+        "missing_required": [],
+        "extracted_data": {key: value for key, value in extraction.as_extracted_data().items()
+                           if key != "name" or "user_name" in accepted},
+    }, extraction
+
+
+def stats() -> dict:
+    local = metrics.intake_turns.value(served="local")
+    llm = metrics.intake_turns.value(served="llm")
+    total = local + llm
+    return {
+        "enabled": FAST_PATH_ENABLED,
+        "turns": int(total),
+        "served_locally": int(local),
+        "local_share": round(local / total, 3) if total else None,
+    }
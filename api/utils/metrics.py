@@ -0,0 +1,220 @@
+"""
+In-process request metrics in the Prometheus text exposition format
+
+Counters and histograms are kept per label set behind one lock, so they
+can be updated from the threadpool that drives sync streaming generators
+as well as from the event loop. Each serverless instance / uvicorn worker
+reports only its own values, scraped as separate series; aggregate them
+at query time, e.g. ``sum by (route) (rate(chat_requests_total[5m]))``.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds: spans sub-100ms tool calls up to slow multi-tool streams
+LATENCY_BUCKETS = (0.05, 0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0, 20.0, 40.0)
+TOKEN_BUCKETS = (16, 64, 128, 256, 512, 1024, 2048, 4096, 8192, 16384, 32768)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+_lock = threading.Lock()
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key) + ([extra] if extra else [])
+    if not pairs:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in pairs
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        with _lock:
+            return self._values.get(_label_key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with _lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self._values: Dict[LabelKey, float] = {}
+
+    def set(self, value: float, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge"]
+        with _lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [per-bucket counts..., +Inf count], sum
+        self._counts: Dict[LabelKey, List[int]] = {}
+        self._sums: Dict[LabelKey, float] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with _lock:
+            counts = self._counts.get(key)
+            if counts is None:
+                counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+                self._sums[key] = 0.0
+            counts[index] += 1
+            self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def count(self, **labels) -> int:
+        with _lock:
+            return sum(self._counts.get(_label_key(labels), []))
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with _lock:
+            for key in sorted(self._counts):
+                cumulative = 0
+                for bound, count in zip(self.buckets + (float("inf"),), self._counts[key]):
+                    cumulative += count
+                    le = ("le", _format_value(bound))
+                    lines.append(f"{self.name}_bucket{_format_labels(key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(self._sums[key])}")
+                lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, documentation: str) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, documentation))
+
+    def gauge(self, name: str, documentation: str) -> Gauge:
+        return self._metrics.setdefault(name, Gauge(name, documentation))
+
+    def histogram(self, name: str, documentation: str,
+                  buckets: Sequence[float] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, documentation, buckets))
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# Chat metrics; every series is labeled route="backend" or route="direct"
+chat_requests = registry.counter(
+    "chat_requests_total", "Chat requests by route and outcome")
+time_to_first_token = registry.histogram(
+    "chat_time_to_first_token_seconds", "Time from request to the first streamed frame")
+stream_duration = registry.histogram(
+    "chat_stream_duration_seconds", "Total time spent producing a chat response stream")
+backend_proxy_latency = registry.histogram(
+    "chat_backend_proxy_latency_seconds", "Latency of BACKEND_URL calls by endpoint")
+tool_latency = registry.histogram(
+    "chat_tool_latency_seconds", "Tool execution time by tool name")
+prompt_tokens = registry.histogram(
+    "chat_prompt_tokens", "Prompt tokens per completion", TOKEN_BUCKETS)
+completion_tokens = registry.histogram(
+    "chat_completion_tokens", "Completion tokens per completion", TOKEN_BUCKETS)
+tokens_total = registry.counter(
+    "chat_tokens_total", "Tokens consumed by kind (prompt or completion)")
+coalesced_requests = registry.counter(
+    "chat_coalesced_requests_total", "Requests served by joining an identical in-flight completion")
+model_routes = registry.counter(
+    "chat_model_routes_total", "Routing decisions by model tier and reason")
+model_ttft = registry.histogram(
+    "chat_model_time_to_first_token_seconds", "Upstream time to first token by model tier")
+model_tier_degraded = registry.counter(
+    "chat_model_tier_degraded_total", "Times a model tier was marked degraded, by cause")
+model_cost = registry.counter(
+    "chat_model_cost_usd_total", "Estimated OpenAI spend by model tier")
+model_savings = registry.counter(
+    "chat_model_savings_usd_total", "Estimated spend saved versus routing everything to the full tier")
+intake_turns = registry.counter(
+    "chat_intake_turns_total", "Intake-phase turns by where they were served (local extractor or llm)")
+tool_speculation = registry.counter(
+    "chat_tool_speculation_total", "Speculative tool runs by outcome (started, used, discarded, abandoned)")
+shared_state_ops = registry.counter(
+    "chat_shared_state_ops_total", "Shared state operations by backend, operation and outcome")
+image_attachments = registry.counter(
+    "chat_image_attachments_total", "Image attachments by preprocessing outcome (processed, cached, shared, passthrough, failed)")
+image_bytes_saved = registry.counter(
+    "chat_image_bytes_saved_total", "Bytes removed from image attachments by downsizing and re-encoding")
+citation_lookups = registry.counter(
+    "chat_citation_lookups_total", "Early citation lookups by outcome (found, empty, timeout, error)")
+citation_latency = registry.histogram(
+    "chat_citation_latency_seconds", "Retrieval time for early citations")
+citation_snippets = registry.counter(
+    "chat_citation_snippets_total", "Citation snippets by cache result (hit or miss)")
+stream_retries = registry.counter(
+    "chat_stream_retries_total", "Upstream stream retries after a failure, by error type")
+stream_recoveries = registry.counter(
+    "chat_stream_recoveries_total", "Responses completed after an upstream failure, by how (openai or backend)")
+resumed_streams = registry.counter(
+    "chat_resumed_streams_total", "Resume attempts by outcome (resumed, expired, trimmed)")
+websocket_connections = registry.gauge(
+    "chat_websocket_connections", "Open /api/chat/ws connections")
+websocket_events = registry.counter(
+    "chat_websocket_events_total", "WebSocket lifecycle and backpressure events")
+admission_decisions = registry.counter(
+    "chat_admission_total", "Admission decisions by outcome (admitted, queued, rejected reason)")
+admission_wait = registry.histogram(
+    "chat_admission_wait_seconds", "Time admitted requests spent in the admission queue")
+admission_state = registry.gauge(
+    "chat_admission_state", "Admission controller state: active, queued and concurrency limit")
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
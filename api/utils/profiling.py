@@ -0,0 +1,250 @@
+"""
+Opt-in per-request profiling
+
+A request is profiled when it carries ``x-profile: 1`` together with a
+valid admin token, or when it is picked by ``PROFILE_SAMPLE_RATE``. The
+profile is a cProfile of the request's synchronous segments (message
+conversion, each step of the response stream) plus a time breakdown:
+
+- ``wall_ms``: request start to end of the response body
+- ``cpu_ms``: thread CPU time inside profiled segments
+- ``upstream_wait_ms``: time blocked on OpenAI, BACKEND_URL or tool HTTP calls
+- ``other_ms``: the rest (event loop scheduling, client backpressure)
+
+cProfile is never enabled across an ``await``, where it would record
+other requests' coroutines. Profiles are kept in a bounded directory and
+served by the admin endpoints in api/index.py.
+
+Environment:
+    PROFILE_SAMPLE_RATE    share of requests profiled without the header (default 0)
+    PROFILE_DIR            default /tmp/aura_profiles (the only writable path on Vercel)
+    PROFILE_MAX_FILES      profiles kept before the oldest are deleted (default 50)
+"""
+
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+PROFILE_HEADER = "x-profile"
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", "/tmp/aura_profiles")
+PROFILE_MAX_FILES = int(os.environ.get("PROFILE_MAX_FILES", "50"))
+PROFILE_ID_PATTERN = re.compile(r"^[A-Za-z0-9._-]{1,80}$")
+
+_current_profile: contextvars.ContextVar[Optional["RequestProfile"]] = contextvars.ContextVar(
+    "current_profile", default=None)
+
+
+class RequestProfile:
+    """cProfile plus wall / CPU / upstream-wait accounting for one request"""
+
+    def __init__(self, profile_id: str, method: str, path: str, reason: str):
+        self.profile_id = profile_id
+        self.method = method
+        self.path = path
+        self.reason = reason
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.profiler = cProfile.Profile()
+        self.cpu_seconds = 0.0
+        self.upstream_seconds = 0.0
+        self.segments = 0
+        self.profiler_busy = 0
+        self.finished = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def running(self, upstream: bool = False) -> Iterator[None]:
+        """
+        Profile a synchronous segment in the current thread
+
+        Args:
+            upstream: Off-CPU time in the segment is time blocked on an
+                upstream (e.g. pulling the next chunk of an OpenAI stream)
+        """
+        # Segments of one request run one at a time, but be safe if they don't
+        enabled = self._lock.acquire(blocking=False)
+        if enabled:
+            try:
+                self.profiler.enable()
+            except ValueError:
+                # Another profiler is active in this thread
+                self._lock.release()
+                enabled = False
+        if not enabled:
+            self.profiler_busy += 1
+        wall_start, cpu_start = time.perf_counter(), time.thread_time()
+        try:
+            yield
+        finally:
+            cpu = time.thread_time() - cpu_start
+            wall = time.perf_counter() - wall_start
+            if enabled:
+                self.profiler.disable()
+                self._lock.release()
+            self.cpu_seconds += cpu
+            self.segments += 1
+            if upstream:
+                self.upstream_seconds += max(wall - cpu, 0.0)
+
+    @contextmanager
+    def upstream(self) -> Iterator[None]:
+        """Time an await on an upstream; not profiled"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.upstream_seconds += time.perf_counter() - start
+
+    def summary(self, top: int = 25) -> dict:
+        wall = time.perf_counter() - self._start
+        output = io.StringIO()
+        try:
+            stats = pstats.Stats(self.profiler, stream=output)
+            stats.sort_stats("cumulative").print_stats(top)
+        except TypeError:
+            # Nothing was profiled
+            output.write("no profiled segments\n")
+        return {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "reason": self.reason,
+            "started_at": self.started_at,
+            "wall_ms": round(wall * 1000, 2),
+            "cpu_ms": round(self.cpu_seconds * 1000, 2),
+            "upstream_wait_ms": round(self.upstream_seconds * 1000, 2),
+            "other_ms": round(max(wall - self.cpu_seconds - self.upstream_seconds, 0.0) * 1000, 2),
+            "segments": self.segments,
+            "segments_without_cprofile": self.profiler_busy,
+            "top_functions": output.getvalue(),
+        }
+
+
+class ProfileStore:
+    """Directory of <id>.prof (pstats dump) + <id>.json (summary), capped at max_files profiles"""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_files: int = PROFILE_MAX_FILES):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def save(self, profile: RequestProfile) -> Optional[dict]:
+        summary = profile.summary()
+        with self._lock:
+            try:
+                self.directory.mkdir(parents=True, exist_ok=True)
+                profile.profiler.dump_stats(str(self.directory / f"{profile.profile_id}.prof"))
+                (self.directory / f"{profile.profile_id}.json").write_text(json.dumps(summary))
+                self._evict()
+            except (OSError, TypeError):
+                return None
+        return summary
+
+    def _evict(self):
+        summaries = sorted(self.directory.glob("*.json"), key=lambda path: path.stat().st_mtime)
+        for path in summaries[:max(len(summaries) - self.max_files, 0)]:
+            path.unlink(missing_ok=True)
+            path.with_suffix(".prof").unlink(missing_ok=True)
+
+    def list(self) -> List[dict]:
+        if not self.directory.exists():
+            return []
+        entries = []
+        for path in sorted(self.directory.glob("*.json"), key=lambda p: p.stat().st_mtime, reverse=True):
+            try:
+                summary = json.loads(path.read_text())
+            except (OSError, ValueError):
+                continue
+            summary.pop("top_functions", None)
+            entries.append(summary)
+        return entries
+
+    def summary(self, profile_id: str) -> Optional[dict]:
+        path = self._path(profile_id, ".json")
+        return json.loads(path.read_text()) if path and path.exists() else None
+
+    def stats_path(self, profile_id: str) -> Optional[Path]:
+        path = self._path(profile_id, ".prof")
+        return path if path and path.exists() else None
+
+    def _path(self, profile_id: str, suffix: str) -> Optional[Path]:
+        if not PROFILE_ID_PATTERN.match(profile_id):
+            return None
+        return self.directory / f"{profile_id}{suffix}"
+
+
+store = ProfileStore()
+
+
+def should_profile(header_value: Optional[str], is_admin: bool) -> Optional[str]:
+    """Reason to profile this request, or None"""
+    if header_value in ("1", "true") and is_admin:
+        return "header"
+    if PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE:
+        return "sampled"
+    return None
+
+
+def start_profile(profile_id: str, method: str, path: str, reason: str) -> RequestProfile:
+    profile = RequestProfile(profile_id, method, path, reason)
+    _current_profile.set(profile)
+    return profile
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current_profile.get()
+
+
+def finish_profile(profile: RequestProfile) -> Optional[dict]:
+    if profile.finished:
+        return None
+    profile.finished = True
+    return store.save(profile)
+
+
+@contextmanager
+def segment(upstream: bool = False) -> Iterator[None]:
+    """Profile a synchronous block if the current request is being profiled"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+    else:
+        with profile.running(upstream=upstream):
+            yield
+
+
+@contextmanager
+def awaiting_upstream() -> Iterator[None]:
+    """Count an await on OpenAI / BACKEND_URL as upstream wait for the current profile"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+    else:
+        with profile.upstream():
+            yield
+
+
+def profiled_iter(iterator: Iterator[str]) -> Iterator[str]:
+    """Run each step of a sync response stream as a profiled segment"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield from iterator
+        return
+    while True:
+        with profile.running(upstream=True):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
@@ -5,6 +5,7 @@ from pydantic import BaseModel
 import base64
 from typing import List, Optional, Any
 from .attachment import ClientAttachment
+from . import images
 
 class ToolInvocationState(str, Enum):
     CALL = 'call'
@@ -40,12 +41,7 @@ def convert_to_openai_messages(messages: List[ClientMessage]) -> List[ChatComple
         if (message.experimental_attachments):
             for attachment in message.experimental_attachments:
                 if (attachment.contentType.startswith('image')):
-                    parts.append({
-                        'type': 'image_url',
-                        'image_url': {
-                            'url': attachment.url
-                        }
-                    })
+                    parts.append(images.image_part(attachment.url))
 
                 elif (attachment.contentType.startswith('text')):
                     parts.append({
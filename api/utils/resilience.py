@@ -0,0 +1,188 @@
+"""
+Recovery from upstream failures in the middle of a chat stream
+
+When the OpenAI stream breaks after some frames were already sent, the
+response is not restarted. The request is retried with jittered
+exponential backoff; if text was emitted, the retry asks the model to
+continue from that text. When the retries run out and BACKEND_URL is
+configured, the secure backend is asked for the continuation instead. The
+client sees one response either way.
+
+Once a tool call or tool result frame has gone out, the stream is not
+retried: a continuation would ask the model for the completion again and
+replay (or re-run) the tools the client already has. The error is raised
+instead, as it was before retries existed.
+
+A continuation often repeats the last few words it was given. The
+repeated prefix is trimmed against the text already sent, so no frame is
+duplicated.
+
+Environment:
+    STREAM_RETRIES          continuation attempts after a failure, default 2
+    STREAM_RETRY_BACKOFF    base backoff in seconds, default 0.5
+"""
+
+import json
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+import httpx
+from openai import APIConnectionError, APIError, APIStatusError, InternalServerError, RateLimitError
+
+from . import metrics, tracing
+
+STREAM_RETRIES = int(os.environ.get("STREAM_RETRIES", "2"))
+STREAM_RETRY_BACKOFF = float(os.environ.get("STREAM_RETRY_BACKOFF", "0.5"))
+MAX_BACKOFF = 8.0
+
+# Errors that mean the upstream went away or is overloaded, not that the request was wrong
+RETRYABLE = (APIConnectionError, InternalServerError, RateLimitError, httpx.TransportError)
+
+CONTINUE_PROMPT = ("Your previous reply was cut off. Continue it from exactly where it stops, "
+                   "without repeating any of it and without a preamble.")
+
+# Continuations are buffered until this much text arrives, then their overlap with the sent text is trimmed
+OVERLAP_WINDOW = 200
+# Shorter overlaps are coincidence ("banana" + "and") rather than repetition
+MIN_OVERLAP = 6
+
+TOOL_FRAME_KINDS = ("9", "a", "b", "c")
+
+
+@dataclass
+class StreamState:
+    """What the client has already been sent, across every attempt"""
+    text: List[str] = field(default_factory=list)
+    finish_reason: Optional[str] = None
+    tool_calls: int = 0
+    # Tool call start/delta (b:, c:), call (9:) or result (a:) frames sent
+    tool_frames: int = 0
+
+    @property
+    def sent_text(self) -> str:
+        return "".join(self.text)
+
+    @property
+    def resumable(self) -> bool:
+        """False once tool frames went out; a continuation would replay them"""
+        return not self.tool_frames
+
+    def observe(self, frame: str):
+        kind, _, value = frame.partition(":")
+        if kind == "0":
+            self.text.append(json.loads(value) or "")
+        elif kind in TOOL_FRAME_KINDS:
+            self.tool_frames += 1
+            if kind == "9":
+                self.tool_calls += 1
+
+    def finish_frame(self) -> str:
+        """Closing frame for a stream that failed after its finish reason but before its usage"""
+        return 'e:{{"finishReason":"{reason}","usage":{{"promptTokens":0,"completionTokens":0}},"isContinued":false}}\n'.format(
+            reason="tool-calls" if self.tool_calls else "stop")
+
+
+def retryable(error: BaseException) -> bool:
+    # A plain APIError is an error event inside the SSE stream; status errors other than 429/5xx are final
+    return isinstance(error, RETRYABLE) or (isinstance(error, APIError) and not isinstance(error, APIStatusError))
+
+
+def backoff(attempt: int) -> float:
+    """Seconds to wait before retry ``attempt`` (1-based): exponential with full jitter"""
+    return random.uniform(0, min(STREAM_RETRY_BACKOFF * 2 ** (attempt - 1), MAX_BACKOFF))
+
+
+def continuation_messages(messages: List[Any], state: StreamState) -> List[Any]:
+    """The original conversation, plus the partial reply and an instruction to carry on"""
+    if not state.sent_text:
+        return messages
+    return list(messages) + [
+        {"role": "assistant", "content": state.sent_text},
+        {"role": "system", "content": CONTINUE_PROMPT},
+    ]
+
+
+def _overlap(sent: str, continuation: str) -> int:
+    """Length of the longest suffix of ``sent`` that ``continuation`` starts with"""
+    for length in range(min(len(sent), len(continuation)), MIN_OVERLAP - 1, -1):
+        if sent.endswith(continuation[:length]):
+            return length
+    return 0
+
+
+def _stitch(sent: str, continuation: str) -> str:
+    continuation = continuation[_overlap(sent, continuation):]
+    if sent[-1:].isspace():
+        continuation = continuation.lstrip()
+    return continuation
+
+
+def trim_overlap(frames: Iterator[str], sent: str) -> Iterator[str]:
+    """Pass a continuation's frames through, minus any text that repeats the end of ``sent``"""
+    if not sent:
+        yield from frames
+        return
+    pending: List[str] = []
+    trimmed = False
+
+    def flush():
+        nonlocal trimmed
+        trimmed = True
+        text = _stitch(sent, "".join(pending))
+        pending.clear()
+        if text:
+            yield '0:{text}\n'.format(text=json.dumps(text))
+
+    for frame in frames:
+        if trimmed:
+            yield frame
+        elif frame.startswith("0:"):
+            pending.append(json.loads(frame[2:]) or "")
+            if sum(len(part) for part in pending) >= OVERLAP_WINDOW:
+                yield from flush()
+        else:
+            yield from flush()
+            yield frame
+    if not trimmed:
+        yield from flush()
+
+
+def _message_text(message: Dict[str, Any]) -> str:
+    content = message.get("content")
+    if isinstance(content, str):
+        return content
+    return " ".join(part.get("text") or "" for part in content or [] if part.get("type") == "text")
+
+
+def backend_continuation(backend_url: str, messages: List[Any], state: StreamState,
+                         timeout: float = 30.0) -> Iterator[str]:
+    """Finish the reply through BACKEND_URL; the backend answers whole messages, so this is one frame"""
+    question = next((_message_text(message) for message in reversed(messages) if message.get("role") == "user"), "")
+    prompt = question
+    if state.sent_text:
+        prompt = f"{CONTINUE_PROMPT}\n\nQuestion: {question}\n\nYour reply so far: {state.sent_text}"
+
+    with httpx.Client(timeout=timeout) as client:
+        with metrics.backend_proxy_latency.time(route="backend", endpoint="sessions"):
+            session = client.post(f"{backend_url}/sessions", json={})
+        session.raise_for_status()
+        with metrics.backend_proxy_latency.time(route="backend", endpoint="chat"):
+            reply = client.post(f"{backend_url}/chat",
+                                json={"session_id": session.json().get("session_id"), "message": prompt})
+        reply.raise_for_status()
+
+    text = _stitch(state.sent_text, reply.json().get("response", ""))
+    tracing.trace_event("stream.backend_continuation", chars=len(text))
+    if text:
+        yield '0:{text}\n'.format(text=json.dumps(text))
+    yield state.finish_frame()
+
+
+def wait_before_retry(attempt: int, error: BaseException):
+    delay = backoff(attempt)
+    metrics.stream_retries.inc(route="direct", error=type(error).__name__)
+    tracing.trace_event("stream.retry", attempt=attempt, error=type(error).__name__, delay_ms=round(delay * 1000))
+    time.sleep(delay)
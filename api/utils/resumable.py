@@ -0,0 +1,135 @@
+"""
+Resumable chat responses
+
+Every streamed /api/chat response runs on a ``coalescing.Broadcast`` whose
+recent frames are kept in a bounded ring buffer and registered here under
+a response ID, returned in the ``x-response-id`` header. If the client's
+connection drops, generation keeps going for up to ``RESUME_TTL`` seconds;
+the client reconnects to ``GET /api/chat/resume/{response_id}?offset=N``
+with N = the number of complete frames (lines) it already received, and
+gets the rest of the stream without a second completion being paid for.
+
+Finished responses stay resumable for ``RESUME_TTL`` seconds. An offset
+older than the ring buffer can't be served (410); the client then has to
+resend the request.
+
+A response started with a ``session_id`` can only be resumed with the
+same ``session_id`` (``?session_id=...``); to anyone else it is unknown
+(404). A response without one is bound only to its random response ID.
+
+The admission slot of a request is held until its producer stops, not
+until its client disconnects, so lingering producers count against the
+concurrency limit.
+
+Environment:
+    RESUMABLE_STREAMS       set to 0 to stream responses directly
+    RESUME_TTL              seconds, default 60
+    RESUME_BUFFER_FRAMES    frames kept per response, default 4096
+    RESUME_MAX_RESPONSES    responses kept per process, default 512
+"""
+
+import hmac
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Iterator, Optional, Tuple
+
+from . import metrics
+from .coalescing import Broadcast
+
+RESUME_ENABLED = os.environ.get("RESUMABLE_STREAMS", "1") != "0"
+RESUME_TTL = float(os.environ.get("RESUME_TTL", "60"))
+BUFFER_FRAMES = int(os.environ.get("RESUME_BUFFER_FRAMES", "4096"))
+MAX_RESPONSES = int(os.environ.get("RESUME_MAX_RESPONSES", "512"))
+
+RESPONSE_ID_HEADER = "x-response-id"
+
+
+def broadcast_options() -> dict:
+    """Broadcast settings for a response that should be resumable"""
+    return {"max_history": BUFFER_FRAMES, "linger": RESUME_TTL}
+
+
+class ResponseBuffers:
+    """Response ID -> (Broadcast, owning session), expired RESUME_TTL after the response finished"""
+
+    def __init__(self, ttl: float = RESUME_TTL, max_responses: int = MAX_RESPONSES):
+        self.ttl = ttl
+        self.max_responses = max_responses
+        self._responses: "OrderedDict[str, Tuple[Broadcast, Optional[str]]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def add(self, flight: Broadcast, owner: Optional[str] = None) -> str:
+        response_id = uuid.uuid4().hex
+        with self._lock:
+            self._sweep()
+            self._responses[response_id] = (flight, owner or None)
+            while len(self._responses) > self.max_responses:
+                self._responses.popitem(last=False)
+        return response_id
+
+    def get(self, response_id: str) -> Optional[Broadcast]:
+        with self._lock:
+            self._sweep()
+            entry = self._responses.get(response_id)
+        return entry[0] if entry is not None else None
+
+    def get_owned(self, response_id: str, session_id: str) -> Optional[Broadcast]:
+        """The response if ``session_id`` is the session that started it, else None"""
+        with self._lock:
+            self._sweep()
+            entry = self._responses.get(response_id)
+        if entry is None:
+            return None
+        flight, owner = entry
+        if owner is not None and not hmac.compare_digest(owner.encode(), (session_id or "").encode()):
+            return None
+        return flight
+
+    def _sweep(self):
+        now = time.monotonic()
+        expired = [response_id for response_id, (flight, _) in self._responses.items()
+                   if flight.finished_at is not None and now - flight.finished_at > self.ttl]
+        for response_id in expired:
+            del self._responses[response_id]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._responses)
+
+
+buffers = ResponseBuffers()
+
+
+def buffered(frames: Iterator[str], owner: Optional[str] = None) -> Tuple[Iterator[str], Optional[str]]:
+    """
+    Run ``frames`` on a resumable Broadcast, resumable only by session ``owner`` when given
+
+    Returns:
+        (frames for this request, response ID), or the frames unchanged and
+        None when resumable streams are disabled
+    """
+    if not RESUME_ENABLED:
+        return frames, None
+    flight = Broadcast(frames, **broadcast_options())
+    subscription = flight.subscribe()
+    flight.start()
+    return subscription, buffers.add(flight, owner)
+
+
+def resume(response_id: str, offset: int, session_id: str = "") -> Optional[Iterator[str]]:
+    """
+    The response's frames from ``offset`` on, or None if it expired or belongs to another session
+
+    Raises:
+        coalescing.HistoryTrimmed: ``offset`` is older than the ring buffer
+    """
+    flight = buffers.get_owned(response_id, session_id)
+    if flight is None:
+        metrics.resumed_streams.inc(outcome="expired")
+        return None
+    frames = flight.subscribe(offset)
+    metrics.resumed_streams.inc(outcome="resumed")
+    return frames
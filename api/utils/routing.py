@@ -0,0 +1,200 @@
+"""
+Latency-aware model routing
+
+Each chat request is classified with cheap local heuristics (attachments,
+likely tool use, context size, greeting / intake answer / complex question)
+and sent to a model tier. The router keeps an EWMA of time-to-first-token
+and error rate per tier; a degraded tier is skipped in favour of the other
+for a cooldown, and a request whose upstream call fails before streaming
+is retried once on the other tier.
+
+Routing decisions, per-tier TTFT, estimated spend and savings versus
+sending everything to the full tier are exported through api/utils/metrics.py.
+
+Environment:
+    MODEL_ROUTING       set to 0 to send everything to the full tier
+    MODEL_TIER_FAST     default gpt-4o-mini
+    MODEL_TIER_FULL     default gpt-4o
+"""
+
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import metrics
+
+ROUTING_ENABLED = os.environ.get("MODEL_ROUTING", "1") != "0"
+
+
+@dataclass(frozen=True)
+class ModelTier:
+    name: str
+    model: str
+    # USD per 1M tokens, for the savings estimate
+    input_price: float
+    output_price: float
+    # EWMA TTFT above this marks the tier degraded
+    ttft_slo: float
+
+
+FAST = ModelTier("fast", os.environ.get("MODEL_TIER_FAST", "gpt-4o-mini"), 0.15, 0.60, 3.0)
+FULL = ModelTier("full", os.environ.get("MODEL_TIER_FULL", "gpt-4o"), 2.50, 10.00, 6.0)
+TIERS = {tier.name: tier for tier in (FAST, FULL)}
+
+GREETING = re.compile(
+    r"^\s*(hi|hello|hey|thanks|thank you|ok|okay|yes|no|sure|great|"
+    r"good (morning|afternoon|evening))\b[\s!.,?a-z]{0,20}$", re.IGNORECASE)
+INTAKE = re.compile(
+    r"[\w.+-]+@[\w-]+\.[\w.]+|\b(my name is|i'?m a|i am a|i work (in|at)|"
+    r"student|postdoc|faculty|professor|staff|alumn\w*|department|school of)\b", re.IGNORECASE)
+COMPLEX = re.compile(
+    r"\b(compare|explain|why|how (do|does|can|should|would)|strategy|analy[sz]e|licens\w*|"
+    r"patent\w*|term sheet|equity|valuation|cap table|ip|intellectual property)\b", re.IGNORECASE)
+TOOL_NEED = re.compile(r"\b(weather|temperature|forecast|rain|snow)\b", re.IGNORECASE)
+
+LONG_CONTEXT_CHARS = 12000
+COMPLEX_MESSAGE_CHARS = 400
+SHORT_MESSAGE_CHARS = 200
+EARLY_CONVERSATION_MESSAGES = 6
+
+
+def _message_text(message: Dict[str, Any]) -> Tuple[str, int]:
+    """Text of an OpenAI-format message and its number of image parts"""
+    content = message.get("content")
+    if isinstance(content, str):
+        return content, 0
+    texts, images = [], 0
+    for part in content or []:
+        if part.get("type") == "text":
+            texts.append(part.get("text") or "")
+        elif part.get("type") == "image_url":
+            images += 1
+    return " ".join(texts), images
+
+
+def classify(messages: List[Dict[str, Any]]) -> Tuple[ModelTier, str]:
+    """Pick a tier from the conversation alone; returns (tier, reason)"""
+    context_chars = 0
+    images = 0
+    last_user = ""
+    for message in messages:
+        text, message_images = _message_text(message)
+        context_chars += len(text)
+        images += message_images
+        if message.get("role") == "user":
+            last_user = text.strip()
+
+    if images:
+        return FULL, "attachments"
+    if TOOL_NEED.search(last_user):
+        return FULL, "tools"
+    if context_chars > LONG_CONTEXT_CHARS:
+        return FULL, "long_context"
+    if GREETING.match(last_user):
+        return FAST, "greeting"
+    if COMPLEX.search(last_user) or len(last_user) > COMPLEX_MESSAGE_CHARS:
+        return FULL, "complex"
+    if INTAKE.search(last_user) and "?" not in last_user:
+        return FAST, "intake"
+    if len(last_user) < SHORT_MESSAGE_CHARS and len(messages) <= EARLY_CONVERSATION_MESSAGES:
+        return FAST, "short"
+    return FULL, "default"
+
+
+@dataclass
+class TierHealth:
+    ttft: Optional[float] = None
+    error_rate: float = 0.0
+    samples: int = 0
+    degraded_until: float = 0.0
+
+
+@dataclass
+class RouteDecision:
+    tier: ModelTier
+    reason: str
+    # Tried in order: the chosen tier first, then the failover tier
+    candidates: List[ModelTier] = field(default_factory=list)
+
+    @property
+    def model(self) -> str:
+        return self.tier.model
+
+
+class ModelRouter:
+    def __init__(self, alpha: float = 0.2, max_error_rate: float = 0.25,
+                 min_samples: int = 5, cooldown: float = 30.0):
+        self.alpha = alpha
+        self.max_error_rate = max_error_rate
+        self.min_samples = min_samples
+        self.cooldown = cooldown
+        self.health: Dict[str, TierHealth] = {name: TierHealth() for name in TIERS}
+        self._lock = threading.Lock()
+
+    def choose(self, messages: List[Dict[str, Any]]) -> RouteDecision:
+        tier, reason = classify(messages) if ROUTING_ENABLED else (FULL, "routing_disabled")
+        other = FULL if tier is FAST else FAST
+        if self.degraded(tier) and not self.degraded(other):
+            tier, other, reason = other, tier, f"failover_from_{tier.name}"
+        metrics.model_routes.inc(tier=tier.name, reason=reason)
+        return RouteDecision(tier, reason, [tier, other])
+
+    def degraded(self, tier: ModelTier) -> bool:
+        with self._lock:
+            return self.health[tier.name].degraded_until > time.monotonic()
+
+    def record_ttft(self, tier: ModelTier, seconds: float):
+        metrics.model_ttft.observe(seconds, tier=tier.name)
+        with self._lock:
+            health = self.health[tier.name]
+            health.ttft = seconds if health.ttft is None else (
+                (1 - self.alpha) * health.ttft + self.alpha * seconds)
+            self._update(tier, health)
+
+    def record_result(self, tier: ModelTier, ok: bool):
+        with self._lock:
+            health = self.health[tier.name]
+            health.samples += 1
+            health.error_rate = (1 - self.alpha) * health.error_rate + self.alpha * (0.0 if ok else 1.0)
+            self._update(tier, health)
+
+    def _update(self, tier: ModelTier, health: TierHealth):
+        """Mark a tier degraded for a cooldown; afterwards it gets traffic again from a clean slate"""
+        now = time.monotonic()
+        if health.degraded_until and health.degraded_until <= now:
+            health.degraded_until = 0.0
+            health.error_rate = 0.0
+            health.ttft = None
+            health.samples = 0
+        if health.samples < self.min_samples or health.degraded_until:
+            return
+        slow = health.ttft is not None and health.ttft > tier.ttft_slo
+        if slow or health.error_rate > self.max_error_rate:
+            health.degraded_until = now + self.cooldown
+            metrics.model_tier_degraded.inc(tier=tier.name, cause="ttft" if slow else "errors")
+
+    def record_usage(self, tier: ModelTier, prompt_tokens: int, completion_tokens: int):
+        cost = (prompt_tokens * tier.input_price + completion_tokens * tier.output_price) / 1e6
+        full_cost = (prompt_tokens * FULL.input_price + completion_tokens * FULL.output_price) / 1e6
+        metrics.model_cost.inc(cost, tier=tier.name)
+        if full_cost > cost:
+            metrics.model_savings.inc(full_cost - cost, tier=tier.name)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                name: {
+                    "model": TIERS[name].model,
+                    "ttft_ewma": round(health.ttft, 3) if health.ttft is not None else None,
+                    "error_rate_ewma": round(health.error_rate, 3),
+                    "samples": health.samples,
+                    "degraded_for": round(max(health.degraded_until - time.monotonic(), 0.0), 1),
+                }
+                for name, health in self.health.items()
+            }
+
+
+router = ModelRouter()
@@ -0,0 +1,390 @@
+"""
+State shared across workers
+
+Session maps and caches used to be plain dicts private to one uvicorn
+worker or serverless instance, so a request landing on another worker
+lost its session and missed the cache. They now sit on a ``StateBackend``
+picked by ``SHARED_STATE_URL``:
+
+    (unset), memory://      in-process dict, one worker only (the default)
+    shm://[/path]           SQLite database on tmpfs, default
+                            /dev/shm/aura-state.db, shared by every worker
+                            process on the host
+    redis://[:password@]host[:port][/db], rediss://...
+                            any server speaking the Redis protocol (Redis,
+                            Valkey, Vercel KV's KV_URL)
+
+Admission control and model-tier health stay per-process on purpose:
+admission bounds this worker's own concurrency, and every worker measures
+tier latency against the same upstream.
+
+``SharedMap`` stores JSON values under a namespace (keys become
+``aura:<namespace>:<key>``), each with an optional TTL. A failing backend
+reads as a miss and skips writes, so an unreachable Redis costs
+recomputation rather than errors.
+
+Environment:
+    SHARED_STATE_URL        backend, see above; default in-process
+    SHARED_STATE_TIMEOUT    seconds per Redis or SQLite operation, default 0.5
+"""
+
+import abc
+import json
+import os
+import random
+import socket
+import sqlite3
+import ssl
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Optional, Tuple
+from urllib.parse import unquote, urlparse
+
+from . import metrics, tracing
+
+SHARED_STATE_URL = os.environ.get("SHARED_STATE_URL", "")
+TIMEOUT = float(os.environ.get("SHARED_STATE_TIMEOUT", "0.5"))
+
+KEY_PREFIX = "aura"
+# Seconds between repeated warnings about the same failing backend
+WARN_INTERVAL = 60.0
+
+logger = tracing.get_logger("aura.chat.state")
+
+
+class StateBackend(abc.ABC):
+    """Byte values by key, with optional expiry; implementations must be thread-safe"""
+
+    name = "base"
+
+    @abc.abstractmethod
+    def get(self, key: str) -> Optional[bytes]:
+        ...
+
+    @abc.abstractmethod
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        ...
+
+    @abc.abstractmethod
+    def delete(self, key: str):
+        ...
+
+    def close(self):
+        pass
+
+
+class InProcessBackend(StateBackend):
+    """LRU dict, private to this process"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 100_000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[Optional[float], bytes]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (expires_at, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class SharedMemoryBackend(StateBackend):
+    """
+    SQLite database on tmpfs, shared by the worker processes of one host
+
+    WAL mode lets readers in every process proceed while one writes; the
+    file lives in memory when ``path`` is on /dev/shm. Expired rows are
+    swept now and then on write.
+    """
+
+    name = "shm"
+    SWEEP_PROBABILITY = 1 / 256
+
+    def __init__(self, path: Optional[str] = None, timeout: float = TIMEOUT):
+        if not path:
+            directory = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+            path = os.path.join(directory, "aura-state.db")
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._db().execute("CREATE TABLE IF NOT EXISTS state "
+                           "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+
+    def _db(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            # Shared-memory state doesn't outlive the host, so it doesn't need fsync either
+            db.execute("PRAGMA synchronous=OFF")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Optional[bytes]:
+        row = self._db().execute("SELECT value, expires_at FROM state WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        return bytes(value)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        db = self._db()
+        # Wall-clock expiry: the other processes don't share this one's monotonic clock
+        db.execute("INSERT OR REPLACE INTO state (key, value, expires_at) VALUES (?, ?, ?)",
+                   (key, value, time.time() + ttl if ttl else None))
+        if random.random() < self.SWEEP_PROBABILITY:
+            db.execute("DELETE FROM state WHERE expires_at IS NOT NULL AND expires_at <= ?", (time.time(),))
+
+    def delete(self, key: str):
+        self._db().execute("DELETE FROM state WHERE key = ?", (key,))
+
+    def close(self):
+        db = getattr(self._local, "db", None)
+        if db is not None:
+            db.close()
+            self._local.db = None
+
+
+class RespError(Exception):
+    """Error reply from a Redis-protocol server"""
+
+
+class RespBackend(StateBackend):
+    """
+    Minimal Redis-protocol (RESP2) client: GET, SET with PX, DEL
+
+    Each thread keeps its own connection, so the sync streaming threads and
+    the event loop never interleave replies. A dropped connection is
+    reopened once before the operation fails.
+    """
+
+    name = "redis"
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6379, password: Optional[str] = None,
+                 username: Optional[str] = None, db: int = 0, tls: bool = False, timeout: float = TIMEOUT):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.username = username
+        self.db = db
+        self.tls = tls
+        self.timeout = timeout
+        self._local = threading.local()
+
+    @classmethod
+    def from_url(cls, url: str, timeout: float = TIMEOUT) -> "RespBackend":
+        parsed = urlparse(url)
+        db = parsed.path.strip("/")
+        return cls(host=parsed.hostname or "127.0.0.1", port=parsed.port or 6379,
+                   password=unquote(parsed.password) if parsed.password else None,
+                   username=unquote(parsed.username) if parsed.username else None,
+                   db=int(db) if db else 0, tls=parsed.scheme == "rediss", timeout=timeout)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        if self.tls:
+            sock = ssl.create_default_context().wrap_socket(sock, server_hostname=self.host)
+        self._local.sock = sock
+        self._local.reader = sock.makefile("rb")
+        try:
+            if self.password:
+                self._call(*(["AUTH", self.username, self.password] if self.username else ["AUTH", self.password]))
+            if self.db:
+                self._call("SELECT", self.db)
+        except Exception:
+            self._disconnect()
+            raise
+
+    def _disconnect(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        self._local.sock = None
+        self._local.reader = None
+
+    @staticmethod
+    def _encode(args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    def _read(self) -> Any:
+        line = self._local.reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by server")
+        kind, rest = line[:1], line[1:-2]
+        if kind == b"+":
+            return rest.decode()
+        if kind == b"-":
+            raise RespError(rest.decode())
+        if kind == b":":
+            return int(rest)
+        if kind == b"$":
+            length = int(rest)
+            if length < 0:
+                return None
+            data = self._local.reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by server")
+            return data[:-2]
+        if kind == b"*":
+            count = int(rest)
+            return None if count < 0 else [self._read() for _ in range(count)]
+        raise ConnectionError(f"Unexpected reply {line[:32]!r}")
+
+    def _call(self, *args) -> Any:
+        self._local.sock.sendall(self._encode(args))
+        return self._read()
+
+    def command(self, *args) -> Any:
+        for attempt in (1, 2):
+            if getattr(self._local, "sock", None) is None:
+                self._connect()
+            try:
+                return self._call(*args)
+            except RespError:
+                raise
+            except (OSError, ConnectionError):
+                self._disconnect()
+                if attempt == 2:
+                    raise
+
+    def get(self, key: str) -> Optional[bytes]:
+        return self.command("GET", key)
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None):
+        if ttl:
+            self.command("SET", key, value, "PX", max(int(ttl * 1000), 1))
+        else:
+            self.command("SET", key, value)
+
+    def delete(self, key: str):
+        self.command("DEL", key)
+
+    def close(self):
+        self._disconnect()
+
+
+def from_url(url: str) -> StateBackend:
+    scheme = urlparse(url).scheme if url else "memory"
+    if scheme == "memory":
+        return InProcessBackend()
+    if scheme == "shm":
+        return SharedMemoryBackend(urlparse(url).path or None)
+    if scheme in ("redis", "rediss"):
+        return RespBackend.from_url(url)
+    raise ValueError(f"Unsupported SHARED_STATE_URL scheme {scheme!r}")
+
+
+_backend: Optional[StateBackend] = None
+_backend_lock = threading.Lock()
+
+
+def backend() -> StateBackend:
+    """The process-wide backend from SHARED_STATE_URL, created on first use"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = from_url(SHARED_STATE_URL)
+            logger.info("shared state backend: %s", _backend.name)
+        return _backend
+
+
+class SharedMap:
+    """JSON values under one namespace of the shared backend"""
+
+    def __init__(self, namespace: str, ttl: Optional[float] = None, state: Optional[StateBackend] = None):
+        self.namespace = namespace
+        self.ttl = ttl
+        self._state = state
+        self._warned_at = 0.0
+
+    @property
+    def state(self) -> StateBackend:
+        return self._state or backend()
+
+    @property
+    def shared(self) -> bool:
+        """False when entries are only visible to this process"""
+        return not isinstance(self.state, InProcessBackend)
+
+    def _key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.namespace}:{key}"
+
+    def _failed(self, operation: str, error: Exception):
+        metrics.shared_state_ops.inc(backend=self.state.name, op=operation, outcome="error")
+        now = time.monotonic()
+        if now - self._warned_at > WARN_INTERVAL:
+            self._warned_at = now
+            logger.warning("shared state %s on %s failed: %s", operation, self.state.name, error)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        try:
+            value = self.state.get(self._key(key))
+        except Exception as e:
+            self._failed("get", e)
+            return default
+        metrics.shared_state_ops.inc(backend=self.state.name, op="get",
+                                     outcome="miss" if value is None else "hit")
+        return default if value is None else json.loads(value)
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        try:
+            self.state.set(self._key(key), json.dumps(value).encode(), ttl or self.ttl)
+        except Exception as e:
+            self._failed("set", e)
+            return
+        metrics.shared_state_ops.inc(backend=self.state.name, op="set", outcome="ok")
+
+    def delete(self, key: str):
+        try:
+            self.state.delete(self._key(key))
+        except Exception as e:
+            self._failed("delete", e)
+
+    def __contains__(self, key: str) -> bool:
+        return self.get(key) is not None
+
+    def __getitem__(self, key: str) -> Any:
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key: str, value: Any):
+        self.set(key, value)
+
+    def __delitem__(self, key: str):
+        self.delete(key)
+
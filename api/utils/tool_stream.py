@@ -0,0 +1,126 @@
+"""
+Streaming tool calls
+
+Tool-call arguments arrive from OpenAI as JSON text split across many
+deltas. ``ArgumentsTracker`` follows that text incrementally (string and
+escape state, object/array depth) so it knows the moment the arguments
+object is complete, without re-parsing the whole buffer on every delta.
+
+Tools listed in ``IDEMPOTENT_TOOLS`` have no side effects, so they are
+started speculatively on a small thread pool as soon as their arguments
+are complete. The tool's latency then overlaps with the rest of the
+model's output (further tool calls, the finish chunk) instead of
+following it. If the call never gets confirmed (the stream fails and is
+retried), the result is simply dropped.
+
+Environment:
+    TOOL_SPECULATION    set to 0 to run tools only after the model finishes
+"""
+
+import json
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from . import metrics
+
+SPECULATION_ENABLED = os.environ.get("TOOL_SPECULATION", "1") != "0"
+
+# Read-only tools that are safe to run before the model commits to the call
+IDEMPOTENT_TOOLS = {"get_current_weather"}
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _pool() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="tool-speculation")
+        return _executor
+
+
+class ArgumentsTracker:
+    """Incremental completeness check for one tool call's JSON arguments"""
+
+    def __init__(self):
+        self.text = ""
+        self.depth = 0
+        self.started = False
+        self.complete = False
+        self._in_string = False
+        self._escaped = False
+
+    def feed(self, delta: str) -> bool:
+        """Add an arguments delta; returns True once the top-level value has closed"""
+        self.text += delta
+        for char in delta:
+            if self.complete:
+                break
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+            elif char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self.depth += 1
+                self.started = True
+            elif char in "}]":
+                self.depth -= 1
+                self.complete = self.started and self.depth == 0
+        return self.complete
+
+    def value(self) -> Any:
+        return json.loads(self.text)
+
+
+class ToolCall:
+    """A tool call being streamed: start/delta frames out, speculative execution once complete"""
+
+    def __init__(self, call_id: str, name: str):
+        self.id = call_id
+        self.name = name
+        self.arguments = ArgumentsTracker()
+        self.future: Optional["Future[Any]"] = None
+        self._speculated_arguments: Optional[str] = None
+
+    def start_frame(self) -> str:
+        return 'b:{{"toolCallId":"{id}","toolName":"{name}"}}\n'.format(id=self.id, name=self.name)
+
+    def delta_frame(self, delta: str) -> str:
+        return 'c:{{"toolCallId":"{id}","argsTextDelta":{delta}}}\n'.format(id=self.id, delta=json.dumps(delta))
+
+    def feed(self, delta: str, tools: Dict[str, Callable[..., Any]]):
+        if self.arguments.feed(delta) and self.future is None:
+            self._speculate(tools)
+
+    def _speculate(self, tools: Dict[str, Callable[..., Any]]):
+        if not SPECULATION_ENABLED or self.name not in IDEMPOTENT_TOOLS or self.name not in tools:
+            return
+        try:
+            arguments = self.arguments.value()
+        except ValueError:
+            return
+        self._speculated_arguments = self.arguments.text
+        self.future = _pool().submit(tools[self.name], **arguments)
+        metrics.tool_speculation.inc(tool=self.name, outcome="started")
+
+    def result(self, tools: Dict[str, Callable[..., Any]]) -> Any:
+        """The tool's result: the speculative run's if its arguments still match, otherwise run it now"""
+        if self.future is not None and self._speculated_arguments == self.arguments.text:
+            metrics.tool_speculation.inc(tool=self.name, outcome="used")
+            return self.future.result()
+        if self.future is not None:
+            metrics.tool_speculation.inc(tool=self.name, outcome="discarded")
+        return tools[self.name](**json.loads(self.arguments.text))
+
+    def abandon(self):
+        if self.future is not None and not self.future.done():
+            self.future.cancel()
+            metrics.tool_speculation.inc(tool=self.name, outcome="abandoned")
@@ -0,0 +1,225 @@
+"""
+Structured, non-blocking logging and per-request tracing
+
+Log records are put on an in-memory queue by ``QueueHandler`` and written
+as JSON lines to stdout by a ``QueueListener`` thread, so request handlers
+never block on stdout. Every record carries the current request's trace
+ID (a contextvar set by the tracing middleware). Request payloads are only
+logged for a sampled share of requests and are truncated.
+
+Recent request traces are kept in a fixed-size ring buffer for debugging.
+
+Environment:
+    LOG_LEVEL                  default INFO
+    LOG_PAYLOAD_SAMPLE_RATE    share of requests whose payload is logged (default 0.01)
+    LOG_PAYLOAD_MAX_CHARS      truncation limit for logged payloads (default 2000)
+    TRACE_BUFFER_SIZE          request traces kept in memory (default 200)
+"""
+
+import atexit
+import contextvars
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+PAYLOAD_SAMPLE_RATE = float(os.environ.get("LOG_PAYLOAD_SAMPLE_RATE", "0.01"))
+PAYLOAD_MAX_CHARS = int(os.environ.get("LOG_PAYLOAD_MAX_CHARS", "2000"))
+TRACE_BUFFER_SIZE = int(os.environ.get("TRACE_BUFFER_SIZE", "200"))
+# Events kept per trace, so a long tool loop can't grow one trace without bound
+MAX_TRACE_EVENTS = 100
+
+TRACE_HEADER = "x-trace-id"
+
+_current_trace: contextvars.ContextVar[Optional["RequestTrace"]] = contextvars.ContextVar(
+    "current_trace", default=None)
+
+
+def truncate(value: Any, limit: int = PAYLOAD_MAX_CHARS) -> str:
+    text = value if isinstance(value, str) else repr(value)
+    if len(text) <= limit:
+        return text
+    return f"{text[:limit]}...[{len(text) - limit} more chars]"
+
+
+class RequestTrace:
+    """Timeline of one request: method, path, status and timed events"""
+
+    def __init__(self, trace_id: str, method: str, path: str):
+        self.trace_id = trace_id
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self.status: Optional[int] = None
+        self.duration_ms: Optional[float] = None
+        # Sampled once per request so all of its payload logs agree
+        self.log_payload = random.random() < PAYLOAD_SAMPLE_RATE
+        self.events: List[Dict[str, Any]] = []
+
+    def event(self, name: str, **fields):
+        if len(self.events) < MAX_TRACE_EVENTS:
+            fields = {key: truncate(value, 200) if isinstance(value, str) else value
+                      for key, value in fields.items()}
+            self.events.append({"name": name, "at_ms": self.elapsed_ms(), **fields})
+
+    def elapsed_ms(self) -> float:
+        return round((time.perf_counter() - self._start) * 1000, 2)
+
+    def finish(self, status: Optional[int] = None):
+        if status is not None:
+            self.status = status
+        self.duration_ms = self.elapsed_ms()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "status": self.status,
+            "duration_ms": self.duration_ms,
+            "events": list(self.events),
+        }
+
+
+class TraceBuffer:
+    """Ring buffer of the most recent request traces"""
+
+    def __init__(self, capacity: int = TRACE_BUFFER_SIZE):
+        self._traces: Deque[RequestTrace] = deque(maxlen=capacity)
+        self._lock = threading.Lock()
+
+    def add(self, trace: RequestTrace):
+        with self._lock:
+            self._traces.append(trace)
+
+    def recent(self, limit: int = 50, path: Optional[str] = None,
+               min_duration_ms: float = 0.0) -> List[Dict[str, Any]]:
+        with self._lock:
+            traces = list(self._traces)
+        selected = [
+            trace.to_dict() for trace in reversed(traces)
+            if (path is None or trace.path == path)
+            and (trace.duration_ms or 0.0) >= min_duration_ms
+        ]
+        return selected[:limit]
+
+    def get(self, trace_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for trace in self._traces:
+                if trace.trace_id == trace_id:
+                    return trace.to_dict()
+        return None
+
+
+traces = TraceBuffer()
+
+
+def start_trace(method: str, path: str, trace_id: Optional[str] = None) -> RequestTrace:
+    """Begin a trace for the current request and make it the current context's trace"""
+    trace = RequestTrace(trace_id or uuid.uuid4().hex[:16], method, path)
+    _current_trace.set(trace)
+    traces.add(trace)
+    return trace
+
+
+def current_trace() -> Optional[RequestTrace]:
+    return _current_trace.get()
+
+
+def trace_event(name: str, **fields):
+    """Add an event to the current request's trace, if there is one"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.event(name, **fields)
+
+
+def should_log_payload() -> bool:
+    trace = _current_trace.get()
+    return trace.log_payload if trace is not None else random.random() < PAYLOAD_SAMPLE_RATE
+
+
+# ----------------------------------------------------------------------
+# Logging
+# ----------------------------------------------------------------------
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; fields passed via ``extra={"fields": {...}}`` are merged in"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "trace_id": getattr(record, "trace_id", None),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exc"] = truncate(self.formatException(record.exc_info))
+        return json.dumps(entry, default=str)
+
+
+class _TraceIdFilter(logging.Filter):
+    """Stamp the trace ID on the record in the caller's context, before it crosses the queue"""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        trace = _current_trace.get()
+        record.trace_id = trace.trace_id if trace is not None else None
+        return True
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Drops records instead of blocking or raising when the queue is full"""
+
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_setup_lock = threading.Lock()
+
+
+def get_logger(name: str = "aura") -> logging.Logger:
+    """Logger whose records go through the shared queue; sets it up on first use"""
+    global _listener
+    root = logging.getLogger("aura")
+    with _setup_lock:
+        if _listener is None:
+            log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(maxsize=10000)
+            stream_handler = logging.StreamHandler(sys.stdout)
+            stream_handler.setFormatter(JsonFormatter())
+            _listener = logging.handlers.QueueListener(log_queue, stream_handler)
+            _listener.start()
+            atexit.register(_listener.stop)
+
+            queue_handler = _DroppingQueueHandler(log_queue)
+            queue_handler.addFilter(_TraceIdFilter())
+            root.addHandler(queue_handler)
+            root.setLevel(os.environ.get("LOG_LEVEL", "INFO").upper())
+            root.propagate = False
+    return root if name == "aura" else root.getChild(name.split("aura.", 1)[-1])
+
+
+def log_fields(logger: logging.Logger, level: int, msg: str, **fields):
+    """Log a message with structured fields"""
+    if logger.isEnabledFor(level):
+        logger.log(level, msg, extra={"fields": fields})
+
+
+def dropped_records() -> int:
+    return _DroppingQueueHandler.dropped
@@ -0,0 +1,282 @@
+#!/usr/bin/env python3
+"""
+Async retrieval front-end for the Aura Chatbot vector store
+
+``AuraChatbotVectorStore`` is synchronous, so calling it from FastAPI
+handlers blocks the event loop. ``AsyncRetriever`` puts three things in
+front of it:
+
+- an LRU cache of query embeddings keyed by normalized query text,
+  optionally backed by a cache shared with other workers
+- a micro-batcher that collects queries arriving within ``max_wait_ms``
+  into one embedding call and one batched similarity pass
+- thread offload for both, so the event loop is never blocked
+
+Usage:
+    retriever = AsyncRetriever(init_chatbot_vector_store(), openai_embed_fn())
+    results = await retriever.search("What does the Blavatnik Fund support?")
+"""
+
+import asyncio
+import base64
+import functools
+import hashlib
+import re
+import threading
+from array import array
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+EmbedFn = Callable[[List[str]], List[List[float]]]
+
+
+def openai_embed_fn(model: str = "text-embedding-3-small", client: Any = None) -> EmbedFn:
+    """Embedding function backed by the OpenAI embeddings API"""
+    if client is None:
+        from openai import OpenAI
+        client = OpenAI()
+
+    def embed(texts: List[str]) -> List[List[float]]:
+        response = client.embeddings.create(model=model, input=texts)
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+    return embed
+
+
+class EmbeddingCache:
+    """Thread-safe LRU cache of embeddings keyed by normalized text"""
+
+    def __init__(self, max_entries: int = 2048, shared: Any = None):
+        """
+        Args:
+            max_entries: Embeddings kept in this process
+            shared: Optional second level with ``get(key)`` and ``set(key, value)``,
+                    e.g. an api/utils/shared_state.py SharedMap. Its calls may
+                    block, so only ``get_shared``/``put_shared`` use it.
+        """
+        self.max_entries = max_entries
+        self.shared = shared
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self._entries: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return re.sub(r"\s+", " ", text).strip().lower()
+
+    def get(self, text: str) -> Optional[List[float]]:
+        key = self.normalize(text)
+        with self._lock:
+            embedding = self._entries.get(key)
+            if embedding is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return embedding
+
+    def put(self, text: str, embedding: List[float]):
+        key = self.normalize(text)
+        with self._lock:
+            self._entries[key] = embedding
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    @classmethod
+    def shared_key(cls, text: str) -> str:
+        return hashlib.sha256(cls.normalize(text).encode()).hexdigest()
+
+    def get_shared(self, text: str) -> Optional[List[float]]:
+        """Look ``text`` up in the shared level; blocking"""
+        if self.shared is None:
+            return None
+        packed = self.shared.get(self.shared_key(text))
+        if packed is None:
+            return None
+        self.shared_hits += 1
+        # float32, about a fifth of the size of JSON floats
+        return array("f", base64.b64decode(packed)).tolist()
+
+    def put_shared(self, text: str, embedding: List[float]):
+        if self.shared is not None:
+            self.shared.set(self.shared_key(text), base64.b64encode(array("f", embedding).tobytes()).decode("ascii"))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared_hits": self.shared_hits,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@dataclass
+class _PendingQuery:
+    text: str
+    top_k: int
+    future: asyncio.Future
+    # Only plain vector searches share the batched similarity pass
+    search_kwargs: Dict[str, Any] = field(default_factory=dict)
+    embed_only: bool = False
+    embedding: Optional[List[float]] = None
+
+
+def _fail(items: List[_PendingQuery], error: Exception):
+    for item in items:
+        if not item.future.done():
+            item.future.set_exception(error)
+
+
+class AsyncRetriever:
+    """Micro-batching, cached, non-blocking retrieval over AuraChatbotVectorStore"""
+
+    def __init__(self, vector_store: Any, embed_fn: EmbedFn, cache_size: int = 2048,
+                 max_batch_size: int = 32, max_wait_ms: float = 5.0, shared_cache: Any = None):
+        """
+        Args:
+            vector_store: An AuraChatbotVectorStore (needs search and search_many)
+            embed_fn: Embeds a list of texts in one call
+            cache_size: Query embeddings kept in the LRU cache
+            shared_cache: Second cache level shared with other workers, see EmbeddingCache
+            max_batch_size: Queries that trigger an immediate flush
+            max_wait_ms: Longest time the first query of a batch waits for others
+        """
+        self.vector_store = vector_store
+        self.embed_fn = embed_fn
+        self.cache = EmbeddingCache(cache_size, shared_cache)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.batches = 0
+        self.queries = 0
+        self._pending: List[_PendingQuery] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        # Running batches; the event loop only keeps weak references to tasks
+        self._tasks: set = set()
+
+    async def search(self, query_text: str, top_k: int = 5,
+                     filters: Optional[Dict[str, Any]] = None, mode: str = "vector",
+                     candidates: Optional[int] = None) -> List[dict]:
+        """Embed and search without blocking the event loop; same results as the store's search"""
+        search_kwargs = {}
+        if filters or mode != "vector":
+            search_kwargs = {"filters": filters, "query_text": query_text,
+                             "mode": mode, "candidates": candidates}
+        return await self._submit(query_text, top_k, search_kwargs)
+
+    async def embed(self, query_text: str) -> List[float]:
+        """Embed one query through the cache and the batched embedding call"""
+        return await self._submit(query_text, 0, {}, embed_only=True)
+
+    def stats(self) -> dict:
+        return {
+            "queries": self.queries,
+            "batches": self.batches,
+            "avg_batch_size": round(self.queries / self.batches, 2) if self.batches else 0.0,
+            "cache": self.cache.stats(),
+        }
+
+    # ------------------------------------------------------------------
+    # Batching
+    # ------------------------------------------------------------------
+
+    async def _submit(self, text: str, top_k: int, search_kwargs: Dict[str, Any],
+                      embed_only: bool = False) -> Any:
+        loop = asyncio.get_running_loop()
+        item = _PendingQuery(text=text, top_k=top_k, future=loop.create_future(),
+                             search_kwargs=search_kwargs, embed_only=embed_only)
+        self._pending.append(item)
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await item.future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _in_thread(self, fn: Callable, *args, **kwargs) -> Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+    async def _run_batch(self, batch: List[_PendingQuery]):
+        self.batches += 1
+        self.queries += len(batch)
+        try:
+            await self._embed_batch(batch)
+        except Exception as e:
+            _fail(batch, e)
+            return
+
+        for item in batch:
+            if item.embed_only and not item.future.done():
+                item.future.set_result(item.embedding)
+
+        # One batched pass for plain searches; filtered and hybrid searches run alongside it
+        plain = [item for item in batch if not item.embed_only and not item.search_kwargs]
+        searches = [self._search_plain(plain)] if plain else []
+        searches += [self._search_one(item) for item in batch if not item.embed_only and item.search_kwargs]
+        await asyncio.gather(*searches)
+
+    async def _search_plain(self, items: List[_PendingQuery]):
+        try:
+            top_k = max(item.top_k for item in items)
+            results = await self._in_thread(
+                self.vector_store.search_many, [item.embedding for item in items], top_k)
+        except Exception as e:
+            _fail(items, e)
+            return
+        for item, hits in zip(items, results):
+            if not item.future.done():
+                item.future.set_result(hits[:item.top_k])
+
+    async def _search_one(self, item: _PendingQuery):
+        try:
+            hits = await self._in_thread(
+                self.vector_store.search, item.embedding, item.top_k, **item.search_kwargs)
+        except Exception as e:
+            _fail([item], e)
+            return
+        if not item.future.done():
+            item.future.set_result(hits)
+
+    async def _embed_batch(self, batch: List[_PendingQuery]):
+        """Fill item.embedding from the cache, embedding all misses in one call"""
+        missing: Dict[str, str] = {}
+        for item in batch:
+            item.embedding = self.cache.get(item.text)
+            if item.embedding is None:
+                missing.setdefault(EmbeddingCache.normalize(item.text), item.text)
+
+        if missing:
+            texts = list(missing.values())
+            embeddings = await self._in_thread(self._embed_texts, texts)
+            fresh = dict(zip(missing, embeddings))
+            for text, embedding in zip(texts, embeddings):
+                self.cache.put(text, embedding)
+            for item in batch:
+                if item.embedding is None:
+                    item.embedding = fresh[EmbeddingCache.normalize(item.text)]
+
+    def _embed_texts(self, texts: List[str]) -> List[List[float]]:
+        """Embeddings from the shared cache, then one ``embed_fn`` call for the rest; runs in a thread"""
+        embeddings = [self.cache.get_shared(text) for text in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            fresh = self.embed_fn([texts[i] for i in missing])
+            for i, embedding in zip(missing, fresh):
+                embeddings[i] = embedding
+                self.cache.put_shared(texts[i], embedding)
+        return embeddings
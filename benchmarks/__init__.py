@@ -0,0 +1 @@
+"""Offline load-test and latency benchmarks for the chat API"""
@@ -0,0 +1,277 @@
+"""
+Offline load test for /api/chat
+
+Starts the OpenAI and BACKEND_URL stand-ins, launches api/index.py under
+uvicorn pointed at them, drives N concurrent simulated chat sessions and
+reports time-to-first-token, inter-token gap, total time, throughput and
+error rate percentiles as JSON.
+
+Usage:
+    python -m benchmarks.chat_load --sessions 20 --turns 3 --route direct
+    python -m benchmarks.chat_load --route backend --output bench.json
+    python -m benchmarks.chat_load --target-url http://127.0.0.1:8000  # running app
+    python -m benchmarks.chat_load --workers 4 --shared-state redis  # workers share state via RespServer
+
+Every session's questions are tagged with the session number and request
+coalescing is off in the launched app, so each turn costs one upstream
+call; ``upstream_requests`` in the report confirms it. Pass --coalescing
+to measure with identical in-flight requests merged.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import subprocess
+import sys
+import time
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+
+from .standins import BackgroundServer, RespServer, StubConfig, create_backend_app, create_openai_app
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+QUESTIONS = [
+    "Hi, what does Yale Ventures do?",
+    "I'm a postdoc in chemistry with an idea for a startup. Where do I start?",
+    "What funding programs are available for faculty?",
+    "How does licensing a Yale technology work?",
+]
+
+
+EMPTY_TEXT_LINES = ('0:""', '0:null')
+
+
+@dataclass
+class TurnResult:
+    ok: bool
+    status: int = 0
+    ttft: Optional[float] = None
+    total: float = 0.0
+    tokens: int = 0
+    gaps: List[float] = field(default_factory=list)
+    error: str = ""
+
+
+def percentiles(values: List[float], points=(50, 90, 95, 99)) -> Dict[str, Optional[float]]:
+    """Nearest-rank percentiles in milliseconds"""
+    if not values:
+        return {f"p{point}": None for point in points}
+    ordered = sorted(values)
+    result = {}
+    for point in points:
+        index = min(len(ordered) - 1, max(0, math.ceil(point / 100.0 * len(ordered)) - 1))
+        result[f"p{point}"] = round(ordered[index] * 1000, 2)
+    result["mean"] = round(sum(ordered) / len(ordered) * 1000, 2)
+    return result
+
+
+async def run_turn(client: httpx.AsyncClient, base_url: str, payload: dict) -> TurnResult:
+    """Send one chat request and time its data-stream frames"""
+    start = time.perf_counter()
+    result = TurnResult(ok=False)
+    last_token_at = None
+    try:
+        async with client.stream("POST", f"{base_url}/api/chat", json=payload) as response:
+            result.status = response.status_code
+            if response.status_code != 200:
+                result.error = f"HTTP {response.status_code}"
+                await response.aread()
+                return result
+            async for line in response.aiter_lines():
+                now = time.perf_counter()
+                # The opening role-only delta is an empty text frame, not a first token
+                if line.startswith("0:") and line not in EMPTY_TEXT_LINES:
+                    if result.ttft is None:
+                        result.ttft = now - start
+                    elif last_token_at is not None:
+                        result.gaps.append(now - last_token_at)
+                    last_token_at = now
+                    result.tokens += 1
+                elif line.startswith("3:"):
+                    result.error = line[2:]
+        result.ok = result.ttft is not None and not result.error
+        if result.ttft is None and not result.error:
+            result.error = "no text frames"
+    except Exception as e:
+        result.error = f"{type(e).__name__}: {e}"
+    result.total = time.perf_counter() - start
+    return result
+
+
+async def run_session(client: httpx.AsyncClient, base_url: str, session_index: int,
+                      turns: int, route: str) -> List[TurnResult]:
+    """One simulated user: several turns, history grows on the direct route"""
+    results = []
+    messages: List[dict] = []
+    session_id = ""
+    for turn in range(turns):
+        # Unique per session, so concurrent sessions are never identical requests
+        question = f"{QUESTIONS[(session_index + turn) % len(QUESTIONS)]} (session {session_index})"
+        if route == "backend":
+            payload = {"message": question, "session_id": session_id}
+        else:
+            messages.append({"role": "user", "content": question})
+            payload = {"messages": messages}
+        result = await run_turn(client, base_url, payload)
+        results.append(result)
+        if route == "direct":
+            messages.append({"role": "assistant", "content": "(answer)"})
+    return results
+
+
+async def drive(base_url: str, sessions: int, turns: int, route: str, timeout: float) -> dict:
+    limits = httpx.Limits(max_connections=sessions * 2, max_keepalive_connections=sessions)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        per_session = await asyncio.gather(*[
+            run_session(client, base_url, index, turns, route) for index in range(sessions)
+        ])
+        wall = time.perf_counter() - start
+
+    results = [result for session in per_session for result in session]
+    return {
+        "route": route,
+        "sessions": sessions,
+        "turns_per_session": turns,
+        **summarize(results, wall),
+    }
+
+
+def summarize(results: List[TurnResult], wall: float) -> dict:
+    """Error rate, throughput and latency percentiles of a set of turns"""
+    ok = [result for result in results if result.ok]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if not result.ok:
+            errors[result.error[:80]] = errors.get(result.error[:80], 0) + 1
+    total_tokens = sum(result.tokens for result in ok)
+    stream_rates = [
+        result.tokens / (result.total - result.ttft)
+        for result in ok if result.total > result.ttft and result.tokens > 1
+    ]
+    return {
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_rate": round((len(results) - len(ok)) / len(results), 4) if results else 0.0,
+        "error_kinds": errors,
+        "wall_seconds": round(wall, 3),
+        "requests_per_second": round(len(results) / wall, 3) if wall else 0.0,
+        "tokens_per_second": round(total_tokens / wall, 2) if wall else 0.0,
+        "ttft_ms": percentiles([result.ttft for result in ok]),
+        "inter_token_gap_ms": percentiles([gap for result in ok for gap in result.gaps]),
+        "total_ms": percentiles([result.total for result in ok]),
+        # Percentiles of time per token, inverted: p99 is the slowest streams' rate
+        "stream_tokens_per_second": {
+            key: (round(1000.0 / value, 2) if value else None)
+            for key, value in percentiles([1.0 / rate for rate in stream_rates if rate > 0]).items()
+        },
+    }
+
+
+def wait_until_ready(base_url: str, timeout: float = 30.0, process: Optional[subprocess.Popen] = None):
+    """Poll /api/health until it answers 200"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"App under test exited with code {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/health", timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.1)
+    raise RuntimeError(f"{base_url} was not ready after {timeout}s")
+
+
+def launch_app(port: int, workers: int, env: Dict[str, str],
+               app_dir: Optional[Path] = None) -> subprocess.Popen:
+    """Run api.index:app from app_dir (default: this checkout) under uvicorn with the given environment overrides"""
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "api.index:app", "--host", "127.0.0.1",
+         "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        cwd=str(app_dir or REPO_ROOT), env={**os.environ, **env},
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(description="Offline load test for /api/chat")
+    parser.add_argument("--sessions", type=int, default=10, help="Concurrent simulated sessions")
+    parser.add_argument("--turns", type=int, default=3, help="Requests per session")
+    parser.add_argument("--route", choices=["direct", "backend"], default="direct",
+                        help="direct: OpenAI streaming path, backend: BACKEND_URL proxy path")
+    parser.add_argument("--ttft-ms", type=float, default=250.0)
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--response-tokens", type=int, default=120)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--backend-latency-ms", type=float, default=800.0)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--rate-limit-rpm", type=int, default=None,
+                        help="Emulate an OpenAI requests-per-minute limit with 429s and x-ratelimit headers")
+    parser.add_argument("--port", type=int, default=8765, help="Port for the app under test")
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn workers for the app under test")
+    parser.add_argument("--shared-state", choices=["memory", "shm", "redis"], default="memory",
+                        help="SHARED_STATE_URL for the app: per-worker, host shared memory, or the RESP stand-in")
+    parser.add_argument("--coalescing", action="store_true",
+                        help="Leave CHAT_COALESCING on in the launched app")
+    parser.add_argument("--target-url", help="Benchmark an already running app instead of launching one")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--output", help="Write the JSON report to this file")
+    args = parser.parse_args(argv)
+
+    config = StubConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        response_tokens=args.response_tokens,
+        jitter=args.jitter,
+        failure_rate=args.failure_rate,
+        backend_latency_ms=args.backend_latency_ms,
+        seed=args.seed,
+        rate_limit_rpm=args.rate_limit_rpm,
+    )
+    openai_server = BackgroundServer(create_openai_app(config)).start()
+    backend_server = BackgroundServer(create_backend_app(config)).start()
+    resp_server = RespServer().start() if args.shared_state == "redis" else None
+    process = None
+    try:
+        base_url = args.target_url
+        if not base_url:
+            env = {"OPENAI_BASE_URL": f"{openai_server.url}/v1", "OPENAI_API_KEY": "bench"}
+            env["BACKEND_URL"] = backend_server.url if args.route == "backend" else ""
+            env["SHARED_STATE_URL"] = resp_server.url if resp_server else f"{args.shared_state}://"
+            env["CHAT_COALESCING"] = "1" if args.coalescing else "0"
+            process = launch_app(args.port, args.workers, env)
+            base_url = f"http://127.0.0.1:{args.port}"
+        wait_until_ready(base_url, process=process)
+
+        report = asyncio.run(drive(base_url, args.sessions, args.turns, args.route, args.timeout))
+        report["config"] = asdict(config)
+        report["upstream_requests"] = openai_server.config.app.state.requests
+        report["backend_requests"] = backend_server.config.app.state.requests
+        report["upstream_rate_limited"] = openai_server.config.app.state.rate_limited
+        if resp_server is not None:
+            report["shared_state_commands"] = resp_server.commands
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        openai_server.stop()
+        backend_server.stop()
+        if resp_server is not None:
+            resp_server.stop()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        Path(args.output).write_text(output)
+    print(output)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Deterministic replay of captured /api/chat traffic
+
+Reads a capture written by api/utils/capture.py (``CAPTURE_PATH``),
+rebuilds requests with the recorded shapes (roles, message lengths,
+attachment types; filler text instead of content) and re-sends them at
+their recorded arrival times. The OpenAI and BACKEND_URL stand-ins replay
+each request's recorded frame timings, so two builds see identical
+upstream behaviour and their latency distributions can be diffed.
+
+Tool calls are not re-executed, since the weather tool needs the network;
+their recorded time is replayed as upstream delay before the stream ends.
+
+Usage:
+    python -m benchmarks.replay run capture.jsonl.gz --output after.json
+    python -m benchmarks.replay run capture.jsonl.gz --app-dir ../baseline --output before.json
+    python -m benchmarks.replay diff before.json after.json
+    python -m benchmarks.replay compare capture.jsonl.gz --baseline-dir ../baseline
+"""
+
+import argparse
+import asyncio
+import json
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import httpx
+
+from api.utils.capture import read_capture
+from .chat_load import launch_app, run_turn, summarize, wait_until_ready
+from .standins import BackgroundServer, StubConfig, create_backend_app, create_openai_app
+
+MARKER_PATTERN = re.compile(r"\[replay:([0-9a-f]+)\]")
+FILLER = "lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor "
+
+
+def filler(chars: int) -> str:
+    repeats = chars // len(FILLER) + 1
+    return (FILLER * repeats)[:chars]
+
+
+def with_marker(record_id: str, chars: int) -> str:
+    marker = f"[replay:{record_id}] "
+    return marker + filler(max(chars - len(marker), 0))
+
+
+def build_payload(record: dict) -> dict:
+    """Request body with the recorded shape; the last message carries the record's marker"""
+    shape = record["request"]
+    if record["route"] == "backend":
+        return {"message": with_marker(record["id"], shape["message_chars"]), "session_id": ""}
+
+    messages = []
+    for index, message in enumerate(shape["messages"]):
+        last = index == len(shape["messages"]) - 1
+        content = with_marker(record["id"], message["chars"]) if last else filler(message["chars"])
+        entry = {"role": message["role"], "content": content}
+        if message["attachments"]:
+            entry["experimental_attachments"] = [
+                {"name": f"attachment-{i}", "contentType": content_type,
+                 "url": "https://example.invalid/attachment"}
+                for i, content_type in enumerate(message["attachments"])
+            ]
+        messages.append(entry)
+    if not messages:
+        messages.append({"role": "user", "content": with_marker(record["id"], 0)})
+    return {"messages": messages}
+
+
+def recorded_frames(record: dict) -> List[Tuple[float, str]]:
+    """(delay, text) pairs reproducing the record's upstream text timings"""
+    frames: List[Tuple[float, str]] = []
+    previous = 0.0
+    pending = 0.0
+    for offset, kind, value in record["upstream"]["frames"]:
+        pending += max(offset - previous, 0.0) / 1000.0
+        previous = offset
+        if kind == "text" and value:
+            frames.append((pending, filler(value)))
+            pending = 0.0
+    pending += sum(tool["ms"] for tool in record["tools"]) / 1000.0
+    if not frames:
+        # Tool-only responses still need one text frame for the client to time
+        frames.append((pending, "."))
+    elif pending > 0:
+        frames.append((pending, ""))
+    return frames
+
+
+def _record_for(records: Dict[str, dict], text: str) -> Optional[dict]:
+    match = MARKER_PATTERN.search(text)
+    return records.get(match.group(1)) if match else None
+
+
+def replay_schedule(records: Dict[str, dict]):
+    def schedule(body: dict) -> Iterator[Tuple[float, str]]:
+        record = _record_for(records, json.dumps(body.get("messages", [])))
+        if record is not None:
+            yield from recorded_frames(record)
+
+    return schedule
+
+
+def replay_responder(records: Dict[str, dict]):
+    def responder(body: dict) -> Tuple[float, str]:
+        record = _record_for(records, body.get("message", ""))
+        backend = (record or {}).get("backend") or {"ms": 0.0, "response_chars": 0}
+        return backend["ms"] / 1000.0, filler(backend["response_chars"])
+
+    return responder
+
+
+async def drive_replay(base_url: str, records: List[dict], speed: float, timeout: float) -> dict:
+    """Send every record at its recorded offset (divided by speed; 0 sends all at once)"""
+    first_ts = records[0]["ts"]
+    limits = httpx.Limits(max_connections=max(len(records), 1))
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        async def fire(record: dict):
+            if speed > 0:
+                await asyncio.sleep((record["ts"] - first_ts) / speed)
+            return await run_turn(client, base_url, build_payload(record))
+
+        start = time.perf_counter()
+        results = await asyncio.gather(*[fire(record) for record in records])
+        wall = time.perf_counter() - start
+    return summarize(list(results), wall)
+
+
+def run(capture_path: str, route: str = "direct", speed: float = 1.0, limit: Optional[int] = None,
+        app_dir: Optional[Path] = None, port: int = 8766, timeout: float = 60.0) -> dict:
+    """Replay a capture against the build in app_dir and return its latency report"""
+    # Coalesced requests carry no upstream timings; their leader's record replays the completion
+    records = [record for record in read_capture(capture_path)
+               if record.get("route") == route and record.get("outcome") == "ok" and not record.get("coalesced")]
+    records.sort(key=lambda record: record["ts"])
+    records = records[:limit] if limit else records
+    if not records:
+        raise SystemExit(f"No successful {route} records in {capture_path}")
+    by_id = {record["id"]: record for record in records}
+
+    # Recorded timings are replayed exactly: no jitter, no injected failures
+    config = StubConfig(jitter=0.0, failure_rate=0.0, seed=0)
+    openai_server = BackgroundServer(create_openai_app(config, replay_schedule(by_id))).start()
+    backend_server = BackgroundServer(create_backend_app(config, replay_responder(by_id))).start()
+    process = None
+    try:
+        env = {"OPENAI_BASE_URL": f"{openai_server.url}/v1", "OPENAI_API_KEY": "replay"}
+        env["BACKEND_URL"] = backend_server.url if route == "backend" else ""
+        process = launch_app(port, 1, env, app_dir)
+        base_url = f"http://127.0.0.1:{port}"
+        wait_until_ready(base_url, process=process)
+        report = asyncio.run(drive_replay(base_url, records, speed, timeout))
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        openai_server.stop()
+        backend_server.stop()
+
+    report.update({
+        "capture": str(capture_path),
+        "route": route,
+        "speed": speed,
+        "app_dir": str(app_dir or "."),
+    })
+    return report
+
+
+def diff(baseline: dict, candidate: dict) -> dict:
+    """Per-percentile deltas (candidate - baseline) of the latency distributions"""
+    result = {}
+    for metric in ("ttft_ms", "inter_token_gap_ms", "total_ms"):
+        rows = {}
+        for key, before in baseline.get(metric, {}).items():
+            after = candidate.get(metric, {}).get(key)
+            if before is None or after is None:
+                rows[key] = {"baseline": before, "candidate": after}
+                continue
+            rows[key] = {
+                "baseline": before,
+                "candidate": after,
+                "delta_ms": round(after - before, 2),
+                "delta_pct": round((after - before) / before * 100, 1) if before else None,
+            }
+        result[metric] = rows
+    for metric in ("error_rate", "requests_per_second"):
+        result[metric] = {"baseline": baseline.get(metric), "candidate": candidate.get(metric)}
+    return result
+
+
+def print_diff(result: dict):
+    for metric in ("ttft_ms", "inter_token_gap_ms", "total_ms"):
+        print(f"\n{metric}")
+        for key, row in result[metric].items():
+            delta = f"{row['delta_ms']:+.2f}ms ({row['delta_pct']:+.1f}%)" if row.get("delta_pct") is not None else "n/a"
+            print(f"  {key:>5}: {row['baseline']} -> {row['candidate']}  {delta}")
+    for metric in ("error_rate", "requests_per_second"):
+        print(f"\n{metric}: {result[metric]['baseline']} -> {result[metric]['candidate']}")
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Replay captured /api/chat traffic")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    def add_run_options(command):
+        command.add_argument("capture", help="gzip JSONL capture (CAPTURE_PATH)")
+        command.add_argument("--route", choices=["direct", "backend"], default="direct")
+        command.add_argument("--speed", type=float, default=1.0,
+                             help="Arrival-time speedup; 0 sends every request at once")
+        command.add_argument("--limit", type=int, help="Replay only the first N records")
+        command.add_argument("--port", type=int, default=8766)
+        command.add_argument("--timeout", type=float, default=60.0)
+        command.add_argument("--output", help="Write the JSON report to this file")
+
+    run_command = commands.add_parser("run", help="Replay against one build")
+    add_run_options(run_command)
+    run_command.add_argument("--app-dir", type=Path, help="Checkout to run (default: this one)")
+
+    diff_command = commands.add_parser("diff", help="Diff two run reports")
+    diff_command.add_argument("baseline")
+    diff_command.add_argument("candidate")
+    diff_command.add_argument("--output")
+
+    compare_command = commands.add_parser("compare", help="Run two builds and diff them")
+    add_run_options(compare_command)
+    compare_command.add_argument("--baseline-dir", type=Path, required=True)
+    compare_command.add_argument("--candidate-dir", type=Path, help="Default: this checkout")
+
+    args = parser.parse_args(argv)
+    if args.command == "run":
+        report = run(args.capture, args.route, args.speed, args.limit, args.app_dir, args.port, args.timeout)
+        output = report
+        print(json.dumps(report, indent=2))
+    else:
+        if args.command == "diff":
+            baseline = json.loads(Path(args.baseline).read_text())
+            candidate = json.loads(Path(args.candidate).read_text())
+        else:
+            baseline = run(args.capture, args.route, args.speed, args.limit, args.baseline_dir, args.port, args.timeout)
+            candidate = run(args.capture, args.route, args.speed, args.limit, args.candidate_dir, args.port, args.timeout)
+        output = {"baseline": baseline, "candidate": candidate, "diff": diff(baseline, candidate)}
+        print_diff(output["diff"])
+    if args.output:
+        Path(args.output).write_text(json.dumps(output, indent=2))
+    return output
+
+
+if __name__ == "__main__":
+    main()
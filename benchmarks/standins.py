@@ -0,0 +1,344 @@
+"""
+Local stand-ins for the upstreams of /api/chat
+
+- ``create_openai_app``: an OpenAI-compatible ``/v1/chat/completions``
+  endpoint that streams synthetic tokens at a configurable rate
+- ``create_backend_app``: the BACKEND_URL service (``/sessions``, ``/chat``)
+- ``RespServer``: a Redis-protocol server for ``SHARED_STATE_URL``
+
+The first two support jitter and injected failures, so latency can be
+measured without spending real OpenAI money. Point api/index.py at them
+with ``OPENAI_BASE_URL``, ``BACKEND_URL`` and ``SHARED_STATE_URL``.
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+# (delay before the frame in seconds, token text)
+TokenSchedule = Callable[[dict], Iterator[Tuple[float, str]]]
+# Request body -> (latency in seconds, response text)
+BackendResponder = Callable[[dict], Tuple[float, str]]
+
+
+@dataclass
+class StubConfig:
+    ttft_ms: float = 250.0
+    tokens_per_second: float = 40.0
+    response_tokens: int = 120
+    jitter: float = 0.2
+    failure_rate: float = 0.0
+    # Share of failures that cut the stream midway instead of returning 500
+    midstream_failure_share: float = 0.5
+    backend_latency_ms: float = 800.0
+    seed: Optional[int] = None
+    # Emulate OpenAI's per-minute request limit and x-ratelimit-* headers
+    rate_limit_rpm: Optional[int] = None
+
+
+def _jittered(rng: random.Random, seconds: float, jitter: float) -> float:
+    return max(0.0, seconds * (1 + rng.uniform(-jitter, jitter)))
+
+
+def synthetic_schedule(config: StubConfig, rng: random.Random) -> TokenSchedule:
+    """Default schedule: TTFT, then tokens at tokens_per_second, both jittered"""
+    words = ("Yale", "Ventures", "supports", "faculty", "founders", "with", "funding",
+             "mentorship", "and", "licensing", "for", "new", "technologies", "across", "campus")
+
+    def schedule(_body: dict) -> Iterator[Tuple[float, str]]:
+        yield _jittered(rng, config.ttft_ms / 1000.0, config.jitter), words[0]
+        gap = 1.0 / config.tokens_per_second
+        for index in range(1, config.response_tokens):
+            yield _jittered(rng, gap, config.jitter), " " + words[index % len(words)]
+
+    return schedule
+
+
+def _chunk(completion_id: str, model: str, delta: dict, finish_reason: Optional[str] = None) -> str:
+    return "data: " + json.dumps({
+        "id": completion_id,
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason, "logprobs": None}],
+    }) + "\n\n"
+
+
+def create_openai_app(config: StubConfig, schedule: Optional[TokenSchedule] = None) -> FastAPI:
+    """OpenAI-compatible streaming chat completions stand-in"""
+    app = FastAPI()
+    rng = random.Random(config.seed)
+    schedule = schedule or synthetic_schedule(config, rng)
+    app.state.requests = 0
+    app.state.rate_limited = 0
+    window: List[float] = []
+
+    def rate_limit_headers() -> Tuple[Dict[str, str], bool]:
+        """Sliding one-minute window; returns (headers, whether the request is over the limit)"""
+        if config.rate_limit_rpm is None:
+            return {}, False
+        now = time.monotonic()
+        while window and window[0] <= now - 60:
+            window.pop(0)
+        limited = len(window) >= config.rate_limit_rpm
+        if not limited:
+            window.append(now)
+        reset = max(window[0] + 60 - now, 0.0) if window else 0.0
+        return {
+            "x-ratelimit-limit-requests": str(config.rate_limit_rpm),
+            "x-ratelimit-remaining-requests": str(max(config.rate_limit_rpm - len(window), 0)),
+            "x-ratelimit-reset-requests": f"{reset:.3f}s",
+        }, limited
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        model = body.get("model", "gpt-4o")
+        headers, limited = rate_limit_headers()
+        if limited:
+            app.state.rate_limited += 1
+            return JSONResponse(status_code=429, headers={**headers, "retry-after": "1"},
+                                content={"error": {"message": "Rate limit reached", "type": "requests"}})
+        failing = rng.random() < config.failure_rate
+        if failing and rng.random() >= config.midstream_failure_share:
+            return JSONResponse(status_code=500, content={"error": {"message": "injected failure"}})
+
+        completion_id = f"chatcmpl-{uuid.uuid4().hex[:12]}"
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+        prompt_tokens = sum(len(json.dumps(message)) // 4 for message in body.get("messages", []))
+
+        async def stream():
+            completion_tokens = 0
+            yield _chunk(completion_id, model, {"role": "assistant", "content": ""})
+            frames = list(schedule(body))
+            cut = rng.randrange(1, max(len(frames), 2)) if failing else None
+            for index, (delay, text) in enumerate(frames):
+                if cut is not None and index >= cut:
+                    # Drop the connection without a finish chunk
+                    raise ConnectionResetError("injected midstream failure")
+                await asyncio.sleep(delay)
+                completion_tokens += 1
+                yield _chunk(completion_id, model, {"content": text})
+            yield _chunk(completion_id, model, {}, finish_reason="stop")
+            if include_usage:
+                yield "data: " + json.dumps({
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": int(time.time()),
+                    "model": model,
+                    "choices": [],
+                    "usage": {
+                        "prompt_tokens": prompt_tokens,
+                        "completion_tokens": completion_tokens,
+                        "total_tokens": prompt_tokens + completion_tokens,
+                    },
+                }) + "\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream", headers=headers)
+
+    return app
+
+
+def create_backend_app(config: StubConfig, responder: Optional[BackendResponder] = None) -> FastAPI:
+    """Stand-in for the secure backend behind BACKEND_URL"""
+    app = FastAPI()
+    rng = random.Random(config.seed)
+
+    def synthetic_response(_body: dict) -> Tuple[float, str]:
+        words = max(config.response_tokens, 1)
+        return (_jittered(rng, config.backend_latency_ms / 1000.0, config.jitter),
+                " ".join(["Yale Ventures can help with that."] * (words // 6 + 1)))
+
+    responder = responder or synthetic_response
+    app.state.requests = 0
+
+    @app.post("/sessions")
+    async def create_session():
+        return {"session_id": f"sess_{uuid.uuid4().hex[:12]}"}
+
+    @app.post("/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        latency, text = responder(body)
+        await asyncio.sleep(latency)
+        if rng.random() < config.failure_rate:
+            return JSONResponse(status_code=500, content={"error": "injected failure"})
+        return {
+            "session_id": body.get("session_id"),
+            "response": text,
+            "phase": "welcome_data_collection",
+            "completion_rate": 0.1,
+            "should_collect": [],
+            "next_actions": [],
+            "rag_triggered": False,
+            "citations": [],
+        }
+
+    return app
+
+
+class BackgroundServer:
+    """Runs an ASGI app with uvicorn on a background thread"""
+
+    def __init__(self, app: FastAPI, host: str = "127.0.0.1", port: int = 0):
+        self.config = uvicorn.Config(app, host=host, port=port, log_level="error")
+        self.server = uvicorn.Server(self.config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @property
+    def url(self) -> str:
+        sockets = self.server.servers[0].sockets
+        host, port = sockets[0].getsockname()[:2]
+        return f"http://{host}:{port}"
+
+    def start(self, timeout: float = 10.0) -> "BackgroundServer":
+        self.thread.start()
+        deadline = time.monotonic() + timeout
+        while not self.server.started:
+            if time.monotonic() > deadline:
+                raise RuntimeError("Stand-in server did not start")
+            time.sleep(0.01)
+        return self
+
+    def stop(self):
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
+
+
+class RespServer:
+    """
+    Redis-protocol stand-in for SHARED_STATE_URL: PING, AUTH, SELECT, GET,
+    SET (EX/PX/NX), DEL, EXISTS, DBSIZE, FLUSHDB/FLUSHALL
+
+    Keys live in one dict on a background event loop, so several app
+    workers pointed at it share state the way they would through Redis.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency_ms: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency_ms / 1000.0
+        self.data: Dict[bytes, Tuple[Optional[float], bytes]] = {}
+        self.commands = 0
+        self._loop = asyncio.new_event_loop()
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._clients: set = set()
+        self.thread = threading.Thread(target=self._loop.run_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"redis://{self.host}:{self.port}"
+
+    def start(self, timeout: float = 10.0) -> "RespServer":
+        self.thread.start()
+        self._server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self._serve, self.host, self.port), self._loop).result(timeout)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    def stop(self):
+        async def shutdown():
+            self._server.close()
+            for client in list(self._clients):
+                client.cancel()
+            await asyncio.gather(*self._clients, return_exceptions=True)
+            await self._server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result(5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self.thread.join(timeout=5)
+
+    @staticmethod
+    async def _read_command(reader: asyncio.StreamReader) -> Optional[List[bytes]]:
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b"*"):
+            # Inline command, as typed into telnet or redis-cli's raw mode
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    @staticmethod
+    def _bulk(value: Optional[bytes]) -> bytes:
+        return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+
+    def _get(self, key: bytes) -> Optional[bytes]:
+        entry = self.data.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def _execute(self, args: List[bytes]) -> bytes:
+        name = args[0].upper()
+        if name == b"PING":
+            return b"+PONG\r\n"
+        if name in (b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if name == b"GET":
+            return self._bulk(self._get(args[1]))
+        if name == b"SET":
+            key, value, options = args[1], args[2], [arg.upper() for arg in args[3:]]
+            expires_at = None
+            if b"EX" in options:
+                expires_at = time.monotonic() + float(args[3 + options.index(b"EX") + 1])
+            if b"PX" in options:
+                expires_at = time.monotonic() + float(args[3 + options.index(b"PX") + 1]) / 1000.0
+            if b"NX" in options and self._get(key) is not None:
+                return b"$-1\r\n"
+            self.data[key] = (expires_at, value)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return b":%d\r\n" % sum(self.data.pop(key, None) is not None for key in args[1:])
+        if name == b"EXISTS":
+            return b":%d\r\n" % sum(self._get(key) is not None for key in args[1:])
+        if name == b"DBSIZE":
+            return b":%d\r\n" % len(self.data)
+        if name in (b"FLUSHDB", b"FLUSHALL"):
+            self.data.clear()
+            return b"+OK\r\n"
+        return b"-ERR unknown command '%s'\r\n" % args[0]
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        client = asyncio.current_task()
+        self._clients.add(client)
+        try:
+            while True:
+                args = await self._read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                self.commands += 1
+                if self.latency:
+                    await asyncio.sleep(self.latency)
+                try:
+                    reply = self._execute(args)
+                except (IndexError, ValueError):
+                    reply = b"-ERR syntax error\r\n"
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.CancelledError):
+            pass
+        finally:
+            self._clients.discard(client)
+            writer.close()
@@ -9,7 +9,7 @@ import { useScrollToBottom } from "@/hooks/use-scroll-to-bottom";
 import { ToolInvocation } from "ai";
 import { useChat } from "ai/react";
 import { toast } from "sonner";
-import { useState, useCallback, useEffect } from "react";
+import { useState, useCallback, useEffect, useRef } from "react";
 
 // Cookie utilities
 const getCookie = (name: string): string | null => {
@@ -51,6 +51,8 @@ export function Chat() {
   const [cookieConsent, setCookieConsent] = useState<boolean | null>(null);
   const [showResetButton, setShowResetButton] = useState(false);
   const [pendingCitations, setPendingCitations] = useState<any[]>([]);
+  // Citations streamed as data frames ahead of the answer, linked to the message once it finishes
+  const streamedCitations = useRef<any[]>([]);
   const [currentMessageId, setCurrentMessageId] = useState<string | null>(null);
   const [messageCitations, setMessageCitations] = useState<Record<string, any[]>>({});
   const [backendCitationsLoaded, setBackendCitationsLoaded] = useState(false);
@@ -342,6 +344,7 @@ export function Chat() {
     append,
     isLoading,
     stop,
+    data: streamData,
   } = useChat({
     fetch: async (input: RequestInfo | URL, init?: RequestInit) => {
       const url = typeof input === 'string' ? input : input.toString();
@@ -545,6 +548,18 @@ export function Chat() {
       if (message.role === 'assistant' && message.id && message.content) {
         console.log("Message finished:", message.id, message.content);
         
+        if (streamedCitations.current.length > 0) {
+          const streamed = streamedCitations.current.map(citation => ({
+            ...citation,
+            messageId: message.id,
+            aiResponse: message.content
+          }));
+          streamedCitations.current = [];
+          setMessageCitations(prev => ({ ...prev, [message.id]: streamed }));
+          setPendingCitations([]);
+          return;
+        }
+        
         // Try to link any pending citations to this message
         setTimeout(() => {
           const messageContent = message.content || '';
@@ -583,6 +598,23 @@ export function Chat() {
     }
   });
 
+  // Early citations arrive before the answer text; a later "final" frame from the backend replaces them
+  useEffect(() => {
+    const latest: any = [...(streamData || [])].reverse().find(
+      (item: any) => item && item.type === 'citations'
+    );
+    if (!latest || !Array.isArray(latest.citations) || latest.citations.length === 0) {
+      return;
+    }
+    const userMessage = [...messages].reverse().find(message => message.role === 'user');
+    const formattedCitations = convertBackendCitations(latest.citations).map(citation => ({
+      ...citation,
+      userMessage: userMessage?.content || 'Previous question'
+    }));
+    streamedCitations.current = formattedCitations;
+    setPendingCitations(formattedCitations);
+  }, [streamData]);
+
   // Check for existing session and cookie consent on mount
   useEffect(() => {
     const checkExistingSession = async () => {
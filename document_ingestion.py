@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+"""
+Streaming document ingestion for the Aura Chatbot vector store
+
+Walks ``public/documents``, extracts text on a process pool, chunks it,
+embeds chunks in bounded batches and adds them with
+``AuraChatbotVectorStore.add_documents``. Every stage is a generator, so
+memory stays bounded by the extraction window and one embedding batch no
+matter how large the corpus is.
+
+Progress is checkpointed per file (mtime + sha256), so re-runs skip
+unchanged files and only re-ingest the ones that changed.
+
+Usage:
+    python document_ingestion.py --root public/documents --workers 4
+"""
+
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+from concurrent.futures import Future, ProcessPoolExecutor
+from collections import deque
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".md", ".html", ".htm"}
+
+
+@dataclass
+class IngestionStats:
+    files_seen: int = 0
+    files_skipped: int = 0
+    files_ingested: int = 0
+    chunks_added: int = 0
+    chunks_deleted: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+# ----------------------------------------------------------------------
+# Walk
+# ----------------------------------------------------------------------
+
+def walk_documents(root: Path) -> Iterator[Path]:
+    """Yield supported files under root in a stable order"""
+    for directory, subdirectories, filenames in os.walk(root):
+        subdirectories.sort()
+        for filename in sorted(filenames):
+            path = Path(directory) / filename
+            if path.suffix.lower() in SUPPORTED_EXTENSIONS:
+                yield path
+
+
+def file_sha256(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# ----------------------------------------------------------------------
+# Extract (runs in worker processes)
+# ----------------------------------------------------------------------
+
+def extract_text(path: str) -> Tuple[str, Optional[str], Optional[str]]:
+    """
+    Extract plain text from one file
+
+    Returns:
+        (path, text, error); text is None when extraction failed
+    """
+    try:
+        suffix = Path(path).suffix.lower()
+        if suffix == ".pdf":
+            try:
+                from pypdf import PdfReader
+            except ImportError:
+                return path, None, "pypdf is not installed, skipping PDF"
+            reader = PdfReader(path)
+            text = "\n\n".join(page.extract_text() or "" for page in reader.pages)
+        else:
+            text = Path(path).read_text(encoding="utf-8", errors="replace")
+            if suffix in (".html", ".htm"):
+                text = re.sub(r"(?is)<(script|style).*?</\1>", " ", text)
+                text = html.unescape(re.sub(r"(?s)<[^>]+>", " ", text))
+        return path, text, None
+    except Exception as e:
+        return path, None, str(e)
+
+
+def extract_bounded(paths: Iterator[Path], workers: int, window: int) -> Iterator[Tuple[str, Optional[str], Optional[str]]]:
+    """Extract files on a process pool with at most ``window`` files in flight, in input order"""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        in_flight: Deque[Future] = deque()
+        for path in paths:
+            in_flight.append(pool.submit(extract_text, str(path)))
+            if len(in_flight) >= window:
+                yield in_flight.popleft().result()
+        while in_flight:
+            yield in_flight.popleft().result()
+
+
+# ----------------------------------------------------------------------
+# Chunk
+# ----------------------------------------------------------------------
+
+def chunk_text(text: str, chunk_size: int = 1200, overlap: int = 200) -> Iterator[str]:
+    """Yield chunks of about chunk_size characters, split on paragraph boundaries"""
+    # Overlap must stay well below the chunk size for long paragraphs to advance
+    overlap = min(overlap, chunk_size // 4)
+    paragraphs = [p.strip() for p in re.split(r"\n\s*\n", text) if p.strip()]
+    current = ""
+    for paragraph in paragraphs:
+        while len(paragraph) > chunk_size:
+            # Paragraphs longer than a chunk are split on the nearest space
+            cut = paragraph.rfind(" ", 0, chunk_size)
+            cut = cut if cut > chunk_size // 2 else chunk_size
+            if current:
+                yield current
+                current = ""
+            yield paragraph[:cut].strip()
+            paragraph = paragraph[max(cut - overlap, 0):].strip()
+        if current and len(current) + len(paragraph) + 2 > chunk_size:
+            yield current
+            current = current[-overlap:] if overlap else ""
+        current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        yield current
+
+
+def batched(items: Iterator, size: int) -> Iterator[list]:
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# ----------------------------------------------------------------------
+# Pipeline
+# ----------------------------------------------------------------------
+
+class DocumentIngestionPipeline:
+    """Walk -> extract -> chunk -> embed -> add, in bounded batches with checkpoints"""
+
+    def __init__(self, vector_store, embed_fn: Callable[[List[str]], List[List[float]]],
+                 root: str = "public/documents",
+                 checkpoint_path: str = "./vector_stores/ingestion_checkpoint.json",
+                 workers: int = 4, batch_size: int = 64,
+                 chunk_size: int = 1200, chunk_overlap: int = 200):
+        """
+        Args:
+            vector_store: An AuraChatbotVectorStore
+            embed_fn: Embeds a list of texts in one call
+            root: Directory to ingest
+            checkpoint_path: JSON file recording ingested files
+            workers: Extraction processes
+            batch_size: Chunks per embedding call and add_documents call
+            chunk_size: Target chunk length in characters
+            chunk_overlap: Characters repeated between consecutive chunks
+        """
+        self.vector_store = vector_store
+        self.embed_fn = embed_fn
+        self.root = Path(root)
+        self.checkpoint_path = Path(checkpoint_path)
+        self.workers = workers
+        self.batch_size = batch_size
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.checkpoint: Dict[str, dict] = self._load_checkpoint()
+
+    def _load_checkpoint(self) -> Dict[str, dict]:
+        if self.checkpoint_path.exists():
+            return json.loads(self.checkpoint_path.read_text())
+        return {}
+
+    def _save_checkpoint(self):
+        self.checkpoint_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.checkpoint_path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.checkpoint, indent=1))
+        os.replace(tmp_path, self.checkpoint_path)
+
+    def _changed_files(self, stats: IngestionStats) -> Iterator[Path]:
+        """Yield files whose mtime and content hash differ from the checkpoint"""
+        touched = False
+        for path in walk_documents(self.root):
+            stats.files_seen += 1
+            key = str(path.relative_to(self.root))
+            entry = self.checkpoint.get(key)
+            mtime = path.stat().st_mtime
+            if entry and entry.get("mtime") == mtime:
+                stats.files_skipped += 1
+                continue
+            digest = file_sha256(path)
+            if entry and entry.get("sha256") == digest:
+                # Touched but unchanged: remember the new mtime, saved once after the walk
+                entry["mtime"] = mtime
+                touched = True
+                stats.files_skipped += 1
+                continue
+            yield path
+        if touched:
+            self._save_checkpoint()
+
+    def _ingest_file(self, path: Path, text: str, stats: IngestionStats) -> bool:
+        key = str(path.relative_to(self.root))
+        chunks = (
+            {
+                "id": f"{key}#{index}",
+                "text": chunk,
+                "metadata": {
+                    "source": key,
+                    "title": path.stem,
+                    "file_type": path.suffix.lower().lstrip("."),
+                    "chunk_index": index,
+                },
+            }
+            for index, chunk in enumerate(chunk_text(text, self.chunk_size, self.chunk_overlap))
+        )
+
+        added = 0
+        for batch in batched(chunks, self.batch_size):
+            embeddings = self.embed_fn([doc["text"] for doc in batch])
+            for doc, embedding in zip(batch, embeddings):
+                doc["embedding"] = embedding
+            if not self.vector_store.add_documents(batch):
+                stats.errors.append(f"{key}: add_documents failed")
+                return False
+            added += len(batch)
+
+        # Chunks the previous version had beyond the new count are stale
+        previous = self.checkpoint.get(key, {}).get("chunks", 0)
+        stale = [f"{key}#{index}" for index in range(added, previous)]
+        if stale and self.vector_store.delete_documents(stale):
+            stats.chunks_deleted += len(stale)
+
+        self.checkpoint[key] = {
+            "mtime": path.stat().st_mtime,
+            "sha256": file_sha256(path),
+            "chunks": added,
+        }
+        self._save_checkpoint()
+        stats.chunks_added += added
+        return True
+
+    def run(self) -> IngestionStats:
+        """Ingest new and changed files; safe to interrupt and re-run"""
+        stats = IngestionStats()
+        window = max(self.workers * 2, 1)
+        for path, text, error in extract_bounded(self._changed_files(stats), self.workers, window):
+            path = Path(path)
+            if error:
+                stats.errors.append(f"{path.relative_to(self.root)}: {error}")
+                continue
+            if self._ingest_file(path, text, stats):
+                stats.files_ingested += 1
+                print(f"✅ Ingested {path.relative_to(self.root)}")
+        return stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Ingest documents into the chatbot vector store")
+    parser.add_argument("--root", default="public/documents")
+    parser.add_argument("--checkpoint", default="./vector_stores/ingestion_checkpoint.json")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--chunk-size", type=int, default=1200)
+    parser.add_argument("--chunk-overlap", type=int, default=200)
+    parser.add_argument("--embedding-model", default="text-embedding-3-small")
+    args = parser.parse_args()
+
+    from async_retrieval import openai_embed_fn
+    from vector_storage_integration import init_chatbot_vector_store
+
+    pipeline = DocumentIngestionPipeline(
+        init_chatbot_vector_store(),
+        openai_embed_fn(args.embedding_model),
+        root=args.root,
+        checkpoint_path=args.checkpoint,
+        workers=args.workers,
+        batch_size=args.batch_size,
+        chunk_size=args.chunk_size,
+        chunk_overlap=args.chunk_overlap,
+    )
+    result = pipeline.run()
+    print(f"\n📊 Ingestion: {result}")
@@ -0,0 +1,651 @@
+#!/usr/bin/env python3
+"""
+Memory-mapped local vector store for the Aura Chatbot
+
+Embeddings live in a fixed-stride float32 file that is opened with mmap, so
+loading a store only maps files instead of deserializing every node. Text
+and metadata live in a compact sidecar (concatenated JSON records plus a
+fixed-stride offsets file) and are only decoded for the rows a query returns.
+Several worker processes on one host share the same OS page cache.
+
+On-disk layout for a store named ``<name>`` under ``storage_path``:
+
+    <name>.manifest.json   dimension, row count, deleted rows
+    <name>.vectors.f32     row-major float32 unit vectors (dim * 4 bytes/row)
+    <name>.records.bin     utf-8 JSON records {"id", "text", "metadata"}
+    <name>.offsets.u64     uint64 start offset of each record (count + 1 entries)
+    <name>.codes.u8        optional quantized codes (see vector_quantization.py)
+    <name>.codebook.npz    optional trained quantizer
+    <name>.metaindex.jsonl indexed metadata values per row, for filters
+    <name>.lexindex.jsonl  term counts per row, for lexical/hybrid queries
+
+The two index logs hold one ``[row, entry]`` line per row and are only
+appended to by ``save()``, so publishing new rows doesn't rewrite them;
+a process that has already loaded the store replays just the new lines.
+Deleted rows are pruned from the in-memory indexes and dropped from the
+logs by ``compact()``.
+"""
+
+import json
+import mmap
+import os
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from vector_indexes import BM25Index, MetadataIndex, reciprocal_rank_fusion
+from vector_quantization import load_quantizer, make_quantizer
+
+# Index attribute and log suffix; each log line is [row, entry]
+INDEX_LOGS = (
+    ("_metadata_index", "metaindex.jsonl"),
+    ("_lexical_index", "lexindex.jsonl"),
+)
+# Whole-file indexes written by earlier versions, replaced by the logs
+LEGACY_INDEXES = ("metaindex.json", "lexindex.json")
+
+
+@dataclass
+class StoreResult:
+    """Result of a write operation, mirrors ModularVectorStore results"""
+    success: bool
+    message: str = ""
+
+
+@dataclass
+class StoredNode:
+    """A node read back from the store"""
+    node_id: str
+    text: str
+    metadata: Dict[str, Any] = field(default_factory=dict)
+
+
+@dataclass
+class ScoredNode:
+    """A query hit, exposes ``node`` and ``score`` like llama_index's NodeWithScore"""
+    node: StoredNode
+    score: float
+
+
+@dataclass
+class QueryResult:
+    """Result of a query, exposes ``nodes`` like ModularVectorStore results"""
+    nodes: List[ScoredNode]
+
+
+def _open_mmap(path: Path) -> Optional[mmap.mmap]:
+    """Map a file read-only, returns None for missing or empty files"""
+    if not path.exists() or path.stat().st_size == 0:
+        return None
+    with open(path, "rb") as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _log_line(row: int, entry: dict) -> bytes:
+    return json.dumps([row, entry], separators=(",", ":")).encode("utf-8") + b"\n"
+
+
+class MmapVectorStore:
+    """
+    Append-only vector store backed by memory-mapped files
+
+    Vectors are normalized on write, so scores are cosine similarities.
+    Updating a node appends a new row and marks the old row as deleted;
+    ``compact()`` rewrites the files without deleted rows.
+
+    With ``quantization`` set, queries score compact codes first and re-rank
+    ``top_k * rerank_factor`` candidates with the exact float32 vectors, so
+    only the candidate rows of the vector file are paged in.
+    """
+
+    def __init__(self, storage_path: str = "./vector_stores",
+                 store_name: str = "aura_chatbot_store_local",
+                 auto_save: bool = True,
+                 quantization: Optional[str] = None,
+                 rerank_factor: int = 4,
+                 min_train_rows: int = 1024):
+        """
+        Open (or create) a memory-mapped store
+
+        Args:
+            storage_path: Directory holding the store files
+            store_name: Prefix of the store files
+            auto_save: If True, ``add_nodes`` persists immediately
+            quantization: None (exact), "int8" or "pq". An existing store keeps
+                          the quantization it was created with.
+            rerank_factor: Candidates re-ranked exactly per requested result
+            min_train_rows: Rows needed before the quantizer is trained;
+                            smaller stores are searched exactly
+        """
+        self.storage_path = Path(storage_path)
+        self.store_name = store_name
+        self.auto_save = auto_save
+        self.quantization = quantization
+        self.rerank_factor = rerank_factor
+        self.min_train_rows = min_train_rows
+        self.storage_path.mkdir(parents=True, exist_ok=True)
+
+        self.dimension: Optional[int] = None
+        self.count = 0
+        self.deleted: set = set()
+
+        self._vectors_mmap: Optional[mmap.mmap] = None
+        self._records_mmap: Optional[mmap.mmap] = None
+        self._offsets_mmap: Optional[mmap.mmap] = None
+        self._codes_mmap: Optional[mmap.mmap] = None
+        self._vectors = np.zeros((0, 0), dtype=np.float32)
+        self._codes: Optional[np.ndarray] = None
+        self._quantizer = None
+        self._metadata_index = MetadataIndex()
+        self._lexical_index = BM25Index()
+        # Bytes of each index log already applied, and deleted rows already pruned
+        self._log_offsets = {suffix: 0 for _, suffix in INDEX_LOGS}
+        self._pruned: set = set()
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._id_to_row: Optional[Dict[str, int]] = None
+        self._manifest_mtime = 0
+
+        # Rows added since the last save: (node_id, text, metadata, vector)
+        self._pending: List[tuple] = []
+
+        self.load()
+
+    # ------------------------------------------------------------------
+    # Files
+    # ------------------------------------------------------------------
+
+    def _path(self, suffix: str) -> Path:
+        return self.storage_path / f"{self.store_name}.{suffix}"
+
+    def _close_maps(self):
+        # numpy views must be dropped before the maps can be closed
+        self._vectors = np.zeros((0, self.dimension or 0), dtype=np.float32)
+        self._offsets = np.zeros(1, dtype=np.uint64)
+        self._codes = None
+        for mapped in (self._vectors_mmap, self._records_mmap, self._offsets_mmap, self._codes_mmap):
+            if mapped is not None:
+                mapped.close()
+        self._vectors_mmap = self._records_mmap = self._offsets_mmap = self._codes_mmap = None
+
+    def load(self) -> StoreResult:
+        """Map the store files; this does not read vectors or records"""
+        manifest_path = self._path("manifest.json")
+        if not manifest_path.exists():
+            return StoreResult(True, "Empty store")
+
+        try:
+            manifest = json.loads(manifest_path.read_text())
+            self._close_maps()
+            self.dimension = manifest.get("dimension")
+            self.count = manifest.get("count", 0)
+            self.deleted = set(manifest.get("deleted", []))
+            self.quantization = manifest.get("quantization", self.quantization)
+            self._manifest_mtime = manifest_path.stat().st_mtime_ns
+            self._id_to_row = None
+
+            self._vectors_mmap = _open_mmap(self._path("vectors.f32"))
+            self._records_mmap = _open_mmap(self._path("records.bin"))
+            self._offsets_mmap = _open_mmap(self._path("offsets.u64"))
+
+            if self._vectors_mmap is not None and self.dimension:
+                self._vectors = np.frombuffer(
+                    self._vectors_mmap, dtype=np.float32,
+                    count=self.count * self.dimension,
+                ).reshape(self.count, self.dimension)
+            if self._offsets_mmap is not None:
+                self._offsets = np.frombuffer(
+                    self._offsets_mmap, dtype=np.uint64, count=self.count + 1)
+            self._load_codes()
+            self._load_indexes()
+
+            return StoreResult(True, f"Mapped {self.count} rows")
+        except Exception as e:
+            return StoreResult(False, f"Failed to load store: {e}")
+
+    def _load_codes(self):
+        """Map quantized codes if they cover every row"""
+        codebook_path = self._path("codebook.npz")
+        if not self.quantization or not codebook_path.exists() or not self.dimension:
+            return
+        self._quantizer = load_quantizer(codebook_path)
+        code_size = self._quantizer.code_size(self.dimension)
+        self._codes_mmap = _open_mmap(self._path("codes.u8"))
+        if self._codes_mmap is not None and len(self._codes_mmap) == self.count * code_size:
+            self._codes = np.frombuffer(self._codes_mmap, dtype=np.uint8).reshape(self.count, code_size)
+
+    def _reset_indexes(self):
+        self._metadata_index = MetadataIndex()
+        self._lexical_index = BM25Index()
+        self._log_offsets = {suffix: 0 for _, suffix in INDEX_LOGS}
+        self._pruned = set()
+
+    def _load_indexes(self):
+        """Bring the metadata and lexical indexes up to ``count`` rows"""
+        for _, suffix in INDEX_LOGS:
+            path = self._path(suffix)
+            if path.exists() and path.stat().st_size < self._log_offsets[suffix]:
+                # Rewritten since we read it, e.g. compacted by another process
+                self._reset_indexes()
+                break
+        if self._metadata_index.rows > self.count:
+            self._reset_indexes()
+        if self._metadata_index.rows < self.count and not self._replay_index_logs():
+            self._rebuild_indexes()
+        self._prune_indexes()
+
+    def _apply_index_entry(self, attribute: str, row: int, entry: dict):
+        index = getattr(self, attribute)
+        if row in self.deleted:
+            index.reserve(row)
+        elif attribute == "_metadata_index":
+            index.add_keys(row, entry)
+        else:
+            index.add_counts(row, entry)
+
+    def _replay_index_logs(self) -> bool:
+        """Apply log lines past the rows already indexed; False if a log is missing or short"""
+        start = self._metadata_index.rows
+        for attribute, suffix in INDEX_LOGS:
+            path = self._path(suffix)
+            if not path.exists():
+                return False
+            index = getattr(self, attribute)
+            with open(path, "rb") as f:
+                f.seek(self._log_offsets[suffix])
+                for line in f:
+                    # Lines past ``count`` aren't published yet; a partial line is an interrupted save
+                    if index.rows >= self.count or not line.endswith(b"\n"):
+                        break
+                    row, entry = json.loads(line)
+                    if row != index.rows:
+                        return False
+                    self._apply_index_entry(attribute, row, entry)
+                    self._log_offsets[suffix] += len(line)
+            if index.rows < self.count:
+                return False
+        self._pruned.update(row for row in self.deleted if row >= start)
+        return True
+
+    def _rebuild_indexes(self):
+        """Index every row from its record and rewrite both logs"""
+        self._reset_indexes()
+        lines = {suffix: [] for _, suffix in INDEX_LOGS}
+        for row in range(self.count):
+            if row in self.deleted:
+                entries = ({}, {})
+            else:
+                record = self._row_record(row)
+                entries = (MetadataIndex.keys(record.get("metadata", {})),
+                           BM25Index.term_counts(record["text"]))
+            for (attribute, suffix), entry in zip(INDEX_LOGS, entries):
+                self._apply_index_entry(attribute, row, entry)
+                lines[suffix].append(_log_line(row, entry))
+        self._pruned = set(self.deleted)
+        for suffix, suffix_lines in lines.items():
+            path = self._path(suffix)
+            tmp_path = path.with_suffix(".jsonl.tmp")
+            tmp_path.write_bytes(b"".join(suffix_lines))
+            os.replace(tmp_path, path)
+            self._log_offsets[suffix] = path.stat().st_size
+        for suffix in LEGACY_INDEXES:
+            self._path(suffix).unlink(missing_ok=True)
+
+    def _prune_indexes(self):
+        """Drop rows deleted since the indexes were built"""
+        for row in sorted(self.deleted - self._pruned):
+            if row >= self._metadata_index.rows:
+                continue
+            record = self._row_record(row)
+            self._metadata_index.remove(row, record.get("metadata", {}))
+            self._lexical_index.remove(row, record["text"])
+            self._pruned.add(row)
+
+    def _append_index_logs(self):
+        """Index the pending rows and append their entries to the logs"""
+        lines = {suffix: [] for _, suffix in INDEX_LOGS}
+        for offset, (_, text, metadata, _) in enumerate(self._pending):
+            row = self.count + offset
+            entries = (MetadataIndex.keys(metadata), BM25Index.term_counts(text))
+            for (attribute, suffix), entry in zip(INDEX_LOGS, entries):
+                self._apply_index_entry(attribute, row, entry)
+                lines[suffix].append(_log_line(row, entry))
+        for suffix, suffix_lines in lines.items():
+            data = b"".join(suffix_lines)
+            with open(self._path(suffix), "ab") as f:
+                # Drops anything past the last published row, e.g. from an interrupted save
+                f.truncate(self._log_offsets[suffix])
+                f.write(data)
+            self._log_offsets[suffix] += len(data)
+
+    def _write_codes(self, new_vectors: np.ndarray):
+        """Encode new rows, training the quantizer once the store is large enough"""
+        if not self.quantization:
+            return
+        codes_path = self._path("codes.u8")
+        if self._quantizer is not None and self._quantizer.trained:
+            existing = codes_path.stat().st_size if codes_path.exists() else 0
+            expected = (self.count - len(new_vectors)) * self._quantizer.code_size(self.dimension)
+            if existing == expected:
+                with open(codes_path, "ab") as f:
+                    f.write(self._quantizer.encode(new_vectors).tobytes())
+                return
+        if self.count >= self.min_train_rows:
+            all_vectors = np.fromfile(self._path("vectors.f32"), dtype=np.float32,
+                                      count=self.count * self.dimension)
+            all_vectors = all_vectors.reshape(self.count, self.dimension)
+            self._quantizer = make_quantizer(self.quantization)
+            self._quantizer.train(all_vectors)
+            # np.savez appends .npz unless the name already ends with it
+            self._quantizer.save(self._path("codebook.npz"))
+            with open(codes_path, "wb") as f:
+                for start in range(0, self.count, 65536):
+                    f.write(self._quantizer.encode(all_vectors[start:start + 65536]).tobytes())
+
+    def close(self):
+        """Unmap the store files; pending rows are saved first"""
+        self.save()
+        self._close_maps()
+        self._id_to_row = None
+        self._reset_indexes()
+        self._manifest_mtime = 0
+
+    def refresh(self):
+        """Remap if another process saved the store since we last loaded it"""
+        manifest_path = self._path("manifest.json")
+        if manifest_path.exists() and manifest_path.stat().st_mtime_ns != self._manifest_mtime:
+            self.load()
+
+    def _write_manifest(self):
+        manifest_path = self._path("manifest.json")
+        tmp_path = manifest_path.with_suffix(".json.tmp")
+        tmp_path.write_text(json.dumps({
+            "format": "aura-mmap-v1",
+            "dimension": self.dimension,
+            "count": self.count,
+            "deleted": sorted(self.deleted),
+            "quantization": self.quantization,
+        }))
+        # Readers only see the new rows once the manifest is swapped in
+        os.replace(tmp_path, manifest_path)
+
+    def save(self) -> StoreResult:
+        """Append pending rows to the store files and publish a new manifest"""
+        if not self._pending:
+            return StoreResult(True, "Nothing to save")
+
+        try:
+            offsets_path = self._path("offsets.u64")
+            records_path = self._path("records.bin")
+            start = int(self._offsets[-1]) if self.count else 0
+            if not offsets_path.exists() or offsets_path.stat().st_size == 0:
+                with open(offsets_path, "wb") as f:
+                    f.write(np.array([0], dtype=np.uint64).tobytes())
+
+            vectors = np.stack([row[3] for row in self._pending]).astype(np.float32)
+            encoded = [
+                json.dumps({"id": node_id, "text": text, "metadata": metadata},
+                           separators=(",", ":")).encode("utf-8")
+                for node_id, text, metadata, _ in self._pending
+            ]
+            ends = start + np.cumsum([len(record) for record in encoded], dtype=np.uint64)
+
+            with open(self._path("vectors.f32"), "ab") as f:
+                f.write(vectors.tobytes())
+            with open(records_path, "ab") as f:
+                f.write(b"".join(encoded))
+            with open(offsets_path, "ab") as f:
+                f.write(ends.astype(np.uint64).tobytes())
+
+            self._append_index_logs()
+            self.count += len(self._pending)
+            self._write_codes(vectors)
+            saved = len(self._pending)
+            self._pending = []
+            self._write_manifest()
+            self.load()
+            return StoreResult(True, f"Saved {saved} rows")
+        except Exception as e:
+            return StoreResult(False, f"Failed to save store: {e}")
+
+    # ------------------------------------------------------------------
+    # Rows
+    # ------------------------------------------------------------------
+
+    def _row_record(self, row: int) -> dict:
+        start, end = int(self._offsets[row]), int(self._offsets[row + 1])
+        return json.loads(self._records_mmap[start:end].decode("utf-8"))
+
+    def _row_node(self, row: int) -> StoredNode:
+        record = self._row_record(row)
+        return StoredNode(node_id=record["id"], text=record["text"],
+                          metadata=record.get("metadata", {}))
+
+    def _ids(self) -> Dict[str, int]:
+        """Map node IDs to live rows, built lazily since it decodes every record"""
+        if self._id_to_row is None:
+            self._id_to_row = {}
+            for row in range(self.count):
+                if row not in self.deleted:
+                    self._id_to_row[self._row_record(row)["id"]] = row
+        return self._id_to_row
+
+    def live_rows(self, filters: Optional[Dict[str, Any]] = None) -> np.ndarray:
+        """Row numbers that are not deleted, optionally pre-filtered by metadata"""
+        if filters:
+            rows = self._metadata_index.candidates(filters)
+            rows = rows[rows < self.count]
+        else:
+            rows = np.arange(self.count)
+        if self.deleted:
+            rows = rows[~np.isin(rows, list(self.deleted))]
+        return rows
+
+    def _index_pending(self):
+        ids = self._ids()
+        for offset, row in enumerate(self._pending):
+            ids[row[0]] = self.count + offset
+
+    def _delete_row(self, row: Optional[int]):
+        # Pending rows (numbered from ``count``) are dropped from _pending instead:
+        # their numbers shift once the remaining pending rows are saved
+        if row is not None and row < self.count:
+            self.deleted.add(row)
+
+    def add_nodes(self, nodes: List[Any]) -> StoreResult:
+        """
+        Add nodes carrying ``text``, ``metadata``, ``embedding`` and optionally ``node_id``
+
+        Nodes whose ID already exists replace the stored row.
+        """
+        rows = []
+        for node in nodes:
+            embedding = getattr(node, "embedding", None)
+            if embedding is None:
+                return StoreResult(False, "All nodes need an embedding for the mmap store")
+
+            vector = np.asarray(embedding, dtype=np.float32)
+            if self.dimension is None:
+                self.dimension = int(vector.shape[0])
+            elif vector.shape[0] != self.dimension:
+                return StoreResult(
+                    False, f"Embedding dimension {vector.shape[0]} != store dimension {self.dimension}")
+
+            norm = float(np.linalg.norm(vector))
+            if norm > 0:
+                vector = vector / norm
+            node_id = getattr(node, "node_id", None) or str(uuid.uuid4())
+            rows.append((node_id, node.text, dict(getattr(node, "metadata", {}) or {}), vector))
+
+        ids = self._ids()
+        pending_ids = {row[0] for row in rows}
+        for node_id in pending_ids:
+            self._delete_row(ids.pop(node_id, None))
+        self._pending = [row for row in self._pending if row[0] not in pending_ids]
+        self._pending.extend(rows)
+        self._index_pending()
+
+        if self.auto_save:
+            result = self.save()
+            if not result.success:
+                return result
+        return StoreResult(True, f"Added {len(rows)} nodes")
+
+    def delete_nodes(self, node_ids: List[str]) -> StoreResult:
+        """Mark nodes as deleted"""
+        ids = self._ids()
+        removed = 0
+        for node_id in node_ids:
+            row = ids.pop(node_id, None)
+            if row is not None:
+                self._delete_row(row)
+                removed += 1
+        self._pending = [row for row in self._pending if row[0] not in set(node_ids)]
+        self._index_pending()
+        self._prune_indexes()
+        self._write_manifest()
+        self._manifest_mtime = self._path("manifest.json").stat().st_mtime_ns
+        return StoreResult(True, f"Deleted {removed} nodes")
+
+    def compact(self) -> StoreResult:
+        """Rewrite the store files without deleted rows"""
+        self.save()
+        live = []
+        for row in self.live_rows():
+            node = self._row_node(row)
+            live.append((node.node_id, node.text, node.metadata, self._vectors[row].copy()))
+        self._close_maps()
+        self._quantizer = None
+        self._reset_indexes()
+        for suffix in ("vectors.f32", "records.bin", "offsets.u64", "codes.u8", "codebook.npz",
+                       *(suffix for _, suffix in INDEX_LOGS), *LEGACY_INDEXES):
+            path = self._path(suffix)
+            if path.exists():
+                path.unlink()
+        self.count = 0
+        self.deleted = set()
+        self._id_to_row = None
+        self._pending = live
+        return self.save()
+
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+
+    def _top_rows(self, scores: np.ndarray, rows: np.ndarray, top_k: int) -> List[tuple]:
+        if len(rows) == 0:
+            return []
+        k = min(top_k, len(rows))
+        best = np.argpartition(-scores, k - 1)[:k]
+        best = best[np.argsort(-scores[best])]
+        return [(int(rows[i]), float(scores[i])) for i in best]
+
+    def query(self, query_embedding: Optional[List[float]], top_k: int = 5,
+              filters: Optional[Dict[str, Any]] = None,
+              query_text: Optional[str] = None, mode: str = "vector",
+              candidates: Optional[int] = None) -> QueryResult:
+        """
+        Return the ``top_k`` best rows
+
+        ``filters`` maps metadata fields to a value or a list of accepted
+        values. Matching rows come from the metadata index, so only they
+        are scored.
+
+        Modes:
+            vector: cosine similarity to ``query_embedding``
+            lexical: BM25 over node text for ``query_text``
+            hybrid: both rankings, each cut to ``candidates`` rows
+                    (default ``top_k * rerank_factor``), fused with
+                    reciprocal-rank fusion; scores are fused RRF scores
+        """
+        self.refresh()
+        if self.count == 0 or self.dimension is None:
+            return QueryResult(nodes=[])
+        if mode not in ("vector", "lexical", "hybrid"):
+            raise ValueError(f"Unknown query mode: {mode}")
+
+        rows = self.live_rows(filters)
+        budget = max(candidates or top_k * self.rerank_factor, top_k)
+        if mode == "lexical":
+            ranked = self._lexical_index.search(query_text or "", top_k, rows)
+        elif mode == "hybrid":
+            vector_ranked = self._vector_top(query_embedding, rows, budget)
+            lexical_ranked = self._lexical_index.search(query_text or "", budget, rows)
+            ranked = reciprocal_rank_fusion([
+                [row for row, _ in vector_ranked],
+                [row for row, _ in lexical_ranked],
+            ])[:top_k]
+        else:
+            ranked = self._vector_top(query_embedding, rows, top_k)
+
+        return QueryResult(nodes=[
+            ScoredNode(node=self._row_node(row), score=score) for row, score in ranked
+        ])
+
+    def query_batch(self, query_embeddings: List[List[float]], top_k: int = 5) -> List[QueryResult]:
+        """Vector queries for several embeddings, scored in one matrix product"""
+        self.refresh()
+        if self.count == 0 or self.dimension is None:
+            return [QueryResult(nodes=[]) for _ in query_embeddings]
+        if self._codes is not None:
+            return [self.query(embedding, top_k) for embedding in query_embeddings]
+
+        queries = np.asarray(query_embeddings, dtype=np.float32)
+        queries = queries / np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+        rows = self.live_rows()
+        vectors = self._vectors if len(rows) == self.count else self._vectors[rows]
+        scores = queries @ vectors.T
+        return [
+            QueryResult(nodes=[
+                ScoredNode(node=self._row_node(row), score=score)
+                for row, score in self._top_rows(query_scores, rows, top_k)
+            ])
+            for query_scores in scores
+        ]
+
+    def _vector_top(self, query_embedding: List[float], rows: np.ndarray, top_k: int) -> List[tuple]:
+        """Best (row, cosine score) pairs among ``rows``"""
+        query = np.asarray(query_embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(query))
+        if norm > 0:
+            query = query / norm
+
+        if self._codes is not None:
+            rows, scores = self._quantized_scores(query, rows, top_k)
+        elif len(rows) == self.count:
+            scores = self._vectors @ query
+        else:
+            scores = self._vectors[rows] @ query
+        return self._top_rows(scores, rows, top_k)
+
+    def _quantized_scores(self, query: np.ndarray, rows: np.ndarray, top_k: int) -> tuple:
+        """Score codes for all rows, then exact scores for the best candidates"""
+        codes = self._codes if len(rows) == self.count else self._codes[rows]
+        approx = self._quantizer.score(codes, query)
+        candidates = min(len(rows), top_k * self.rerank_factor)
+        if candidates == 0:
+            return rows[:0], approx[:0]
+        shortlist = rows[np.argpartition(-approx, candidates - 1)[:candidates]]
+        return shortlist, self._vectors[shortlist] @ query
+
+    def get_stats(self) -> dict:
+        """Get store statistics"""
+        return {
+            "storage_backend": "local_mmap",
+            "store_name": self.store_name,
+            "storage_path": str(self.storage_path),
+            "dimension": self.dimension,
+            "total_rows": self.count,
+            "live_nodes": self.count - len(self.deleted),
+            "pending_nodes": len(self._pending),
+            "vector_bytes": self.count * (self.dimension or 0) * 4,
+            "indexed_metadata_fields": sorted(self._metadata_index.postings),
+            "lexical_terms": len(self._lexical_index.postings),
+            "index_bytes": self._metadata_index.approx_bytes() + self._lexical_index.approx_bytes(),
+            "quantization": self.quantization,
+            "quantized_rows": 0 if self._codes is None else len(self._codes),
+            "bytes_per_vector": (self._codes.shape[1] if self._codes is not None
+                                 else (self.dimension or 0) * 4),
+        }
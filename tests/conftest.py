@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# The vector-store modules live at the repo root and api/ is imported as a package
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
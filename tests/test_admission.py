@@ -0,0 +1,132 @@
+import asyncio
+
+import pytest
+
+from api.utils import admission
+
+
+def controller(**options):
+    options.setdefault("queue_timeout", 1.0)
+    return admission.AdmissionController(**options)
+
+
+def test_parse_reset():
+    assert admission.parse_reset("1s") == 1.0
+    assert admission.parse_reset("6m0s") == 360.0
+    assert admission.parse_reset("20ms") == pytest.approx(0.02)
+    assert admission.parse_reset("2.5") == 2.5
+    assert admission.parse_reset("soon") is None
+
+
+def test_token_bucket_refills_at_rate():
+    bucket = admission.TokenBucket(rate=0.5, burst=2, now=0.0)
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == 0.0
+    assert bucket.take(0.0) == pytest.approx(2.0)
+    assert bucket.take(1.0) == pytest.approx(1.0)
+    assert bucket.take(2.0) == 0.0
+
+
+def test_session_burst_is_rate_limited_per_session():
+    gate = controller(session_rate=0.001, session_burst=2)
+    for _ in range(2):
+        gate.admit_blocking("a").release()
+    with pytest.raises(admission.AdmissionRejected) as e:
+        gate.admit_blocking("a")
+    assert e.value.reason == "session_rate"
+    assert int(e.value.retry_after_header) >= 1
+
+    # Other sessions and sessionless requests have their own (or no) bucket
+    gate.admit_blocking("b").release()
+    for _ in range(5):
+        gate.admit_blocking(None).release()
+
+
+def test_full_queue_fails_fast_and_refunds_the_session_token():
+    gate = controller(max_concurrency=1, queue_size=0, session_burst=1, session_rate=0.001)
+    held = gate.admit_blocking(None)
+    with pytest.raises(admission.AdmissionRejected) as e:
+        gate.admit_blocking("a")
+    assert e.value.reason == "queue_full"
+
+    held.release()
+    gate.admit_blocking("a").release()
+
+
+def test_ongoing_sessions_are_dequeued_first():
+    async def scenario():
+        gate = controller(max_concurrency=1)
+        held = await gate.admit(None)
+        order = []
+
+        async def request(name, priority):
+            ticket = await gate.admit(None, priority)
+            order.append(name)
+            ticket.release()
+
+        new = asyncio.create_task(request("new", admission.PRIORITY_NEW))
+        await asyncio.sleep(0)
+        ongoing = asyncio.create_task(request("ongoing", admission.PRIORITY_ONGOING))
+        await asyncio.sleep(0)
+        assert gate.queued == 2
+
+        held.release()
+        await asyncio.gather(new, ongoing)
+        return order, gate
+
+    order, gate = asyncio.run(scenario())
+    assert order == ["ongoing", "new"]
+    assert (gate.active, gate.queued) == (0, 0)
+
+
+def test_queue_timeout_rejects():
+    gate = controller(max_concurrency=1, queue_timeout=0.05)
+    gate.admit_blocking(None)
+    with pytest.raises(admission.AdmissionRejected) as e:
+        gate.admit_blocking(None)
+    assert e.value.reason == "queue_timeout"
+    assert gate.queued == 0
+
+
+def test_release_is_idempotent():
+    gate = controller()
+    ticket = gate.admit_blocking(None)
+    ticket.release()
+    ticket.release()
+    assert gate.active == 0
+
+
+def test_rate_limit_halves_the_limit_and_successes_raise_it():
+    gate = controller(max_concurrency=8)
+    gate.observe_rate_limited({"retry-after": "0"})
+    assert gate.limit == 4
+    gate.observe_rate_limited({"retry-after": "0"})
+    assert gate.limit == 2
+
+    comfortable = {"x-ratelimit-remaining-requests": "100", "x-ratelimit-remaining-tokens": "100000"}
+    for _ in range(10):
+        gate.observe_upstream(comfortable)
+    assert gate.limit == 8
+
+
+def test_limit_never_drops_below_minimum():
+    gate = controller(max_concurrency=2, min_concurrency=1)
+    for _ in range(3):
+        gate.observe_rate_limited({"retry-after": "0"})
+    assert gate.limit == 1
+
+
+def test_remaining_requests_cap_the_limit():
+    gate = controller(max_concurrency=32)
+    gate.observe_upstream({"x-ratelimit-remaining-requests": "5"})
+    assert gate.limit == 5
+
+
+def test_spent_window_pauses_admissions():
+    gate = controller(queue_timeout=0.05)
+    gate.observe_upstream({"x-ratelimit-remaining-requests": "0",
+                           "x-ratelimit-reset-requests": "60s"})
+    assert gate.stats()["paused_for"] > 59
+    with pytest.raises(admission.AdmissionRejected) as e:
+        gate.admit_blocking(None)
+    assert e.value.reason == "upstream_rate_limited"
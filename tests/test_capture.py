@@ -0,0 +1,68 @@
+import pytest
+
+from api.utils.prompt import ClientMessage
+from api.utils import capture
+
+
+@pytest.fixture
+def capture_file(tmp_path, monkeypatch):
+    path = tmp_path / "capture.jsonl.gz"
+    monkeypatch.setattr(capture, "CAPTURE_PATH", str(path))
+    writer = capture.CaptureWriter(str(path))
+    monkeypatch.setattr(capture, "_writer_instance", writer)
+    yield path, writer
+    writer.close()
+
+
+def start(session_id="session-1"):
+    messages = [ClientMessage(role="user", content="secret question")]
+    return capture.start_recording(messages, "secret question", session_id)
+
+
+def test_sampling(capture_file, monkeypatch):
+    monkeypatch.setattr(capture, "CAPTURE_SAMPLE_RATE", 1.0)
+    assert start() is not None
+    monkeypatch.setattr(capture, "CAPTURE_SAMPLE_RATE", 0.0)
+    assert start() is None
+
+
+def test_unsampled_request_does_not_see_the_previous_recording(capture_file, monkeypatch):
+    monkeypatch.setattr(capture, "CAPTURE_SAMPLE_RATE", 1.0)
+    sampled = start()
+    assert capture.current_recording() is sampled
+
+    monkeypatch.setattr(capture, "CAPTURE_SAMPLE_RATE", 0.0)
+    start()
+    assert capture.current_recording() is None
+
+
+def test_capture_off_without_path(monkeypatch):
+    monkeypatch.setattr(capture, "CAPTURE_PATH", None)
+    assert start() is None
+    assert capture.current_recording() is None
+
+
+def test_records_are_anonymized_and_finished_once(capture_file):
+    path, writer = capture_file
+    recording = start()
+    frames = capture.finish_after(iter(["0:\"a\"\n", "0:\"b\"\n"]), recording, "direct")
+    assert list(frames) == ["0:\"a\"\n", "0:\"b\"\n"]
+    recording.finish("direct", "error")
+    writer.close()
+
+    [record] = capture.read_capture(str(path))
+    assert record["outcome"] == "ok"
+    assert record["request"]["messages"] == [
+        {"role": "user", "chars": 15, "attachments": [], "tool_invocations": 0}]
+    assert record["request"]["session"] != "session-1"
+    assert "secret" not in path.read_bytes().decode("latin-1")
+
+
+def test_abandoned_stream(capture_file):
+    path, writer = capture_file
+    recording = start()
+    frames = capture.finish_after(iter(["0:\"a\"\n", "0:\"b\"\n"]), recording, "direct")
+    next(frames)
+    frames.close()
+    writer.close()
+    assert capture.read_capture(str(path))[0]["outcome"] == "abandoned"
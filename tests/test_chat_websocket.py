@@ -0,0 +1,58 @@
+import os
+
+import pytest
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from api import index  # noqa: E402
+
+
+@pytest.fixture
+def app(monkeypatch):
+    monkeypatch.delenv("BACKEND_URL", raising=False)
+    admitted = []
+    original_admit = index.admission.controller.admit
+
+    async def admit(key, priority=index.admission.PRIORITY_NEW):
+        admitted.append(key)
+        return await original_admit(key, priority)
+
+    async def process_chat(request, protocol, backend_client=None):
+        return StreamingResponse(iter(['0:"hi"\n', 'e:{"finishReason":"stop"}\n']))
+
+    monkeypatch.setattr(index.admission.controller, "admit", admit)
+    monkeypatch.setattr(index, "process_chat", process_chat)
+    return TestClient(index.app), admitted
+
+
+def turn(websocket, content):
+    websocket.send_json({"type": "message", "message": {"role": "user", "content": content}})
+    events = []
+    while not events or events[-1].get("type") not in ("done", "error"):
+        events.append(websocket.receive_json())
+    return events
+
+
+def test_turns_are_admitted_under_the_connection_session(app):
+    client, admitted = app
+    with client.websocket_connect("/api/chat/ws") as websocket:
+        session = websocket.receive_json()
+        assert session["type"] == "session"
+        assert turn(websocket, "hello")[-1]["type"] == "done"
+        assert turn(websocket, "again")[-1]["type"] == "done"
+
+    assert admitted == [session["session_id"]] * 2
+    assert session["session_id"]
+
+
+def test_only_the_resume_token_carries_the_session_over(app):
+    client, _ = app
+    with client.websocket_connect("/api/chat/ws") as websocket:
+        session = websocket.receive_json()
+        turn(websocket, "hello")
+        with client.websocket_connect("/api/chat/ws?resume=guessed") as other:
+            assert other.receive_json()["session_id"] != session["session_id"]
+        with client.websocket_connect(f"/api/chat/ws?resume={session['resume']}") as resumed:
+            assert resumed.receive_json() == session
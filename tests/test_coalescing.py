@@ -0,0 +1,101 @@
+import threading
+import time
+
+import pytest
+
+from api.utils import coalescing
+
+
+def gated(frames, gate, calls):
+    """A producer that waits for ``gate`` before streaming ``frames``"""
+    calls.append(1)
+    gate.wait(5)
+    yield from frames
+
+
+def wait_forgotten(flights):
+    deadline = time.monotonic() + 5
+    while len(flights) and time.monotonic() < deadline:
+        time.sleep(0.001)
+    return len(flights) == 0
+
+
+def test_request_key_ignores_dict_order():
+    a = coalescing.request_key([{"role": "user", "content": "hi"}], "m")
+    b = coalescing.request_key([{"content": "hi", "role": "user"}], "m")
+    assert a == b
+    assert a != coalescing.request_key([{"role": "user", "content": "hi"}], "other")
+
+
+def test_concurrent_requests_share_one_producer():
+    flights = coalescing.SingleFlight()
+    gate, calls = threading.Event(), []
+    frames = ["0:\"a\"\n", "0:\"b\"\n", "e:{}\n"]
+
+    def factory():
+        return gated(frames, gate, calls)
+
+    first, first_frames, first_joined = flights.join("key", factory)
+    second, second_frames, second_joined = flights.join("key", factory)
+    assert (first_joined, second_joined) == (False, True)
+    assert first is second
+    assert len(flights) == 1
+
+    gate.set()
+    assert list(first_frames) == frames
+    assert list(second_frames) == frames
+    assert len(calls) == 1
+
+    assert wait_forgotten(flights)
+
+
+def test_late_subscriber_replays_history():
+    flights = coalescing.SingleFlight()
+    gate, calls = threading.Event(), []
+    frames = ["0:\"a\"\n", "0:\"b\"\n"]
+    flight, first_frames, _ = flights.join("key", lambda: gated(frames, gate, calls))
+    gate.set()
+    assert next(first_frames) == frames[0]
+
+    assert list(flight.subscribe()) == frames
+    assert list(first_frames) == frames[1:]
+
+
+def test_finished_flight_is_not_joined():
+    flights = coalescing.SingleFlight()
+    calls = []
+    gate = threading.Event()
+    gate.set()
+    _, frames, _ = flights.join("key", lambda: gated(["x"], gate, calls))
+    assert list(frames) == ["x"]
+    assert wait_forgotten(flights)
+
+    _, frames, joined = flights.join("key", lambda: gated(["y"], gate, calls))
+    assert not joined
+    assert list(frames) == ["y"]
+    assert len(calls) == 2
+
+
+def test_producer_error_reaches_every_subscriber():
+    def failing():
+        yield "0:\"a\"\n"
+        raise RuntimeError("upstream")
+
+    flight = coalescing.Broadcast(failing())
+    first, second = flight.subscribe(), flight.subscribe()
+    flight.start()
+    for frames in (first, second):
+        with pytest.raises(RuntimeError):
+            list(frames)
+
+
+def test_trimmed_history_refuses_old_offsets():
+    flight = coalescing.Broadcast(iter(["a", "b", "c"]), max_history=2)
+    frames = flight.subscribe()
+    flight.start()
+    assert list(frames) == ["a", "b", "c"]
+
+    with pytest.raises(coalescing.HistoryTrimmed) as e:
+        flight.subscribe(0)
+    assert e.value.first_available == 1
+    assert list(flight.subscribe(1)) == ["b", "c"]
@@ -0,0 +1,101 @@
+import itertools
+from functools import partial
+
+import httpx
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import converter
+from api.utils import shared_state
+
+
+def make_backend():
+    """Stand-in for the secure backend: numbered sessions, echoes the session id"""
+    backend = FastAPI()
+    numbers = itertools.count(1)
+    backend.state.sessions = []
+
+    @backend.post("/api/sessions")
+    async def create_session():
+        session_id = f"session-{next(numbers)}"
+        backend.state.sessions.append(session_id)
+        return {"session_id": session_id}
+
+    @backend.post("/api/chat")
+    async def chat(body: dict):
+        return {"response": body["session_id"]}
+
+    return backend
+
+
+@pytest.fixture
+def backend(monkeypatch):
+    backend = make_backend()
+    monkeypatch.setattr(converter.httpx, "AsyncClient",
+                        partial(httpx.AsyncClient, transport=httpx.ASGITransport(app=backend)))
+    monkeypatch.setattr(converter, "active_sessions",
+                        shared_state.SharedMap("converter_sessions", state=shared_state.InProcessBackend()))
+    return backend
+
+
+def send(client, content, chat_id=None, header=None):
+    body = {"messages": [{"role": "user", "content": content}]}
+    if chat_id:
+        body["id"] = chat_id
+    response = client.post("/api/chat", json=body, headers={"x-chat-id": header} if header else {})
+    assert response.status_code == 200
+    return response.text.splitlines()[0]
+
+
+def test_conversation_key():
+    assert converter.conversation_key(None) is None
+    assert converter.conversation_key("") is None
+    assert converter.conversation_key("chat-1") == converter.conversation_key("chat-1")
+    assert converter.conversation_key("chat-1") != converter.conversation_key("chat-2")
+
+
+def test_same_chat_id_reuses_session(backend):
+    client = TestClient(converter.app)
+    assert send(client, "hello", chat_id="chat-1") == '0:"session-1"'
+    assert send(client, "again", chat_id="chat-1") == '0:"session-1"'
+    assert send(client, "again", header="chat-1") == '0:"session-1"'
+    assert backend.state.sessions == ["session-1"]
+
+
+def test_identical_messages_from_different_chats_get_separate_sessions(backend):
+    client = TestClient(converter.app)
+    assert send(client, "hello", chat_id="chat-1") == '0:"session-1"'
+    assert send(client, "hello", chat_id="chat-2") == '0:"session-2"'
+
+
+def test_requests_without_chat_id_get_fresh_sessions(backend):
+    client = TestClient(converter.app)
+    send(client, "hello")
+    send(client, "hello")
+    assert backend.state.sessions == ["session-1", "session-2"]
+
+
+def test_shared_state_is_not_called_on_the_event_loop(backend, monkeypatch):
+    import threading
+
+    class RecordingMap(shared_state.SharedMap):
+        threads = []
+
+        def get(self, key, default=None):
+            self.threads.append(threading.current_thread())
+            return super().get(key, default)
+
+        def set(self, key, value, ttl=None):
+            self.threads.append(threading.current_thread())
+            super().set(key, value, ttl)
+
+    sessions = RecordingMap("converter_sessions", state=shared_state.InProcessBackend())
+    monkeypatch.setattr(converter, "active_sessions", sessions)
+    client = TestClient(converter.app)
+    send(client, "hello", chat_id="chat-1")
+    send(client, "again", chat_id="chat-1")
+
+    assert len(sessions.threads) == 4
+    # asyncio.to_thread runs on the default executor, named asyncio_N
+    assert all(thread.name.startswith("asyncio") for thread in sessions.threads)
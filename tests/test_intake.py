@@ -0,0 +1,89 @@
+from types import SimpleNamespace
+
+import pytest
+
+from api.utils.intake import MIN_CONFIDENCE, PHASES, extract, local_response
+
+
+def session(**fields):
+    return SimpleNamespace(**{"current_phase": PHASES[0], "completion_rate": 0.1, **fields})
+
+
+@pytest.mark.parametrize("text, fields", [
+    ("My name is Jane Doe and I am a PhD student in computer science at the School of Medicine",
+     {"user_name": "Jane Doe", "user_role": "student", "school_affiliation": "med",
+      "department": "computer science"}),
+    ("I'm Sarah Chen, a founder", {"user_name": "Sarah Chen", "user_role": "founder"}),
+    ("I'm Dr. Patel", {"user_name": "Patel"}),
+    ("reach me at Jane@Yale.edu", {"user_email": "jane@yale.edu"}),
+])
+def test_extracts_fields(text, fields):
+    result = extract(text)
+    assert result.fields == fields
+    assert result.confident(fields)
+
+
+@pytest.mark.parametrize("text", [
+    "I'm stuck on my application",
+    "I'm interested in funding",
+    "I'm excited to apply",
+    "I'm Very Confused",
+    "I'm Interested In Patents",
+    "I'm Lost",
+    "Very Confused",
+])
+def test_ignores_phrases_that_are_not_names(text):
+    assert "user_name" not in extract(text).fields
+
+
+def test_single_word_introduction_needs_confirmation():
+    result = extract("I'm Sarah")
+    assert result.fields["user_name"] == "Sarah"
+    assert result.confidence["user_name"] < MIN_CONFIDENCE
+
+
+def test_negated_role_is_skipped():
+    assert extract("I'm not a student anymore, I'm a postdoc").fields == {"user_role": "postdoc"}
+
+
+def test_questions_are_flagged():
+    assert extract("How do I apply?").question
+    assert not extract("My name is Jane Doe").question
+
+
+def test_local_response_collects_fields_and_advances_phase():
+    response, _ = local_response(session(database_fields={}, missing_required=["user_name", "user_role"]),
+                                 "My name is Jane Doe, I'm a postdoc")
+    assert response["database_fields"] == {"user_name": "Jane Doe", "user_role": "postdoc"}
+    assert response["extracted_data"] == {"name": "Jane Doe", "role": "postdoc"}
+    assert response["response"].startswith("Thanks, Jane!")
+    assert response["phase"] == PHASES[1]
+    assert response["completion_rate"] > 0.1
+    assert response["missing_required"] == []
+
+
+@pytest.mark.parametrize("message", [
+    "I'm Lost. I am a student",
+    "Honestly I'm Confused, I'm a postdoc",
+    "I'm Sam, a student",
+])
+def test_local_response_keeps_a_known_name(message):
+    response, _ = local_response(session(database_fields={"user_name": "Jane Doe"}, missing_required=["user_role"]),
+                                 message)
+    assert response["database_fields"]["user_name"] == "Jane Doe"
+    assert "name" not in response["extracted_data"]
+    assert response["response"].startswith("Thanks, Jane!")
+
+
+def test_explicit_name_replaces_a_known_name():
+    response, _ = local_response(session(database_fields={"user_name": "Jane Doe"}, missing_required=["user_role"]),
+                                 "My name is Sam Lee and I am a student")
+    assert response["database_fields"]["user_name"] == "Sam Lee"
+
+
+def test_questions_and_unsure_answers_go_to_the_llm():
+    missing = ["user_name", "user_role"]
+    assert local_response(session(database_fields={}, missing_required=missing), "What is a postdoc?") is None
+    assert local_response(session(database_fields={}, missing_required=missing), "I'm Sarah, a student") is None
+    assert local_response(session(current_phase=PHASES[1], database_fields={}, missing_required=missing),
+                          "My name is Jane Doe, I'm a postdoc") is None
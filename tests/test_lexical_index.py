@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from local_vector_store import MmapVectorStore
+from vector_indexes import BM25Index, reciprocal_rank_fusion
+
+
+def node(node_id, text, program, seed):
+    embedding = np.random.default_rng(seed).normal(size=16)
+    return SimpleNamespace(node_id=node_id, text=text, metadata={"program": program}, embedding=embedding)
+
+
+@pytest.fixture
+def nodes():
+    return [
+        node("a", "apply for the innovation fellowship", "Innovation", 1),
+        node("b", "essay deadline is in march", "Blavatnik", 2),
+        node("c", "fellowship interview tips", "Blavatnik", 3),
+    ]
+
+
+def lexical(store, text):
+    return [hit.node.node_id for hit in store.query(None, top_k=5, query_text=text, mode="lexical").nodes]
+
+
+def test_bm25_ranks_and_removes():
+    index = BM25Index()
+    index.add(0, "fellowship fellowship deadline")
+    index.add(1, "fellowship")
+    index.add(2, "stipend")
+    assert [row for row, _ in index.search("fellowship", 5)] == [1, 0]
+
+    index.remove(1, "fellowship")
+    assert [row for row, _ in index.search("fellowship", 5)] == [0]
+    assert index.documents == 2
+    assert index.rows == 3
+
+
+def test_reciprocal_rank_fusion_prefers_rows_ranked_by_both():
+    assert reciprocal_rank_fusion([[1, 2, 3], [3, 1]])[0][0] == 1
+
+
+def test_lexical_and_hybrid_queries_survive_reopen(tmp_path, nodes):
+    MmapVectorStore(str(tmp_path), "test").add_nodes(nodes)
+
+    store = MmapVectorStore(str(tmp_path), "test")
+    assert set(lexical(store, "fellowship")) == {"a", "c"}
+    hybrid = store.query(nodes[2].embedding, top_k=1, query_text="interview", mode="hybrid")
+    assert hybrid.nodes[0].node.node_id == "c"
+
+
+def test_deleted_rows_are_pruned_from_the_indexes(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test")
+    store.add_nodes(nodes)
+    store.delete_nodes(["c"])
+    assert lexical(store, "fellowship") == ["a"]
+    assert store._metadata_index.postings["program"]["Blavatnik"] == [1]
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert lexical(reopened, "fellowship") == ["a"]
+    assert reopened._lexical_index.documents == 2
+
+
+def test_index_logs_are_appended_and_rebuilt(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test")
+    store.add_nodes(nodes[:2])
+    log = tmp_path / "test.lexindex.jsonl"
+    # An interrupted save leaves a partial line; the next save replaces it
+    with open(log, "ab") as f:
+        f.write(b'[2,{"x"')
+    store.add_nodes(nodes[2:])
+    assert len(log.read_text().splitlines()) == 3
+
+    (tmp_path / "test.metaindex.jsonl").unlink()
+    rebuilt = MmapVectorStore(str(tmp_path), "test")
+    assert set(lexical(rebuilt, "fellowship")) == {"a", "c"}
+    assert (tmp_path / "test.metaindex.jsonl").exists()
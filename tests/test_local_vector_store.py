@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+
+from local_vector_store import MmapVectorStore
+
+
+def node(node_id, text, program, seed):
+    embedding = np.random.default_rng(seed).normal(size=16)
+    return SimpleNamespace(node_id=node_id, text=text, metadata={"program": program}, embedding=embedding)
+
+
+@pytest.fixture
+def nodes():
+    return [
+        node("a", "apply for the innovation fellowship", "Innovation", 1),
+        node("b", "essay deadline is in march", "Blavatnik", 2),
+        node("c", "fellowship interview tips", "Blavatnik", 3),
+    ]
+
+
+def ids(result):
+    return [hit.node.node_id for hit in result.nodes]
+
+
+def texts(store):
+    return {store._row_node(row).node_id: store._row_node(row).text for row in store.live_rows()}
+
+
+def test_round_trip(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test")
+    assert store.add_nodes(nodes).success
+    store.close()
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.count == 3
+    hit = reopened.query(nodes[1].embedding, top_k=1).nodes[0]
+    assert hit.node.node_id == "b"
+    assert hit.node.text == "essay deadline is in march"
+    assert hit.node.metadata == {"program": "Blavatnik"}
+    assert hit.score == pytest.approx(1.0, abs=1e-5)
+
+
+def test_delete_is_persisted(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test")
+    store.add_nodes(nodes)
+    store.delete_nodes(["c"])
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.deleted == {2}
+    assert "c" not in ids(reopened.query(nodes[2].embedding, top_k=5))
+
+
+def test_update_replaces_row(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test")
+    store.add_nodes(nodes)
+    store.add_nodes([node("a", "updated text", "Innovation", 1)])
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.get_stats()["live_nodes"] == 3
+    assert texts(reopened)["a"] == "updated text"
+
+
+def test_reader_picks_up_appended_rows(tmp_path, nodes):
+    writer = MmapVectorStore(str(tmp_path), "test")
+    writer.add_nodes(nodes[:2])
+    reader = MmapVectorStore(str(tmp_path), "test")
+
+    writer.add_nodes(nodes[2:])
+    assert ids(reader.query(nodes[2].embedding, top_k=1)) == ["c"]
+
+
+def test_compact_drops_deleted_rows(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test")
+    store.add_nodes(nodes)
+    store.delete_nodes(["a"])
+    assert store.compact().success
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.count == 2
+    assert reopened.deleted == set()
+    assert set(ids(reopened.query(nodes[1].embedding, top_k=5))) == {"b", "c"}
+
+
+def test_updating_a_pending_node_keeps_the_others(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test", auto_save=False)
+    store.add_nodes(nodes[:2])
+    store.add_nodes([node("a", "updated text", "Innovation", 1)])
+    store.save()
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.deleted == set()
+    assert texts(reopened) == {"a": "updated text", "b": "essay deadline is in march"}
+
+
+def test_deleting_a_pending_node_keeps_the_others(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test", auto_save=False)
+    store.add_nodes(nodes)
+    store.delete_nodes(["a"])
+    store.save()
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.deleted == set()
+    assert set(texts(reopened)) == {"b", "c"}
+
+
+def test_deleting_a_saved_node_with_pending_rows(tmp_path, nodes):
+    store = MmapVectorStore(str(tmp_path), "test", auto_save=False)
+    store.add_nodes(nodes[:1])
+    store.save()
+    store.add_nodes(nodes[1:])
+    store.delete_nodes(["a", "b"])
+    store.save()
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    assert reopened.deleted == {0}
+    assert set(texts(reopened)) == {"c"}
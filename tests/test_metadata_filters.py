@@ -0,0 +1,38 @@
+from types import SimpleNamespace
+
+import numpy as np
+
+from local_vector_store import MmapVectorStore
+from vector_indexes import MetadataIndex
+
+
+def node(node_id, metadata, seed):
+    embedding = np.random.default_rng(seed).normal(size=16)
+    return SimpleNamespace(node_id=node_id, text=node_id, metadata=metadata, embedding=embedding)
+
+
+def test_candidates_and_within_or_across_fields():
+    index = MetadataIndex()
+    index.add(0, {"program": "Innovation", "page": 1})
+    index.add(1, {"program": ["Blavatnik", "Innovation"], "page": 2})
+    index.add(2, {"program": "Blavatnik", "page": 2})
+
+    assert index.candidates({"program": "Innovation"}).tolist() == [0, 1]
+    assert index.candidates({"program": ["Innovation", "Blavatnik"]}).tolist() == [0, 1, 2]
+    assert index.candidates({"program": "Blavatnik", "page": 2}).tolist() == [1, 2]
+    assert index.candidates({"program": "Unknown"}).tolist() == []
+    assert MetadataIndex.matches({"program": ["Blavatnik"], "page": 2}, {"page": 2, "program": "Blavatnik"})
+
+
+def test_filtered_query_only_returns_matching_rows(tmp_path):
+    store = MmapVectorStore(str(tmp_path), "test")
+    store.add_nodes([
+        node("a", {"program": "Innovation"}, 1),
+        node("b", {"program": "Blavatnik"}, 2),
+        node("c", {"program": "Blavatnik"}, 3),
+    ])
+    query = store._vectors[0]
+
+    reopened = MmapVectorStore(str(tmp_path), "test")
+    hits = reopened.query(query, top_k=5, filters={"program": "Blavatnik"}).nodes
+    assert {hit.node.node_id for hit in hits} == {"b", "c"}
@@ -0,0 +1,157 @@
+import json
+import os
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from openai import APIConnectionError, BadRequestError
+
+os.environ.setdefault("OPENAI_API_KEY", "test")
+
+from api import index  # noqa: E402
+from api.utils import resilience, routing  # noqa: E402
+
+MESSAGES = [{"role": "user", "content": "Tell me about the incubator"}]
+
+
+def connection_error():
+    return APIConnectionError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+def text_chunk(text):
+    delta = SimpleNamespace(content=text, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+
+
+def finish_chunk(reason="stop"):
+    delta = SimpleNamespace(content=None, tool_calls=None)
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=reason)], usage=None)
+
+
+def usage_chunk():
+    return SimpleNamespace(choices=[], usage=SimpleNamespace(prompt_tokens=10, completion_tokens=5))
+
+
+def tool_chunk():
+    function = SimpleNamespace(name="get_current_weather", arguments='{"latitude": 1')
+    call = SimpleNamespace(id="call_1", function=function)
+    delta = SimpleNamespace(content=None, tool_calls=[call])
+    return SimpleNamespace(choices=[SimpleNamespace(delta=delta, finish_reason=None)], usage=None)
+
+
+def broken(*chunks):
+    """An upstream stream that drops the connection after ``chunks``"""
+    yield from chunks
+    raise connection_error()
+
+
+class FakeCompletions:
+    """Stands in for ``client.chat.completions.with_raw_response``; one scripted stream per call"""
+
+    def __init__(self, *streams):
+        self.streams = list(streams)
+        self.calls = []
+
+    def create(self, messages, **options):
+        self.calls.append(messages)
+        stream = self.streams.pop(0)
+        return SimpleNamespace(headers={}, parse=lambda: stream)
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    def install(*streams):
+        completions = FakeCompletions(*streams)
+        chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=completions))
+        monkeypatch.setattr(index, "client", SimpleNamespace(chat=chat))
+        return completions
+
+    monkeypatch.setattr(index.routing, "router", routing.ModelRouter())
+    monkeypatch.setattr(resilience, "STREAM_RETRY_BACKOFF", 0.0)
+    monkeypatch.delenv("BACKEND_URL", raising=False)
+    return install
+
+
+def texts(frames):
+    return "".join(json.loads(frame[2:]) for frame in frames if frame.startswith("0:"))
+
+
+def test_state_tracks_text_and_tool_frames():
+    state = resilience.StreamState()
+    state.observe('0:"Hello "\n')
+    assert state.resumable
+    state.observe('b:{"toolCallId":"call_1","toolName":"get_current_weather"}\n')
+    assert not state.resumable
+    state.observe('9:{"toolCallId":"call_1","toolName":"get_current_weather","args":{}}\n')
+    assert (state.sent_text, state.tool_calls, state.tool_frames) == ("Hello ", 1, 2)
+    assert '"finishReason":"tool-calls"' in state.finish_frame()
+
+
+def test_retryable():
+    assert resilience.retryable(connection_error())
+    response = httpx.Response(400, request=httpx.Request("POST", "https://api.openai.com"))
+    assert not resilience.retryable(BadRequestError("bad", response=response, body=None))
+    assert not resilience.retryable(ValueError())
+
+
+def test_continuation_asks_the_model_to_carry_on():
+    state = resilience.StreamState(text=["The incubator "])
+    messages = resilience.continuation_messages(MESSAGES, state)
+    assert messages[:1] == MESSAGES
+    assert messages[1] == {"role": "assistant", "content": "The incubator "}
+    assert messages[2]["content"] == resilience.CONTINUE_PROMPT
+    assert resilience.continuation_messages(MESSAGES, resilience.StreamState()) is MESSAGES
+
+
+def test_trim_overlap_drops_repeated_text():
+    frames = ['0:"incubator offers "\n', '0:"mentoring."\n', 'e:{}\n']
+    trimmed = list(resilience.trim_overlap(iter(frames), "The incubator offers "))
+    assert trimmed == ['0:"mentoring."\n', 'e:{}\n']
+
+
+def test_short_coincidental_overlap_is_kept():
+    assert list(resilience.trim_overlap(iter(['0:"and more"\n']), "banana")) == ['0:"and more"\n']
+
+
+def test_broken_stream_is_continued(upstream):
+    completions = upstream(
+        broken(text_chunk("The incubator "), text_chunk("offers ")),
+        iter([text_chunk("offers mentoring."), finish_chunk(), usage_chunk()]),
+    )
+    frames = list(index.stream_frames(MESSAGES))
+
+    assert texts(frames) == "The incubator offers mentoring."
+    assert frames[-1].startswith("e:")
+    assert len(completions.calls) == 2
+    assert completions.calls[1][-2] == {"role": "assistant", "content": "The incubator offers "}
+
+
+def test_stream_that_fails_before_any_text_is_retried_from_scratch(upstream):
+    completions = upstream(broken(), iter([text_chunk("Hi."), finish_chunk(), usage_chunk()]))
+    assert texts(index.stream_frames(MESSAGES)) == "Hi."
+    assert completions.calls[1] == MESSAGES
+
+
+def test_lost_usage_chunk_is_closed_without_retry(upstream):
+    completions = upstream(broken(text_chunk("Done."), finish_chunk()))
+    frames = list(index.stream_frames(MESSAGES))
+    assert texts(frames) == "Done."
+    assert frames[-1] == resilience.StreamState().finish_frame()
+    assert len(completions.calls) == 1
+
+
+def test_retry_refused_after_tool_frames(upstream):
+    completions = upstream(broken(tool_chunk()), iter([text_chunk("again")]))
+    frames = index.stream_frames(MESSAGES)
+    assert next(frames).startswith("b:")
+    with pytest.raises(APIConnectionError):
+        list(frames)
+    assert len(completions.calls) == 1
+
+
+def test_retries_run_out(upstream, monkeypatch):
+    monkeypatch.setattr(resilience, "STREAM_RETRIES", 1)
+    completions = upstream(broken(text_chunk("a")), broken())
+    with pytest.raises(APIConnectionError):
+        list(index.stream_frames(MESSAGES))
+    assert len(completions.calls) == 2
@@ -0,0 +1,79 @@
+import pytest
+
+from api.utils import routing
+
+GREETING = [{"role": "user", "content": "hi there"}]
+COMPLEX = [{"role": "user", "content": "Can you explain how patent licensing works?"}]
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(routing.time, "monotonic", lambda: now[0])
+    return now
+
+
+@pytest.fixture
+def router(clock):
+    return routing.ModelRouter(min_samples=3, cooldown=30.0)
+
+
+def fail(router, tier, times):
+    for _ in range(times):
+        router.record_result(tier, ok=False)
+
+
+def test_classify():
+    assert routing.classify(GREETING) == (routing.FAST, "greeting")
+    assert routing.classify(COMPLEX) == (routing.FULL, "complex")
+    image = [{"role": "user", "content": [{"type": "image_url", "image_url": {"url": "data:"}}]}]
+    assert routing.classify(image) == (routing.FULL, "attachments")
+
+
+def test_healthy_tier_is_used(router):
+    decision = router.choose(GREETING)
+    assert decision.tier is routing.FAST
+    assert decision.candidates == [routing.FAST, routing.FULL]
+
+
+def test_errors_fail_over_to_the_other_tier(router):
+    fail(router, routing.FAST, 3)
+    assert router.degraded(routing.FAST)
+
+    decision = router.choose(GREETING)
+    assert decision.tier is routing.FULL
+    assert decision.reason == "failover_from_fast"
+    assert decision.candidates == [routing.FULL, routing.FAST]
+
+
+def test_slow_ttft_fails_over(router):
+    for _ in range(3):
+        router.record_result(routing.FULL, ok=True)
+    router.record_ttft(routing.FULL, routing.FULL.ttft_slo * 2)
+    assert router.degraded(routing.FULL)
+    assert router.choose(COMPLEX).tier is routing.FAST
+
+
+def test_too_few_samples_do_not_degrade(router):
+    fail(router, routing.FAST, 2)
+    assert not router.degraded(routing.FAST)
+
+
+def test_no_failover_when_both_tiers_degraded(router):
+    fail(router, routing.FAST, 3)
+    fail(router, routing.FULL, 3)
+    decision = router.choose(GREETING)
+    assert decision.tier is routing.FAST
+    assert decision.reason == "greeting"
+
+
+def test_tier_recovers_from_a_clean_slate_after_cooldown(router, clock):
+    fail(router, routing.FAST, 3)
+    clock[0] += 31
+    assert not router.degraded(routing.FAST)
+    assert router.choose(GREETING).tier is routing.FAST
+
+    router.record_result(routing.FAST, ok=True)
+    health = router.health["fast"]
+    assert (health.degraded_until, health.samples, health.ttft) == (0.0, 0, None)
+    assert health.error_rate == 0.0
@@ -4,12 +4,17 @@ Final deployment validation script
 """
 import sys
 import os
+import argparse
 import subprocess
+import threading
 import time
 import requests
 import json
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
+TEST_SERVER_URL = "http://127.0.0.1:8000"
+
 def validate_environment():
     """Validate environment setup"""
     print("Validating environment setup...")
@@ -77,26 +82,47 @@ def validate_dependencies():
         print(f"✗ Error reading requirements.txt: {e}")
         return False
 
+def start_test_server(env=None):
+    """Start api.index:app under uvicorn on port 8000 from the repo root; its errors go to stderr"""
+    return subprocess.Popen([
+        sys.executable, "-m", "uvicorn", "api.index:app",
+        "--host", "127.0.0.1", "--port", "8000", "--log-level", "error"
+    ], cwd=str(Path(__file__).parent), env={**os.environ, **(env or {})}, stdout=subprocess.DEVNULL)
+
+def start_stub_upstream():
+    """Start the benchmark OpenAI stand-in; returns it and the env that points the app at it"""
+    from benchmarks.standins import BackgroundServer, StubConfig, create_openai_app
+    server = BackgroundServer(create_openai_app(StubConfig(ttft_ms=50.0, tokens_per_second=400.0,
+                                                           response_tokens=40))).start()
+    return server, {"OPENAI_BASE_URL": f"{server.url}/v1", "OPENAI_API_KEY": "capacity-test",
+                    "BACKEND_URL": "", "CHAT_COALESCING": "0"}
+
+def wait_for_ready(process, base_url=TEST_SERVER_URL, timeout=30.0, interval=0.1):
+    """Poll the health endpoint until the server answers instead of sleeping a fixed time"""
+    start = time.monotonic()
+    while time.monotonic() - start < timeout:
+        if process.poll() is not None:
+            print(f"✗ Server exited with code {process.returncode}")
+            return False
+        try:
+            if requests.get(f"{base_url}/api/health", timeout=1).status_code == 200:
+                print(f"✓ Server ready after {time.monotonic() - start:.2f}s")
+                return True
+        except requests.RequestException:
+            pass
+        time.sleep(interval)
+    print(f"✗ Server not ready after {timeout:.0f}s")
+    return False
+
 def validate_api_functionality():
     """Validate API functionality"""
     print("\nValidating API functionality...")
     
-    # Start test server
-    api_path = Path(__file__).parent / "api"
-    
     try:
-        process = subprocess.Popen([
-            sys.executable, "-c", 
-            f"""
-import sys
-sys.path.insert(0, '{api_path}')
-import uvicorn
-from main import app
-uvicorn.run(app, host='127.0.0.1', port=8000, log_level='error')
-            """
-        ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        
-        time.sleep(3)
+        # Start test server
+        process = start_test_server()
+        if not wait_for_ready(process):
+            return False
         
         # Test endpoints
         tests = [
@@ -131,14 +157,14 @@ uvicorn.run(app, host='127.0.0.1', port=8000, log_level='error')
                     "http://127.0.0.1:8000/api/chat",
                     json={
                         "session_id": session_id,
-                        "message": "Test message for deployment validation"
+                        "message": "Test message for deployment validation",
+                        "messages": [{"role": "user", "content": "Test message for deployment validation"}]
                     },
                     timeout=30
                 )
                 
                 if chat_response.status_code == 200:
-                    data = chat_response.json()
-                    if "response" in data and len(data["response"]) > 0:
+                    if chat_response.content:
                         print(f"✓ Chat endpoint: working with Yale Ventures response")
                     else:
                         print(f"✗ Chat endpoint: empty response")
@@ -161,6 +187,140 @@ uvicorn.run(app, host='127.0.0.1', port=8000, log_level='error')
             process.terminate()
             process.wait()
 
+def run_session(base_url, timeout):
+    """One simulated user session: create a session, send one chat message"""
+    start = time.perf_counter()
+    session_response = requests.post(f"{base_url}/api/sessions", json={}, timeout=timeout)
+    session_response.raise_for_status()
+    session_id = session_response.json().get("session_id")
+    # Unique text so identical in-flight completions can't be coalesced into one upstream call
+    message = f"Capacity test message {session_id}"
+    chat_response = requests.post(
+        f"{base_url}/api/chat",
+        json={"session_id": session_id, "message": message,
+              "messages": [{"role": "user", "content": message}]},
+        timeout=timeout
+    )
+    chat_response.raise_for_status()
+    if not chat_response.content:
+        raise ValueError("empty chat response")
+    return time.perf_counter() - start
+
+def percentile(values, point):
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, -(-point * len(ordered) // 100) - 1))
+    return ordered[index]
+
+def measure_concurrency(base_url, concurrency, duration, timeout):
+    """Run `concurrency` back-to-back session loops for `duration` seconds"""
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+    
+    def worker():
+        while time.monotonic() < deadline:
+            try:
+                latency = run_session(base_url, timeout)
+                with lock:
+                    latencies.append(latency)
+            except Exception as e:
+                with lock:
+                    errors.append(str(e))
+    
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for _ in range(concurrency):
+            pool.submit(worker)
+    elapsed = time.monotonic() - start
+    
+    total = len(latencies) + len(errors)
+    return {
+        "concurrency": concurrency,
+        "sessions": len(latencies),
+        "errors": len(errors),
+        "error_rate": round(len(errors) / total, 4) if total else 0.0,
+        "sessions_per_sec": round(len(latencies) / elapsed, 3) if elapsed else 0.0,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+        "p95_ms": round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+    }
+
+def validate_capacity(slo_p95_ms=3000.0, max_error_rate=0.01, min_sessions_per_sec=1.0,
+                      max_concurrency=64, step_seconds=10.0, timeout=30.0, report_path=None,
+                      stub_upstream=False):
+    """
+    Ramp concurrent sessions until the latency SLO is breached
+    
+    Concurrency doubles each step. The sustainable rate is the best
+    sessions/sec of any step that met the p95 SLO and error budget; the
+    check passes when it reaches min_sessions_per_sec. With stub_upstream
+    the app streams from the benchmark OpenAI stand-in, so the curve
+    measures this service rather than OpenAI (or a missing API key).
+    """
+    print("\nValidating capacity...")
+    print(f"SLO: p95 <= {slo_p95_ms:.0f}ms, error rate <= {max_error_rate:.1%}, "
+          f"gate: >= {min_sessions_per_sec} sessions/sec")
+    
+    stub, env = start_stub_upstream() if stub_upstream else (None, {})
+    process = start_test_server(env)
+    try:
+        if not wait_for_ready(process):
+            return False
+        
+        curve = []
+        sustainable = None
+        concurrency = 1
+        while concurrency <= max_concurrency:
+            step = measure_concurrency(TEST_SERVER_URL, concurrency, step_seconds, timeout)
+            step["within_slo"] = (
+                step["p95_ms"] is not None
+                and step["p95_ms"] <= slo_p95_ms
+                and step["error_rate"] <= max_error_rate
+            )
+            curve.append(step)
+            status = "✓" if step["within_slo"] else "✗"
+            print(f"{status} {concurrency:>3} concurrent: {step['sessions_per_sec']} sessions/sec, "
+                  f"p50 {step['p50_ms']}ms, p95 {step['p95_ms']}ms, errors {step['error_rate']:.1%}")
+            
+            if not step["within_slo"]:
+                break
+            if sustainable is None or step["sessions_per_sec"] > sustainable["sessions_per_sec"]:
+                sustainable = step
+            concurrency *= 2
+        
+        sustainable_rate = sustainable["sessions_per_sec"] if sustainable else 0.0
+        passed = sustainable_rate >= min_sessions_per_sec
+        report = {
+            "slo_p95_ms": slo_p95_ms,
+            "max_error_rate": max_error_rate,
+            "min_sessions_per_sec": min_sessions_per_sec,
+            "sustainable_sessions_per_sec": sustainable_rate,
+            "sustainable_concurrency": sustainable["concurrency"] if sustainable else 0,
+            "passed": passed,
+            "curve": curve,
+        }
+        if report_path:
+            Path(report_path).write_text(json.dumps(report, indent=2))
+            print(f"Capacity report written to {report_path}")
+        
+        status = "✓" if passed else "✗"
+        print(f"{status} Sustainable: {sustainable_rate} sessions/sec "
+              f"at {report['sustainable_concurrency']} concurrent sessions")
+        return passed
+    
+    except Exception as e:
+        print(f"✗ Capacity validation error: {e}")
+        return False
+    finally:
+        process.terminate()
+        process.wait()
+        if stub is not None:
+            stub.stop()
+
 def validate_vercel_config():
     """Validate Vercel configuration"""
     print("\nValidating Vercel configuration...")
@@ -234,8 +394,25 @@ def validate_frontend_compatibility():
         print(f"✗ Frontend validation error: {e}")
         return False
 
-def main():
+def parse_args():
+    parser = argparse.ArgumentParser(description="Yale Ventures Chatbot deployment validation")
+    parser.add_argument("--capacity", action="store_true",
+                        help="Also ramp concurrent sessions until the latency SLO is breached")
+    parser.add_argument("--slo-p95-ms", type=float, default=3000.0,
+                        help="p95 session latency (create + chat) allowed per step")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--min-sessions-per-sec", type=float, default=1.0,
+                        help="Release gate: sustainable sessions/sec required to pass")
+    parser.add_argument("--max-concurrency", type=int, default=64)
+    parser.add_argument("--step-seconds", type=float, default=10.0)
+    parser.add_argument("--capacity-report", help="Write the capacity curve as JSON to this file")
+    parser.add_argument("--stub-upstream", action="store_true",
+                        help="Run the capacity test against the benchmark OpenAI stand-in")
+    return parser.parse_args()
+
+def main(args=None):
     """Run all validation checks"""
+    args = args or parse_args()
     print("=" * 70)
     print("Yale Ventures Chatbot - Deployment Validation")
     print("=" * 70)
@@ -247,6 +424,16 @@ def main():
         ("Vercel Configuration", validate_vercel_config),
         ("Frontend Compatibility", validate_frontend_compatibility)
     ]
+    if args.capacity:
+        validations.append(("Capacity", lambda: validate_capacity(
+            slo_p95_ms=args.slo_p95_ms,
+            max_error_rate=args.max_error_rate,
+            min_sessions_per_sec=args.min_sessions_per_sec,
+            max_concurrency=args.max_concurrency,
+            step_seconds=args.step_seconds,
+            report_path=args.capacity_report,
+            stub_upstream=args.stub_upstream
+        )))
     
     results = []
     for validation_name, validation_func in validations:
@@ -0,0 +1,253 @@
+#!/usr/bin/env python3
+"""
+In-memory secondary indexes for the Aura Chatbot vector store
+
+``MetadataIndex`` is an inverted index from metadata field values to store
+rows, used to pre-filter candidates before any vector scoring.
+``BM25Index`` is an inverted lexical index over node text, used for exact
+matches on program names, people and acronyms, and ``reciprocal_rank_fusion``
+merges its ranking with the vector ranking.
+"""
+
+import bisect
+import math
+import re
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+# Longer string values are treated as content, not as filterable fields
+MAX_INDEXED_VALUE_LENGTH = 256
+
+# Rough CPython sizes for memory estimates: a key (str + dict slot), a row
+# int in a list, and a BM25 [row, count] pair
+KEY_BYTES = 80
+ROW_BYTES = 36
+PAIR_BYTES = 136
+
+
+def _index_values(value: Any) -> Iterable[str]:
+    if isinstance(value, (list, tuple, set)):
+        for item in value:
+            yield from _index_values(item)
+    elif isinstance(value, (str, int, float, bool)):
+        text = str(value)
+        if len(text) <= MAX_INDEXED_VALUE_LENGTH:
+            yield text
+
+
+class MetadataIndex:
+    """
+    Inverted index: field -> value -> rows
+
+    List values are indexed per element. Filters are ANDed across fields
+    and ORed within a list of values, e.g.
+    ``{"source": "handbook.pdf", "program": ["Blavatnik", "Innovation"]}``.
+    Deleted rows are pruned with ``remove``; ``rows`` still counts them, so
+    row numbers stay aligned with the store.
+    """
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, List[int]]] = {}
+        self.rows = 0
+        self.entries = 0
+
+    @staticmethod
+    def keys(metadata: Dict[str, Any]) -> Dict[str, List[str]]:
+        """Indexed values per field; this is what the store's index log records per row"""
+        keys = {}
+        for field, value in (metadata or {}).items():
+            values = sorted(set(_index_values(value)))
+            if values:
+                keys[field] = values
+        return keys
+
+    def add(self, row: int, metadata: Dict[str, Any]):
+        self.add_keys(row, self.keys(metadata))
+
+    def add_keys(self, row: int, keys: Dict[str, List[str]]):
+        for field, values in keys.items():
+            postings = self.postings.setdefault(field, {})
+            for key in values:
+                postings.setdefault(key, []).append(row)
+                self.entries += 1
+        self.reserve(row)
+
+    def reserve(self, row: int):
+        """Count ``row`` without indexing it, e.g. a deleted row replayed from the log"""
+        self.rows = max(self.rows, row + 1)
+
+    def remove(self, row: int, metadata: Dict[str, Any]):
+        for field, values in self.keys(metadata).items():
+            postings = self.postings.get(field, {})
+            for key in values:
+                rows = postings.get(key)
+                if not rows:
+                    continue
+                # Rows are appended in order, so each posting list is sorted
+                position = bisect.bisect_left(rows, row)
+                if position < len(rows) and rows[position] == row:
+                    del rows[position]
+                    self.entries -= 1
+                    if not rows:
+                        del postings[key]
+            if not postings:
+                self.postings.pop(field, None)
+
+    def candidates(self, filters: Dict[str, Any]) -> np.ndarray:
+        """Sorted rows matching every filter"""
+        result: Optional[np.ndarray] = None
+        for field, wanted in filters.items():
+            values = self.postings.get(field, {})
+            keys = set(_index_values(wanted))
+            matched = [np.asarray(values[key], dtype=np.int64) for key in keys if key in values]
+            rows = np.unique(np.concatenate(matched)) if matched else np.zeros(0, dtype=np.int64)
+            result = rows if result is None else np.intersect1d(result, rows, assume_unique=True)
+            if len(result) == 0:
+                break
+        return result if result is not None else np.arange(self.rows)
+
+    @staticmethod
+    def matches(metadata: Dict[str, Any], filters: Dict[str, Any]) -> bool:
+        """Same semantics as ``candidates`` for a single metadata dict"""
+        for field, wanted in filters.items():
+            if field not in metadata:
+                return False
+            if not set(_index_values(wanted)) & set(_index_values(metadata[field])):
+                return False
+        return True
+
+    def approx_bytes(self) -> int:
+        keys = sum(len(values) for values in self.postings.values())
+        return keys * KEY_BYTES + self.entries * ROW_BYTES
+
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:['.][a-z0-9]+)*")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have in is it of on or that the "
+    "this to was were what when where which who will with".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens without stopwords; keeps acronyms and numbers"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """
+    Incremental Okapi BM25 index: term -> [(row, term frequency)]
+
+    Like ``MetadataIndex``, deleted rows are pruned with ``remove`` and
+    still counted by ``rows``; collection statistics (document count,
+    average length) only cover live rows.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, List[List[int]]] = {}
+        self.doc_lengths: List[int] = []
+        self.total_length = 0
+        self.documents = 0
+        self.entries = 0
+
+    @property
+    def rows(self) -> int:
+        return len(self.doc_lengths)
+
+    @staticmethod
+    def term_counts(text: str) -> Dict[str, int]:
+        """Term frequencies of ``text``; this is what the store's index log records per row"""
+        counts: Dict[str, int] = {}
+        for token in tokenize(text):
+            counts[token] = counts.get(token, 0) + 1
+        return counts
+
+    def add(self, row: int, text: str):
+        self.add_counts(row, self.term_counts(text))
+
+    def add_counts(self, row: int, counts: Dict[str, int]):
+        self.reserve(row)
+        length = sum(counts.values())
+        self.doc_lengths[row] = length
+        self.total_length += length
+        self.documents += 1
+        for token, count in counts.items():
+            self.postings.setdefault(token, []).append([row, count])
+        self.entries += len(counts)
+
+    def reserve(self, row: int):
+        """Count ``row`` without indexing it, e.g. a deleted row replayed from the log"""
+        if row >= len(self.doc_lengths):
+            self.doc_lengths.extend([0] * (row + 1 - len(self.doc_lengths)))
+
+    def remove(self, row: int, text: str):
+        counts = self.term_counts(text)
+        for token in counts:
+            posting = self.postings.get(token)
+            if not posting:
+                continue
+            position = bisect.bisect_left(posting, [row, 0])
+            if position < len(posting) and posting[position][0] == row:
+                del posting[position]
+                self.entries -= 1
+                if not posting:
+                    del self.postings[token]
+        self.total_length -= self.doc_lengths[row]
+        self.doc_lengths[row] = 0
+        self.documents -= 1
+
+    def search(self, query_text: str, top_k: int,
+               candidate_rows: Optional[np.ndarray] = None) -> List[tuple]:
+        """
+        Return up to ``top_k`` (row, score) pairs with a positive BM25 score
+
+        Args:
+            query_text: Free-text query
+            top_k: Number of rows to return
+            candidate_rows: If given, only these rows may be returned
+        """
+        if not self.documents:
+            return []
+        lengths = np.asarray(self.doc_lengths, dtype=np.float32)
+        average_length = max(self.total_length / self.documents, 1.0)
+        scores = np.zeros(self.rows, dtype=np.float32)
+
+        for term in set(tokenize(query_text)):
+            posting = self.postings.get(term)
+            if not posting:
+                continue
+            entries = np.asarray(posting, dtype=np.int64)
+            rows, frequencies = entries[:, 0], entries[:, 1].astype(np.float32)
+            idf = math.log(1 + (self.documents - len(rows) + 0.5) / (len(rows) + 0.5))
+            norm = self.k1 * (1 - self.b + self.b * lengths[rows] / average_length)
+            scores[rows] += idf * frequencies * (self.k1 + 1) / (frequencies + norm)
+
+        if candidate_rows is not None:
+            allowed = np.zeros(self.rows, dtype=bool)
+            allowed[candidate_rows[candidate_rows < self.rows]] = True
+            scores[~allowed] = 0.0
+
+        hits = np.flatnonzero(scores > 0)
+        if len(hits) > top_k:
+            hits = hits[np.argpartition(-scores[hits], top_k - 1)[:top_k]]
+        hits = hits[np.argsort(-scores[hits])]
+        return [(int(row), float(scores[row])) for row in hits]
+
+    def approx_bytes(self) -> int:
+        return len(self.postings) * KEY_BYTES + self.entries * PAIR_BYTES + len(self.doc_lengths) * ROW_BYTES
+
+
+def reciprocal_rank_fusion(rankings: Sequence[Sequence[int]], k: int = 60) -> List[tuple]:
+    """
+    Fuse several rankings of rows: score(row) = sum(1 / (k + rank))
+
+    Returns:
+        (row, fused score) pairs, best first
+    """
+    fused: Dict[int, float] = {}
+    for ranking in rankings:
+        for rank, row in enumerate(ranking, start=1):
+            fused[row] = fused.get(row, 0.0) + 1.0 / (k + rank)
+    return sorted(fused.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,267 @@
+#!/usr/bin/env python3
+"""
+Embedding quantization for the Aura Chatbot vector store
+
+Two opt-in codecs shrink stored vectors:
+
+- ``int8``: scalar quantization, one byte per dimension (4x smaller)
+- ``pq``: product quantization, one byte per subspace (typically 32x smaller)
+
+Queries score the compressed codes first and re-rank a small candidate set
+with the exact float32 vectors, see ``MmapVectorStore(quantization=...)``.
+Run this module to measure memory per vector, recall and query speed:
+
+    python vector_quantization.py --rows 20000 --dim 1536
+    python vector_quantization.py --store ./vector_stores/aura_chatbot_store_local
+"""
+
+import argparse
+import json
+import time
+from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
+
+# Rows scored per block when decoding codes, bounds temporary memory
+BLOCK_ROWS = 65536
+
+
+class ScalarQuantizer:
+    """Per-dimension min/max quantization to uint8"""
+
+    name = "int8"
+
+    def __init__(self):
+        self.low: Optional[np.ndarray] = None
+        self.scale: Optional[np.ndarray] = None
+
+    @property
+    def trained(self) -> bool:
+        return self.low is not None
+
+    def code_size(self, dimension: int) -> int:
+        return dimension
+
+    def train(self, vectors: np.ndarray):
+        self.low = vectors.min(axis=0).astype(np.float32)
+        high = vectors.max(axis=0).astype(np.float32)
+        self.scale = np.maximum(high - self.low, 1e-12) / 255.0
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((vectors - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # x ~= low + codes * scale, so x.q = codes.(scale * q) + low.q
+        weights = (self.scale * query).astype(np.float32)
+        bias = float(self.low @ query)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS].astype(np.float32)
+            scores[start:start + BLOCK_ROWS] = block @ weights + bias
+        return scores
+
+    def save(self, path: Path):
+        np.savez(path, kind=self.name, low=self.low, scale=self.scale)
+
+    def load(self, data):
+        self.low = data["low"]
+        self.scale = data["scale"]
+
+
+class ProductQuantizer:
+    """Product quantization with 256 centroids per subspace and ADC scoring"""
+
+    name = "pq"
+
+    def __init__(self, subspaces: Optional[int] = None, iterations: int = 15, seed: int = 0):
+        """
+        Args:
+            subspaces: Number of subspaces, must divide the dimension.
+                       Defaults to dimension / 8 (or one per dimension).
+            iterations: k-means iterations per subspace
+            seed: Random seed for centroid initialization
+        """
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids: Optional[np.ndarray] = None  # (subspaces, 256, sub_dim)
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    def _subspaces_for(self, dimension: int) -> int:
+        if self.subspaces:
+            if dimension % self.subspaces:
+                raise ValueError(f"{self.subspaces} subspaces do not divide dimension {dimension}")
+            return self.subspaces
+        return dimension // 8 if dimension % 8 == 0 else dimension
+
+    def code_size(self, dimension: int) -> int:
+        return self._subspaces_for(dimension)
+
+    def _split(self, vectors: np.ndarray) -> np.ndarray:
+        m = self.centroids.shape[0] if self.trained else self._subspaces_for(vectors.shape[1])
+        return vectors.reshape(len(vectors), m, -1)
+
+    def train(self, vectors: np.ndarray):
+        rng = np.random.default_rng(self.seed)
+        parts = self._split(vectors.astype(np.float32))
+        m, sub_dim = parts.shape[1], parts.shape[2]
+        k = min(256, len(vectors))
+        centroids = np.zeros((m, 256, sub_dim), dtype=np.float32)
+
+        for j in range(m):
+            data = parts[:, j, :]
+            centers = data[rng.choice(len(data), size=k, replace=False)].copy()
+            for _ in range(self.iterations):
+                assign = self._nearest(data, centers)
+                for c in range(k):
+                    members = data[assign == c]
+                    if len(members):
+                        centers[c] = members.mean(axis=0)
+            centroids[j, :k] = centers
+            # Unused slots repeat the first centroid so codes stay valid
+            centroids[j, k:] = centers[0]
+        self.centroids = centroids
+
+    @staticmethod
+    def _nearest(data: np.ndarray, centers: np.ndarray) -> np.ndarray:
+        distances = (
+            (data ** 2).sum(axis=1, keepdims=True)
+            - 2 * data @ centers.T
+            + (centers ** 2).sum(axis=1)
+        )
+        return distances.argmin(axis=1)
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        parts = self._split(vectors.astype(np.float32))
+        codes = np.empty((len(vectors), parts.shape[1]), dtype=np.uint8)
+        for j in range(parts.shape[1]):
+            codes[:, j] = self._nearest(parts[:, j, :], self.centroids[j])
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        # Asymmetric distance: per-subspace lookup table of centroid . query
+        query_parts = query.astype(np.float32).reshape(self.centroids.shape[0], -1)
+        table = np.einsum("mkd,md->mk", self.centroids, query_parts)
+        subspace_index = np.arange(table.shape[0])
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), BLOCK_ROWS):
+            block = codes[start:start + BLOCK_ROWS]
+            scores[start:start + BLOCK_ROWS] = table[subspace_index, block].sum(axis=1)
+        return scores
+
+    def save(self, path: Path):
+        np.savez(path, kind=self.name, centroids=self.centroids)
+
+    def load(self, data):
+        self.centroids = data["centroids"]
+        self.subspaces = self.centroids.shape[0]
+
+
+def make_quantizer(kind: str, **kwargs):
+    """Create a quantizer by name ("int8" or "pq")"""
+    if kind == "int8":
+        return ScalarQuantizer()
+    if kind == "pq":
+        return ProductQuantizer(**kwargs)
+    raise ValueError(f"Unknown quantization: {kind}")
+
+
+def load_quantizer(path: Path):
+    """Load a trained quantizer saved with ``save``"""
+    with np.load(path) as data:
+        quantizer = make_quantizer(str(data["kind"]))
+        quantizer.load(data)
+    return quantizer
+
+
+def evaluate_quantization(vectors: np.ndarray, queries: np.ndarray, top_k: int = 10,
+                          rerank_factor: int = 4, kinds: Optional[List[str]] = None) -> List[dict]:
+    """
+    Compare exact search with each quantizer on the same vectors
+
+    Vectors and queries are expected to be normalized. Recall is measured
+    against exact top_k results, before and after the exact re-rank.
+
+    Returns:
+        One dict per setting with bytes/vector, recall and ms/query
+    """
+    kinds = kinds or ["int8", "pq"]
+    dimension = vectors.shape[1]
+
+    start = time.perf_counter()
+    exact = [set(np.argsort(-(vectors @ q))[:top_k]) for q in queries]
+    exact_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    report = [{
+        "quantization": "none",
+        "bytes_per_vector": dimension * 4,
+        "recall_first_pass": 1.0,
+        "recall_reranked": 1.0,
+        "ms_per_query": round(exact_ms, 3),
+    }]
+
+    for kind in kinds:
+        quantizer = make_quantizer(kind)
+        quantizer.train(vectors)
+        codes = quantizer.encode(vectors)
+        candidates = min(len(vectors), top_k * rerank_factor)
+
+        first_hits = rerank_hits = 0
+        start = time.perf_counter()
+        for q, truth in zip(queries, exact):
+            approx = quantizer.score(codes, q)
+            shortlist = np.argpartition(-approx, candidates - 1)[:candidates]
+            first = shortlist[np.argsort(-approx[shortlist])][:top_k]
+            reranked = shortlist[np.argsort(-(vectors[shortlist] @ q))][:top_k]
+            first_hits += len(truth.intersection(first))
+            rerank_hits += len(truth.intersection(reranked))
+        elapsed_ms = (time.perf_counter() - start) * 1000 / len(queries)
+
+        report.append({
+            "quantization": kind,
+            "bytes_per_vector": quantizer.code_size(dimension),
+            "recall_first_pass": round(first_hits / (top_k * len(queries)), 4),
+            "recall_reranked": round(rerank_hits / (top_k * len(queries)), 4),
+            "ms_per_query": round(elapsed_ms, 3),
+        })
+    return report
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure vector quantization trade-offs")
+    parser.add_argument("--store", help="Path prefix of an mmap store, e.g. ./vector_stores/aura_chatbot_store_local")
+    parser.add_argument("--rows", type=int, default=20000, help="Synthetic rows when no store is given")
+    parser.add_argument("--dim", type=int, default=256, help="Synthetic dimension when no store is given")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--rerank-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    if args.store:
+        manifest = json.loads(Path(f"{args.store}.manifest.json").read_text())
+        vectors = np.fromfile(f"{args.store}.vectors.f32", dtype=np.float32)
+        vectors = vectors.reshape(manifest["count"], manifest["dimension"])
+    else:
+        # Clustered data behaves more like real embeddings than pure noise
+        centers = rng.normal(size=(64, args.dim))
+        vectors = centers[rng.integers(0, 64, args.rows)] + 0.5 * rng.normal(size=(args.rows, args.dim))
+        vectors = _normalize(vectors.astype(np.float32))
+
+    queries = vectors[rng.choice(len(vectors), size=min(args.queries, len(vectors)), replace=False)]
+    queries = _normalize(queries + 0.1 * rng.normal(size=queries.shape).astype(np.float32))
+    report = evaluate_quantization(vectors, queries, args.top_k, args.rerank_factor)
+    print(json.dumps({"rows": len(vectors), "dimension": vectors.shape[1],
+                      "top_k": args.top_k, "results": report}, indent=2))
+
+
+if __name__ == "__main__":
+    main()
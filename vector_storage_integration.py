@@ -8,8 +8,11 @@ with your existing Vercel chatbot application.
 
 import os
 import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional
 
 # Add aura_rag to path - adjust this path based on your project structure
 sys.path.append(str(Path(__file__).parent.parent / "aura_rag" / "src"))
@@ -23,22 +26,57 @@ except ImportError as e:
     print("Make sure aura_rag is properly installed or adjust the path above")
     sys.exit(1)
 
+from local_vector_store import MmapVectorStore
+from vector_indexes import MetadataIndex, reciprocal_rank_fusion
+from vector_storage_sync import ChangeTracker, KVSync, VercelKVClient
+
+# ModularVectorStore stats keys that may carry its node count and embedding size
+NODE_COUNT_STATS = ("total_nodes", "node_count", "num_nodes", "total_documents")
+DIMENSION_STATS = ("dimension", "embedding_dimension", "embed_dim")
+# text-embedding-3-small, what openai_embed_fn uses by default
+DEFAULT_DIMENSION = 1536
+# Rough docstore cost per node: chunk text, metadata and object overhead
+DOCSTORE_BYTES_PER_NODE = 2048
+
 
 class AuraChatbotVectorStore:
     """
     Vector storage wrapper for Aura Chatbot with Vercel KV integration
     """
     
-    def __init__(self, use_dual_storage: bool = True):
+    def __init__(self, use_dual_storage: bool = True, local_format: Optional[str] = None,
+                 quantization: Optional[str] = None, namespace: Optional[str] = None):
         """
         Initialize vector store with optimal configuration for Vercel deployment
         
         Args:
             use_dual_storage: If True, uses local + Vercel KV. If False, Vercel KV only.
+            local_format: Format of the local fallback store, "mmap" (default) or
+                         "modular". Defaults to the VECTOR_STORE_LOCAL_FORMAT env var.
+            quantization: Opt-in "int8" or "pq" codes for the mmap store; also
+                          syncs embeddings to Vercel KV as int8. Defaults to the
+                          VECTOR_STORE_QUANTIZATION env var (exact search).
+                          Run vector_quantization.py to compare the settings.
+            namespace: Optional collection name; each namespace is a separate
+                       store, e.g. one per program. None is the shared store.
         """
         self.use_dual_storage = use_dual_storage
+        self.namespace = namespace
+        self.store_name = f"aura_chatbot_store__{namespace}" if namespace else "aura_chatbot_store"
+        self.local_format = local_format or os.getenv("VECTOR_STORE_LOCAL_FORMAT", "mmap")
+        self.quantization = quantization or os.getenv("VECTOR_STORE_QUANTIZATION") or None
         self.vector_store = None
+        # Changes since the last sync, pushed to Vercel KV by force_sync()
+        self.changes = ChangeTracker(self.quantization)
+        self.synced_version = 0
+        # Embedding, text and metadata bytes added through this wrapper, for
+        # backends whose stats don't report their memory
+        self.loaded_bytes = 0
+        kv_client = VercelKVClient.from_env()
+        self.kv_sync = KVSync(kv_client, self.store_name) if kv_client else None
         self._initialize_storage()
+        if self.kv_sync is not None and self.vector_store is not None:
+            self._restore_from_kv()
     
     def _initialize_storage(self):
         """Initialize the vector storage based on environment"""
@@ -67,7 +105,7 @@ class AuraChatbotVectorStore:
         # Override with environment variables if available
         vector_config.vercel_kv_url = os.getenv("KV_URL")
         vector_config.vercel_kv_token = os.getenv("KV_REST_API_TOKEN")
-        vector_config.store_name = "aura_chatbot_store"
+        vector_config.store_name = self.store_name
         
         return vector_config
     
@@ -78,7 +116,7 @@ class AuraChatbotVectorStore:
         
         vector_config.vercel_kv_url = os.getenv("KV_URL")
         vector_config.vercel_kv_token = os.getenv("KV_REST_API_TOKEN")
-        vector_config.store_name = "aura_chatbot_store"
+        vector_config.store_name = self.store_name
         
         if not vector_config.vercel_kv_url or not vector_config.vercel_kv_token:
             raise ValueError("Vercel KV credentials required. Set KV_URL and KV_REST_API_TOKEN")
@@ -88,22 +126,72 @@ class AuraChatbotVectorStore:
     def _fallback_to_local(self):
         """Fallback to local storage if Vercel KV fails"""
         print("🔄 Falling back to local storage...")
+        if self.local_format == "mmap":
+            # Memory-mapped store: opening it maps files instead of deserializing nodes
+            self.vector_store = MmapVectorStore(
+                storage_path="./vector_stores",
+                store_name=f"{self.store_name}_local",
+                auto_save=True,
+                quantization=self.quantization
+            )
+            print("✅ Local vector store initialized (mmap)")
+            return
+        
         config = VectorStoreConfig(
             storage_backend=StorageBackend.LOCAL,
             storage_path="./vector_stores",
-            store_name="aura_chatbot_store_local",
+            store_name=f"{self.store_name}_local",
             auto_save=True,
             auto_load=True
         )
         self.vector_store = ModularVectorStore(config)
         print("✅ Local vector store initialized")
     
+    def _restore_from_kv(self):
+        """
+        Load the entries synced to Vercel KV into the backend
+        
+        With KV sync on, force_sync() leaves ModularVectorStore's own save()
+        alone, so the per-entry keys are the durable copy and are read back
+        here. The mmap store persists locally and is only filled from KV
+        when it is empty, e.g. on a fresh serverless instance. Entries are
+        added by ID, replacing any copy the backend loaded itself.
+        """
+        if isinstance(self.vector_store, MmapVectorStore) and self.vector_store.get_stats()["live_nodes"]:
+            return
+        
+        try:
+            version, entries = self.kv_sync.pull()
+            nodes = []
+            for entry in entries:
+                node = TextNode(text=entry["text"], metadata=entry.get("metadata") or {},
+                                embedding=entry.get("embedding"))
+                node.id_ = entry["id"]
+                nodes.append(node)
+            if nodes:
+                result = self.vector_store.add_nodes(nodes)
+                if not result.success:
+                    print(f"❌ Failed to restore from Vercel KV: {result.message}")
+                    return
+                self.loaded_bytes += sum(self._node_bytes(node) for node in nodes)
+            # Already remote: mark synced without recording them as changes
+            self.changes.mark_synced({node.node_id: None for node in nodes}, set())
+            self.synced_version = version
+            print(f"✅ Restored {len(nodes)} entries from Vercel KV (version {version})")
+        except Exception as e:
+            print(f"❌ Restore from Vercel KV failed: {e}")
+    
+    @staticmethod
+    def _node_bytes(node) -> int:
+        return len(node.embedding or ()) * 4 + len(node.text or "") + len(str(node.metadata or ""))
+    
     def add_documents(self, documents: List[dict]) -> bool:
         """
         Add documents to the vector store
         
         Args:
-            documents: List of dictionaries with 'text' and optional 'metadata'
+            documents: List of dictionaries with 'text' and optional 'metadata',
+                      'embedding' and 'id'
                       e.g., [{"text": "content", "metadata": {"source": "doc1"}}]
         
         Returns:
@@ -119,15 +207,21 @@ class AuraChatbotVectorStore:
             for doc in documents:
                 node = TextNode(
                     text=doc['text'],
-                    metadata=doc.get('metadata', {})
+                    metadata=doc.get('metadata', {}),
+                    embedding=doc.get('embedding')
                 )
-                # Note: You'll need to generate embeddings for the nodes
-                # This is typically done by your embedding service
+                if doc.get('id'):
+                    node.id_ = doc['id']
+                # Note: Embeddings are generated by your embedding service;
+                # the mmap store rejects nodes without one
                 nodes.append(node)
             
             # Add nodes to vector store
             result = self.vector_store.add_nodes(nodes)
             if result.success:
+                for node in nodes:
+                    self.changes.record_upsert(node.node_id, node.text, node.metadata, node.embedding)
+                self.loaded_bytes += sum(self._node_bytes(node) for node in nodes)
                 print(f"✅ Added {len(nodes)} documents to vector store")
                 return True
             else:
@@ -138,13 +232,53 @@ class AuraChatbotVectorStore:
             print(f"❌ Error adding documents: {e}")
             return False
     
-    def search(self, query_embedding: List[float], top_k: int = 5) -> List[dict]:
+    def delete_documents(self, document_ids: List[str]) -> bool:
+        """
+        Delete documents by ID
+        
+        Args:
+            document_ids: IDs passed as 'id' to add_documents
+        
+        Returns:
+            bool: True if successful, False otherwise
+        """
+        if not self.vector_store:
+            print("❌ Vector store not initialized")
+            return False
+        
+        delete_nodes = getattr(self.vector_store, "delete_nodes", None)
+        if delete_nodes is None:
+            print("❌ Vector store backend does not support deletes")
+            return False
+        
+        try:
+            result = delete_nodes(document_ids)
+            if not result.success:
+                print(f"❌ Failed to delete documents: {result.message}")
+                return False
+            for document_id in document_ids:
+                self.changes.record_delete(document_id)
+            return True
+        except Exception as e:
+            print(f"❌ Error deleting documents: {e}")
+            return False
+    
+    def search(self, query_embedding: Optional[List[float]], top_k: int = 5,
+               filters: Optional[Dict[str, Any]] = None,
+               query_text: Optional[str] = None, mode: str = "vector",
+               candidates: Optional[int] = None) -> List[dict]:
         """
         Search for similar documents
         
         Args:
             query_embedding: The query embedding vector
             top_k: Number of results to return
+            filters: Optional metadata filters, a value or list of values per field
+                     e.g., {"source": "handbook.pdf", "program": ["a", "b"]}
+            query_text: The raw query, needed for "lexical" and "hybrid" modes
+            mode: "vector", "lexical" (BM25) or "hybrid" (reciprocal-rank fusion
+                  of both). Lexical modes need the local mmap store.
+            candidates: Rows taken from each ranking before fusion in hybrid mode
         
         Returns:
             List of dictionaries with search results
@@ -154,11 +288,29 @@ class AuraChatbotVectorStore:
             return []
         
         try:
-            result = self.vector_store.query(query_embedding, top_k=top_k)
+            if isinstance(self.vector_store, MmapVectorStore):
+                # Filters pre-select rows through the metadata index before scoring
+                result = self.vector_store.query(
+                    query_embedding, top_k=top_k, filters=filters,
+                    query_text=query_text, mode=mode, candidates=candidates
+                )
+                nodes = result.nodes
+            elif not filters:
+                if mode != "vector":
+                    print(f"⚠️ {mode} search needs the local mmap store, using vector search")
+                result = self.vector_store.query(query_embedding, top_k=top_k)
+                nodes = result.nodes
+            else:
+                # Backends without a metadata index: over-fetch and filter
+                result = self.vector_store.query(query_embedding, top_k=top_k * 4)
+                nodes = [
+                    node_with_score for node_with_score in result.nodes
+                    if MetadataIndex.matches(node_with_score.node.metadata, filters)
+                ][:top_k]
             
             # Convert results to simple dictionaries
             search_results = []
-            for node_with_score in result.nodes:
+            for node_with_score in nodes:
                 search_results.append({
                     'text': node_with_score.node.text,
                     'metadata': node_with_score.node.metadata,
@@ -171,6 +323,40 @@ class AuraChatbotVectorStore:
             print(f"❌ Search error: {e}")
             return []
     
+    def search_many(self, query_embeddings: List[List[float]], top_k: int = 5) -> List[List[dict]]:
+        """
+        Search for several query embeddings at once
+        
+        The mmap store scores all queries in one matrix product; other
+        backends run one query per embedding.
+        
+        Returns:
+            One list of search results per query embedding
+        """
+        if not self.vector_store:
+            print("❌ Vector store not initialized")
+            return [[] for _ in query_embeddings]
+        
+        if not isinstance(self.vector_store, MmapVectorStore):
+            return [self.search(embedding, top_k=top_k) for embedding in query_embeddings]
+        
+        try:
+            results = self.vector_store.query_batch(query_embeddings, top_k=top_k)
+            return [
+                [
+                    {
+                        'text': node_with_score.node.text,
+                        'metadata': node_with_score.node.metadata,
+                        'score': node_with_score.score
+                    }
+                    for node_with_score in result.nodes
+                ]
+                for result in results
+            ]
+        except Exception as e:
+            print(f"❌ Search error: {e}")
+            return [[] for _ in query_embeddings]
+    
     def get_stats(self) -> dict:
         """Get vector store statistics"""
         if not self.vector_store:
@@ -181,17 +367,214 @@ class AuraChatbotVectorStore:
         except Exception as e:
             return {"error": str(e)}
     
+    def memory_bytes(self) -> Optional[int]:
+        """Estimate of the resident memory this store needs for queries, None if it can't tell"""
+        if not self.vector_store:
+            return 0
+        stats = self.get_stats()
+        if isinstance(self.vector_store, MmapVectorStore):
+            # Vectors (or codes) that queries touch, plus the in-memory metadata and BM25 indexes
+            return stats.get("live_nodes", 0) * stats.get("bytes_per_vector", 0) + stats.get("index_bytes", 0)
+        reported = stats.get("memory_bytes") or stats.get("vector_bytes")
+        if reported:
+            return reported
+        # ModularVectorStore keeps every node in memory: float32 vectors plus the docstore
+        count = next((stats[key] for key in NODE_COUNT_STATS if isinstance(stats.get(key), int)), None)
+        if count is None:
+            # Nodes it loaded from disk itself are invisible to loaded_bytes
+            return None
+        dimension = next((stats[key] for key in DIMENSION_STATS if isinstance(stats.get(key), int)),
+                         DEFAULT_DIMENSION)
+        return max(count * (dimension * 4 + DOCSTORE_BYTES_PER_NODE), self.loaded_bytes)
+    
+    def close(self):
+        """Release the backend; the mmap store unmaps its files"""
+        close = getattr(self.vector_store, "close", None)
+        if close is not None:
+            close()
+        self.vector_store = None
+    
     def force_sync(self) -> bool:
-        """Force synchronization between local and Vercel KV storage"""
+        """
+        Force synchronization between local and Vercel KV storage
+        
+        With KV REST credentials set, only entries added, updated or deleted
+        since the last sync are uploaded, and a new instance reads them back
+        in _restore_from_kv(). Without them the backend's own save() is used,
+        which re-uploads the whole store.
+        """
         if not self.vector_store:
             return False
         
         try:
-            result = self.vector_store.save()
-            return result.success
+            if self.kv_sync is None or isinstance(self.vector_store, MmapVectorStore):
+                # The mmap store saves incrementally, so this stays cheap
+                result = self.vector_store.save()
+                if not result.success:
+                    return False
+            
+            if self.kv_sync is not None:
+                if not self.changes.dirty:
+                    return True
+                report = self.kv_sync.push(self.changes)
+                self.synced_version = report["version"]
+                print(f"✅ Synced to Vercel KV: {report}")
+            return True
         except Exception as e:
             print(f"❌ Sync error: {e}")
             return False
+    
+    def is_stale(self) -> bool:
+        """Check whether another writer has synced a newer version to Vercel KV"""
+        if self.kv_sync is None:
+            return False
+        
+        try:
+            return self.kv_sync.remote_version() > self.synced_version
+        except Exception as e:
+            print(f"❌ Staleness check error: {e}")
+            return False
+
+
+class NamespacedVectorStore:
+    """
+    Lazily loaded, LRU-evicted namespace shards of AuraChatbotVectorStore
+    
+    A shard is opened on first use and the least recently used shards are
+    closed once the estimated memory of open shards exceeds the budget, so
+    resident memory follows the working set rather than the whole corpus.
+    """
+    
+    def __init__(self, memory_budget_bytes: int = 512 * 1024 * 1024, **store_kwargs):
+        """
+        Args:
+            memory_budget_bytes: Estimated memory allowed for open shards.
+                                 The most recently used shard is always kept.
+            store_kwargs: Passed to every AuraChatbotVectorStore shard
+        """
+        self.memory_budget_bytes = memory_budget_bytes
+        self.store_kwargs = store_kwargs
+        self.loads = 0
+        self.evictions = 0
+        self._shards: "OrderedDict[str, AuraChatbotVectorStore]" = OrderedDict()
+        # Searches in progress per namespace; leased shards are not evicted
+        self._leases: Dict[str, int] = {}
+        self._lock = threading.RLock()
+    
+    def shard(self, namespace: str) -> AuraChatbotVectorStore:
+        """
+        Get a shard, loading it on first use
+        
+        Raises ValueError for a backend that can't estimate its memory, since
+        the budget could never evict it; use local_format="mmap" for those.
+        """
+        with self._lock:
+            store = self._shards.get(namespace)
+            if store is None:
+                store = AuraChatbotVectorStore(namespace=namespace, **self.store_kwargs)
+                if store.memory_bytes() is None:
+                    store.close()
+                    raise ValueError(f"Vector store namespace '{namespace}' can't report its memory use, "
+                                     "so the memory budget can't cover it")
+                self._shards[namespace] = store
+                self.loads += 1
+            self._shards.move_to_end(namespace)
+            self._evict()
+            return store
+    
+    @contextmanager
+    def leased(self, namespace: str) -> Iterator[AuraChatbotVectorStore]:
+        """A shard that stays open until the block exits, even if it becomes the LRU one"""
+        with self._lock:
+            store = self.shard(namespace)
+            self._leases[namespace] = self._leases.get(namespace, 0) + 1
+        try:
+            yield store
+        finally:
+            with self._lock:
+                self._leases[namespace] -= 1
+                if not self._leases[namespace]:
+                    del self._leases[namespace]
+                # Evictions skipped while the lease was held happen now
+                self._evict()
+    
+    def _evict(self):
+        total = sum(store.memory_bytes() for store in self._shards.values())
+        # Least recently used first; the most recently used shard always stays
+        for namespace in list(self._shards)[:-1]:
+            if total <= self.memory_budget_bytes:
+                break
+            if self._leases.get(namespace):
+                continue
+            store = self._shards.pop(namespace)
+            total -= store.memory_bytes()
+            store.force_sync()
+            store.close()
+            self.evictions += 1
+            print(f"♻️ Evicted vector store namespace '{namespace}'")
+    
+    def add_documents(self, namespace: str, documents: List[dict]) -> bool:
+        """Add documents to one namespace"""
+        with self.leased(namespace) as store:
+            return store.add_documents(documents)
+    
+    def search(self, query_embedding: Optional[List[float]], namespaces: List[str],
+               top_k: int = 5, **search_kwargs) -> List[dict]:
+        """
+        Search one or several namespaces and merge the hits by score
+        
+        Hybrid results from several namespaces are fused once over the merged
+        vector and lexical rankings, since per-shard RRF scores only compare
+        within their own shard.
+        
+        Args:
+            query_embedding: The query embedding vector
+            namespaces: Namespaces to search
+            top_k: Number of results to return overall
+            search_kwargs: filters, query_text, mode, candidates (see search)
+        
+        Returns:
+            List of dictionaries with search results, each with its 'namespace'
+        """
+        if search_kwargs.get("mode") == "hybrid" and len(namespaces) > 1:
+            return self._hybrid_search(query_embedding, namespaces, top_k, **search_kwargs)
+        
+        hits = []
+        for namespace in namespaces:
+            with self.leased(namespace) as store:
+                for hit in store.search(query_embedding, top_k=top_k, **search_kwargs):
+                    hits.append({**hit, 'namespace': namespace})
+        hits.sort(key=lambda hit: hit['score'], reverse=True)
+        return hits[:top_k]
+    
+    def _hybrid_search(self, query_embedding: Optional[List[float]], namespaces: List[str], top_k: int,
+                       mode: str = "hybrid", candidates: Optional[int] = None, **search_kwargs) -> List[dict]:
+        """Vector and lexical rankings merged across namespaces, then one reciprocal-rank fusion"""
+        budget = max(candidates or top_k * 4, top_k)
+        rankings = []
+        hits: Dict[tuple, dict] = {}
+        for ranking_mode in ("vector", "lexical"):
+            ranked = []
+            for namespace in namespaces:
+                with self.leased(namespace) as store:
+                    for hit in store.search(query_embedding, top_k=budget, mode=ranking_mode, **search_kwargs):
+                        key = (namespace, hit['text'])
+                        hits.setdefault(key, {**hit, 'namespace': namespace})
+                        ranked.append((hit['score'], key))
+            ranked.sort(key=lambda item: item[0], reverse=True)
+            rankings.append([key for _, key in ranked[:budget]])
+        return [{**hits[key], 'score': score} for key, score in reciprocal_rank_fusion(rankings)[:top_k]]
+    
+    def get_stats(self) -> dict:
+        """Get shard cache statistics"""
+        with self._lock:
+            return {
+                "open_namespaces": list(self._shards),
+                "memory_bytes": sum(store.memory_bytes() or 0 for store in self._shards.values()),
+                "memory_budget_bytes": self.memory_budget_bytes,
+                "loads": self.loads,
+                "evictions": self.evictions,
+            }
 
 
 # Convenience functions for easy integration
@@ -219,6 +602,7 @@ def setup_vercel_environment():
     print("")
     print("1. KV_URL - Your Vercel KV database URL")
     print("2. KV_REST_API_TOKEN - Your Vercel KV REST API token")
+    print("3. KV_REST_API_URL - Your Vercel KV REST API URL (enables incremental sync)")
     print("")
     print("You can find these in your Vercel dashboard under:")
     print("Project Settings > Storage > Your KV Database")
@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Incremental Vercel KV sync for the Aura Chatbot vector store
+
+Instead of re-uploading the whole store, ``AuraChatbotVectorStore`` records
+added, updated and deleted entries in a ``ChangeTracker`` and ``KVSync``
+pushes only those, in chunked pipeline requests with several requests in
+flight. Each entry lives under its own key and a small manifest key carries
+a version number so readers can detect staleness with a single GET. A new
+instance reads the store back with ``KVSync.pull``.
+
+Keys for a store named ``<store>``:
+
+    <store>:node:<id>    JSON entry {"id", "text", "metadata", "embedding"}
+                         (embedding: base64 float32, or "i8:" + base64 int8
+                         codes when the store is quantized)
+    <store>:ids          set of live node IDs
+    <store>:version      integer bumped on every successful sync
+    <store>:manifest     JSON {"version", "count", "updated_at"}
+
+Run this module to start a local KV stand-in for testing:
+
+    python vector_storage_sync.py --port 8079
+    KV_REST_API_URL=http://127.0.0.1:8079 KV_REST_API_TOKEN=local python ...
+"""
+
+import argparse
+import base64
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+
+
+# Marks embeddings packed as one float32 scale followed by int8 codes
+INT8_PREFIX = "i8:"
+
+
+def encode_embedding(embedding: Optional[List[float]], quantization: Optional[str] = None) -> Optional[str]:
+    """
+    Pack an embedding as base64 float32, about 3x smaller than JSON floats
+
+    With ``quantization`` set the embedding is packed as int8 codes with a
+    per-vector scale instead, another 4x smaller. PQ codes would need the
+    codebook on every reader, so "pq" stores use int8 in KV too.
+    """
+    if embedding is None:
+        return None
+    vector = np.asarray(embedding, dtype=np.float32)
+    if quantization:
+        scale = float(np.abs(vector).max()) / 127.0 or 1.0
+        codes = np.clip(np.rint(vector / scale), -127, 127).astype(np.int8)
+        packed = np.float32(scale).tobytes() + codes.tobytes()
+        return INT8_PREFIX + base64.b64encode(packed).decode("ascii")
+    return base64.b64encode(vector.tobytes()).decode("ascii")
+
+
+def decode_embedding(encoded: Optional[str]) -> Optional[List[float]]:
+    """Inverse of ``encode_embedding``; int8 entries come back approximate"""
+    if encoded is None:
+        return None
+    if encoded.startswith(INT8_PREFIX):
+        packed = base64.b64decode(encoded[len(INT8_PREFIX):])
+        scale = np.frombuffer(packed[:4], dtype=np.float32)[0]
+        return (np.frombuffer(packed[4:], dtype=np.int8).astype(np.float32) * scale).tolist()
+    return np.frombuffer(base64.b64decode(encoded), dtype=np.float32).tolist()
+
+
+class ChangeTracker:
+    """Tracks entries changed since the last successful sync"""
+
+    def __init__(self, quantization: Optional[str] = None):
+        """
+        Args:
+            quantization: Store quantization; when set, embeddings are
+                          synced as int8 codes (see ``encode_embedding``)
+        """
+        self.quantization = quantization
+        self.upserts: Dict[str, dict] = {}
+        self.deletes: set = set()
+        # IDs known to exist remotely, used to tell updates from additions
+        self.synced_ids: set = set()
+        self._lock = threading.Lock()
+
+    def record_upsert(self, node_id: str, text: str, metadata: dict,
+                      embedding: Optional[List[float]] = None):
+        with self._lock:
+            self.deletes.discard(node_id)
+            self.upserts[node_id] = {
+                "id": node_id,
+                "text": text,
+                "metadata": metadata,
+                "embedding": encode_embedding(embedding, self.quantization),
+            }
+
+    def record_delete(self, node_id: str):
+        with self._lock:
+            self.upserts.pop(node_id, None)
+            self.deletes.add(node_id)
+
+    @property
+    def dirty(self) -> bool:
+        return bool(self.upserts or self.deletes)
+
+    def snapshot(self) -> tuple:
+        """Take the pending changes; ``restore`` puts them back if the push fails"""
+        with self._lock:
+            upserts, deletes = self.upserts, self.deletes
+            self.upserts, self.deletes = {}, set()
+            return upserts, deletes
+
+    def restore(self, upserts: Dict[str, dict], deletes: set):
+        with self._lock:
+            # Changes recorded while the push was running win
+            for node_id, entry in upserts.items():
+                if node_id not in self.deletes:
+                    self.upserts.setdefault(node_id, entry)
+            for node_id in deletes:
+                if node_id not in self.upserts:
+                    self.deletes.add(node_id)
+
+    def mark_synced(self, upserts: Dict[str, dict], deletes: set):
+        with self._lock:
+            self.synced_ids.update(upserts)
+            self.synced_ids.difference_update(deletes)
+
+    def stats(self) -> dict:
+        with self._lock:
+            updated = sum(1 for node_id in self.upserts if node_id in self.synced_ids)
+            return {
+                "added": len(self.upserts) - updated,
+                "updated": updated,
+                "deleted": len(self.deletes),
+            }
+
+
+class VercelKVClient:
+    """Minimal client for the Vercel KV (Upstash) REST pipeline API"""
+
+    def __init__(self, url: str, token: str, timeout: float = 30.0):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.headers.update({"Authorization": f"Bearer {token}"})
+
+    @classmethod
+    def from_env(cls) -> Optional["VercelKVClient"]:
+        """Build a client from KV_REST_API_URL (or an http(s) KV_URL) and KV_REST_API_TOKEN"""
+        url = os.getenv("KV_REST_API_URL") or os.getenv("KV_URL") or ""
+        token = os.getenv("KV_REST_API_TOKEN")
+        if not url.startswith("http") or not token:
+            return None
+        return cls(url, token)
+
+    def pipeline(self, commands: List[list]) -> List[Any]:
+        """Run several commands in one request, raising on any command error"""
+        response = self.session.post(f"{self.url}/pipeline", json=commands, timeout=self.timeout)
+        response.raise_for_status()
+        results = response.json()
+        for result in results:
+            if "error" in result:
+                raise RuntimeError(f"KV command failed: {result['error']}")
+        return [result.get("result") for result in results]
+
+    def command(self, *args) -> Any:
+        return self.pipeline([list(args)])[0]
+
+
+class KVSync:
+    """Pushes tracked changes to Vercel KV in chunked, pipelined batches"""
+
+    def __init__(self, client: VercelKVClient, store_name: str,
+                 chunk_size: int = 100, max_in_flight: int = 4):
+        """
+        Args:
+            client: KV REST client
+            store_name: Prefix for every key of this store
+            chunk_size: Commands per pipeline request
+            max_in_flight: Pipeline requests sent concurrently
+        """
+        self.client = client
+        self.store_name = store_name
+        self.chunk_size = chunk_size
+        self.max_in_flight = max_in_flight
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.store_name,) + parts)
+
+    def _pipelined(self, commands: List[list]) -> List[Any]:
+        """Run commands in chunk_size pipeline requests, max_in_flight at a time, results in order"""
+        chunks = [commands[i:i + self.chunk_size] for i in range(0, len(commands), self.chunk_size)]
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as pool:
+            return [result for results in pool.map(self.client.pipeline, chunks) for result in results]
+
+    def _set_commands(self, command: str, node_ids: List[str]) -> List[list]:
+        """SADD/SREM on the ids set, split so no single command carries more than chunk_size IDs"""
+        return [[command, self._key("ids")] + node_ids[i:i + self.chunk_size]
+                for i in range(0, len(node_ids), self.chunk_size)]
+
+    def push(self, tracker: ChangeTracker) -> dict:
+        """
+        Upload pending changes, then publish a new manifest version
+
+        Returns:
+            dict with the pushed counts, the new version and elapsed seconds
+        """
+        stats = tracker.stats()
+        upserts, deletes = tracker.snapshot()
+        if not upserts and not deletes:
+            return {**stats, "version": self.remote_version(), "requests": 0, "seconds": 0.0}
+
+        start = time.perf_counter()
+        commands: List[list] = []
+        for node_id, entry in upserts.items():
+            commands.append(["SET", self._key("node", node_id), json.dumps(entry)])
+        for node_id in deletes:
+            commands.append(["DEL", self._key("node", node_id)])
+        commands.extend(self._set_commands("SADD", list(upserts)))
+        commands.extend(self._set_commands("SREM", list(deletes)))
+
+        requests_sent = -(-len(commands) // self.chunk_size)
+        try:
+            self._pipelined(commands)
+
+            # The manifest is only bumped once every entry is written
+            version, count = self.client.pipeline([
+                ["INCR", self._key("version")],
+                ["SCARD", self._key("ids")],
+            ])
+            self.client.command("SET", self._key("manifest"), json.dumps({
+                "version": version,
+                "count": count,
+                "updated_at": time.time(),
+            }))
+        except Exception:
+            tracker.restore(upserts, deletes)
+            raise
+
+        tracker.mark_synced(upserts, deletes)
+        return {
+            **stats,
+            "version": version,
+            "requests": requests_sent + 2,
+            "seconds": round(time.perf_counter() - start, 3),
+        }
+
+    def remote_manifest(self) -> Optional[dict]:
+        raw = self.client.command("GET", self._key("manifest"))
+        return json.loads(raw) if raw else None
+
+    def remote_version(self) -> int:
+        """Cheap staleness check: one GET of the version key"""
+        raw = self.client.command("GET", self._key("version"))
+        return int(raw) if raw else 0
+
+    def fetch_ids(self) -> List[str]:
+        """IDs of every live entry"""
+        return list(self.client.command("SMEMBERS", self._key("ids")) or [])
+
+    def fetch_entries(self, node_ids: List[str]) -> List[dict]:
+        """Read entries back in chunked MGETs, with embeddings decoded"""
+        commands = [
+            ["MGET"] + [self._key("node", node_id) for node_id in node_ids[i:i + self.chunk_size]]
+            for i in range(0, len(node_ids), self.chunk_size)
+        ]
+        entries = []
+        # Each pipeline result is one MGET reply
+        for raws in self._pipelined(commands):
+            for raw in raws:
+                if raw:
+                    entry = json.loads(raw)
+                    entry["embedding"] = decode_embedding(entry.get("embedding"))
+                    entries.append(entry)
+        return entries
+
+    def pull(self) -> tuple:
+        """
+        Read the whole store back: the manifest version, then every entry
+
+        The version is read first, so a push that lands meanwhile leaves
+        the caller looking stale rather than falsely up to date.
+
+        Returns:
+            (version, entries)
+        """
+        version = self.remote_version()
+        return version, self.fetch_entries(self.fetch_ids())
+
+
+class LocalKVStandIn:
+    """
+    In-memory stand-in for the Vercel KV REST API, for local testing
+
+    Supports the commands KVSync uses: GET, SET, DEL, MGET, INCR, SADD,
+    SREM, SCARD and SMEMBERS, over ``POST /pipeline`` and ``POST /``.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, token: str = "local"):
+        self.token = token
+        self.data: Dict[str, Any] = {}
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def execute(self, command: list) -> dict:
+        name, args = command[0].upper(), command[1:]
+        with self._lock:
+            if name == "GET":
+                return {"result": self.data.get(args[0])}
+            if name == "SET":
+                self.data[args[0]] = args[1]
+                return {"result": "OK"}
+            if name == "DEL":
+                return {"result": sum(1 for key in args if self.data.pop(key, None) is not None)}
+            if name == "MGET":
+                return {"result": [self.data.get(key) for key in args]}
+            if name == "INCR":
+                value = int(self.data.get(args[0], 0)) + 1
+                self.data[args[0]] = str(value)
+                return {"result": value}
+            if name in ("SADD", "SREM", "SCARD", "SMEMBERS"):
+                members = self.data.setdefault(args[0], set())
+                if name == "SADD":
+                    before = len(members)
+                    members.update(args[1:])
+                    return {"result": len(members) - before}
+                if name == "SREM":
+                    before = len(members)
+                    members.difference_update(args[1:])
+                    return {"result": before - len(members)}
+                if name == "SCARD":
+                    return {"result": len(members)}
+                return {"result": sorted(members)}
+        return {"error": f"ERR unknown command '{name}'"}
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                if self.headers.get("Authorization") != f"Bearer {stand_in.token}":
+                    self._reply(401, {"error": "Unauthorized"})
+                    return
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+                stand_in.requests += 1
+                if self.path == "/pipeline":
+                    self._reply(200, [stand_in.execute(command) for command in body])
+                else:
+                    self._reply(200, stand_in.execute(body))
+
+            def _reply(self, status: int, payload: Any):
+                data = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "LocalKVStandIn":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Vercel KV stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8079)
+    parser.add_argument("--token", default="local")
+    args = parser.parse_args()
+
+    server = LocalKVStandIn(args.host, args.port, args.token)
+    print(f"🧪 Local KV stand-in listening on {server.url} (token: {args.token})")
+    try:
+        server._server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()